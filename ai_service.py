@@ -4,26 +4,151 @@ ai_service.py
 Thin wrapper around DeepSeek (or any OpenAI‑compatible) chat completion API.
 
 Functions exposed:
-    build_context(uid) -> str
-    ask_ai(prompt: str) -> str | dict
+    build_context(uid) -> str   (coroutine)
+    ask_ai(prompt: str, uid=None) -> str | dict   (cached per user data version)
+    ask_ai_stream(prompt: str, uid=None) -> async iterator of the growing reply
+    parse_reply(content: str) -> str | dict
+    open_client() / close_client()  — shared pooled HTTP client lifecycle
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import date, timedelta
-from typing import Any, List
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Optional
 
 import httpx
 
 import database
+import database_async as adb
 import config
+import llm_gateway
 
 
 # --- DeepSeek settings ---
 DEESEEK_URL = "https://api.deepseek.com/v1/chat/completions"
 DEESEEK_MODEL = "deepseek-chat"
-HTTP_TIMEOUT = 60
+HTTP_TIMEOUT = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("DEEPSEEK_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = 30.0
+
+_cfg = config.load()
+_gw = llm_gateway.gateway("deepseek")
+
+# One client for the whole process: TCP+TLS handshakes are paid once per
+# pooled connection instead of once per question.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def open_client() -> httpx.AsyncClient:
+    """Create the shared client (called from bot.main(); idempotent)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {_cfg.deepseek_key}"},
+            timeout=httpx.Timeout(
+                HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close pooled connections (called from bot.on_shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# --- Response cache ---
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "256"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "3600"))
+# optional on‑disk tier for requests without a uid, e.g. ~/.planner_bot/ai_cache;
+# empty = memory only
+AI_CACHE_DIR = os.getenv("AI_CACHE_DIR", "")
+
+
+class _ResponseCache:
+    """
+    LRU + TTL cache of completion texts.
+
+    Memory entries are keyed by (request hash, uid, data_version): every
+    database write to the user's rows bumps the version, so an answer is
+    never reused after their tasks or goals changed. The optional disk tier
+    is addressed by the request hash alone, so it only takes requests made
+    without a uid: data versions restart from zero with the process and
+    cannot tell a user's old answers from current ones after a restart.
+    """
+
+    def __init__(self, size: int, ttl: float, disk_dir: str = ""):
+        self._size = size
+        self._ttl = ttl
+        self._mem: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+        self._dir = Path(disk_dir).expanduser() if disk_dir else None
+        if self._dir:
+            self._dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, h: str, uid: Optional[int]) -> Optional[str]:
+        k = (h, uid, database.data_version(uid) if uid is not None else 0)
+        hit = self._mem.get(k)
+        if hit is None:
+            return None
+        ts, content = hit
+        if time.time() - ts > self._ttl:
+            del self._mem[k]
+            return None
+        self._mem.move_to_end(k)
+        return content
+
+    def put(self, h: str, uid: Optional[int], content: str) -> None:
+        k = (h, uid, database.data_version(uid) if uid is not None else 0)
+        self._mem[k] = (time.time(), content)
+        self._mem.move_to_end(k)
+        while len(self._mem) > self._size:
+            self._mem.popitem(last=False)
+
+    def get_disk(self, h: str) -> Optional[str]:
+        if not self._dir:
+            return None
+        path = self._dir / f"{h}.json"
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["ts"] > self._ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return entry["content"]
+
+    def put_disk(self, h: str, content: str) -> None:
+        if not self._dir:
+            return
+        tmp = self._dir / f"{h}.tmp"
+        tmp.write_text(json.dumps({"ts": time.time(), "content": content},
+                                  ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self._dir / f"{h}.json")
+
+
+_cache = _ResponseCache(AI_CACHE_SIZE, AI_CACHE_TTL, AI_CACHE_DIR)
 
 # ---------- System prompt for chronobiology & brevity ---------- #
 SYSTEM_PROMPT = (
@@ -54,41 +179,158 @@ def _format_tasks(tasks: List[dict]) -> str:
 def _format_goals(goals: List[dict]) -> str:
     if not goals:
         return "none"
-    return "\n".join(
-        f"• {g['title']} (deadline: {g.get('due','N/A')})" for g in goals
-    )
+    out: List[str] = []
+    for g in goals:
+        line = f"• {g['title']} (deadline: {g.get('due','N/A')}"
+        progress = database.kr_progress(g)
+        if progress is not None:
+            line += f", KR progress: {progress}%"
+        out.append(line + ")")
+    return "\n".join(out)
+
+
+def _approx_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) for prompt budgeting."""
+    return len(text) // 4 + 1
+
+
+def _fit_tasks(tasks: List[dict], budget: int) -> str:
+    """
+    Format tasks nearest‑first until the token budget is spent; the rest of
+    the window is summarised in one line instead of listed.
+    """
+    if not tasks:
+        return "none"
+    out: List[str] = []
+    used = 0
+    for i, t in enumerate(tasks):
+        line = _format_tasks([t])
+        used += _approx_tokens(line)
+        if used > budget and out:
+            rest = tasks[i:]
+            open_left = sum(1 for r in rest if not r.get("done"))
+            out.append(
+                f"… +{len(rest)} more ({open_left} open) "
+                f"between {rest[0]['due']} and {rest[-1]['due']}"
+            )
+            break
+        out.append(line)
+    return "\n".join(out)
+
+
+# --- Prompt context cache ---
+CONTEXT_DAYS = 30
+CONTEXT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", "1200"))
+AI_CONTEXT_USERS = int(os.getenv("AI_CONTEXT_USERS", "1000"))
+
+
+class _ContextCache:
+    """
+    Per‑user snapshot of upcoming tasks and goals for build_context.
+
+    Filled once from the database, then patched by database change events
+    (task added / moved / toggled / deleted, objective added / edited), so
+    a question costs a join of cached lines instead of a table scan. The
+    snapshot is dropped when the day rolls over and the 30‑day window moves;
+    beyond max_users snapshots the least recently asked user is dropped.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users: OrderedDict[int, dict] = OrderedDict()
+
+    def on_change(self, table: str, doc: dict, removed: bool) -> None:
+        with self._lock:
+            entry = self._users.get(doc.get("uid"))
+            if entry is None:
+                return
+            if table == "tasks":
+                bucket = entry["tasks"]
+                in_window = entry["lo"] <= doc["due"] <= entry["hi"]
+            elif table == "okr" and doc.get("type") == "objective":
+                bucket = entry["goals"]
+                in_window = True
+            else:
+                return
+            if removed or not in_window:
+                bucket.pop(doc.doc_id, None)
+            else:
+                bucket[doc.doc_id] = dict(doc)
+            entry["text"] = None
+
+    def get(self, uid: int) -> Optional[str]:
+        with self._lock:
+            entry = self._users.get(uid)
+            if entry is None or entry["day"] != date.today():
+                return None
+            self._users.move_to_end(uid)
+            if entry["text"] is None:
+                entry["text"] = self._render(entry)
+            return entry["text"]
+
+    def fill(self, uid: int, version: int, tasks: List[dict], goals: List[dict]) -> Optional[str]:
+        """Install uid's snapshot unless a write landed after version was read."""
+        today = date.today()
+        entry = {
+            "day": today,
+            "lo": today.isoformat(),
+            "hi": (today + timedelta(days=CONTEXT_DAYS)).isoformat(),
+            "tasks": {t.doc_id: dict(t) for t in tasks},
+            "goals": {g.doc_id: dict(g) for g in goals},
+            "text": None,
+        }
+        with self._lock:
+            # writers bump the version before notifying, so under the lock
+            # either the check fails or on_change sees the new snapshot
+            if database.data_version(uid) != version:
+                return None
+            self._users[uid] = entry
+            self._users.move_to_end(uid)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            entry["text"] = self._render(entry)
+            return entry["text"]
+
+    @staticmethod
+    def _render(entry: dict) -> str:
+        goals = _format_goals([entry["goals"][k] for k in sorted(entry["goals"])])
+        tasks = sorted(entry["tasks"].items(), key=lambda kv: (kv[1]["due"], kv[0]))
+        budget = max(CONTEXT_TOKEN_BUDGET - _approx_tokens(goals), 200)
+        return (
+            "You are a personal planning assistant. "
+            "Help schedule tasks and give suggestions.\n"
+            f"## upcoming_tasks (next {CONTEXT_DAYS} days)\n"
+            f"{_fit_tasks([t for _, t in tasks], budget)}\n"
+            "## goals\n"
+            f"{goals}\n"
+        )
+
+
+_contexts = _ContextCache(AI_CONTEXT_USERS)
+database.on_change(_contexts.on_change)
 
 
 # ---------- Public helpers ---------- #
-def build_context(uid: int) -> str:
+async def build_context(uid: int) -> str:
     """
     Collect next‑30‑days tasks + list of goals for this user
-    and pack into prompt fragment.
+    and pack into prompt fragment (cached, bounded by the token budget).
     """
-    today = date.today()
-    future_tasks = database.list_future_tasks(uid, days_ahead=30)
-    objectives = database._table("okr").search(
-        (database.where("uid") == uid) & (database.where("type") == "objective")
-    )
-
-    ctx = (
-        "You are a personal planning assistant. "
-        "Help schedule tasks and give suggestions.\n"
-        "## upcoming_tasks (next 30 days)\n"
-        f"{_format_tasks(future_tasks)}\n"
-        "## goals\n"
-        f"{_format_goals(objectives)}\n"
-    )
+    ctx = _contexts.get(uid)
+    if ctx is not None:
+        return ctx
+    while ctx is None:
+        version = database.data_version(uid)
+        future_tasks = await adb.list_future_tasks(uid, days_ahead=CONTEXT_DAYS)
+        objectives = await adb.list_objectives(uid)
+        # a write landed while loading: its event was missed, load again
+        ctx = _contexts.fill(uid, version, future_tasks, objectives)
     return ctx
 
 
-async def ask_ai(prompt: str) -> Any:
-    """
-    Send prompt to DeepSeek and return parsed response:
-    - If JSON deserialises, return dict.
-    - Else raw string.
-    """
-    payload = {
+def _payload(prompt: str) -> dict:
+    return {
         "model": DEESEEK_MODEL,
         "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
@@ -97,15 +339,82 @@ async def ask_ai(prompt: str) -> Any:
         "temperature": 0.3,
         "max_tokens": 512,
     }
-    headers = {"Authorization": f"Bearer {config.DEEPSEEK_KEY}"}
 
-    async with httpx.AsyncClient(timeout=HTTP_TIMEOUT) as client:
-        r = await client.post(DEESEEK_URL, json=payload, headers=headers)
-        r.raise_for_status()
-        content: str = r.json()["choices"][0]["message"]["content"].strip()
 
-    # Try parse as JSON
+async def _cached(h: str, uid: Optional[int]) -> Optional[str]:
+    content = _cache.get(h, uid)
+    if content is None and AI_CACHE_DIR and uid is None:
+        content = await asyncio.to_thread(_cache.get_disk, h)
+        if content is not None:
+            _cache.put(h, uid, content)
+    return content
+
+
+async def _store(h: str, uid: Optional[int], content: str) -> None:
+    _cache.put(h, uid, content)
+    # user‑scoped answers stay in memory, see _ResponseCache
+    if AI_CACHE_DIR and uid is None:
+        await asyncio.to_thread(_cache.put_disk, h, content)
+
+
+def parse_reply(content: str) -> Any:
+    """Return dict if the reply is JSON, else the raw string."""
     try:
         return json.loads(content)
     except json.JSONDecodeError:
-        return content
\ No newline at end of file
+        return content
+
+
+async def ask_ai(prompt: str, uid: Optional[int] = None) -> Any:
+    """
+    Send prompt to DeepSeek and return parsed response:
+    - If JSON deserialises, return dict.
+    - Else raw string.
+    Identical requests are answered from cache while uid's data is unchanged.
+    """
+    payload = _payload(prompt)
+    h = _cache.key(payload)
+    content = await _cached(h, uid)
+    if content is None:
+        content = await _gw.coalesce(h, lambda: _complete(payload))
+        await _store(h, uid, content)
+    return parse_reply(content)
+
+
+async def _complete(payload: dict) -> str:
+    async with _gw.slot():
+        r = await open_client().post(DEESEEK_URL, json=payload)
+        r.raise_for_status()
+        return r.json()["choices"][0]["message"]["content"].strip()
+
+
+async def ask_ai_stream(prompt: str, uid: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Streaming variant of ask_ai (SSE, ``stream=true``): yields the reply
+    accumulated so far after every received chunk; the last value is the
+    complete text, to be passed to parse_reply(). Cache hits yield once.
+    """
+    payload = _payload(prompt)
+    h = _cache.key(payload)
+    content = await _cached(h, uid)
+    if content is not None:
+        yield content
+        return
+    parts: List[str] = []
+    async with _gw.slot(), open_client().stream(
+        "POST", DEESEEK_URL, json={**payload, "stream": True}
+    ) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield "".join(parts)
+    content = "".join(parts).strip()
+    await _store(h, uid, content)
+    yield content
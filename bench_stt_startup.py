@@ -0,0 +1,93 @@
+"""
+bench_stt_startup.py  •  Startup cost of speech recognition, before vs. now
+
+``import bot`` used to import stt_vosk, which loaded the Vosk model at
+import time: every bot start paid for it, voice note or not. Now the bot
+process never imports vosk and the model loads lazily in the STT workers,
+on the first voice note or in the background (STT_WARMUP=1).
+
+    python bench_stt_startup.py --runs 3
+    python bench_stt_startup.py --model /srv/vosk-model-small-ru-0.22
+
+Every figure comes from a fresh interpreter (nothing cached in-process):
+
+  interpreter          python -c pass — subtract from the two rows below
+  baseline import      import vosk + Model(path) — what bot startup used to pay
+  bot import share     import vosk alone (the part of the above without a model)
+  pool cold            SttPool start → first 1 s note answered (lazy, first note)
+  pool warm            next note on the same pool (after warm-up / first note)
+
+Rows whose step fails (vosk not installed, model directory incomplete) are
+reported as such instead of a number.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import stt_pool
+
+SILENCE = bytes(stt_pool.SAMPLE_RATE * 2)  # 1 s of 16 kHz s16le
+
+
+def in_fresh_interpreter(code: str) -> float | str:
+    """Wall time of code in a new python, in ms, or the error it died with."""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        return (proc.stderr.strip().splitlines() or ["exit %d" % proc.returncode])[-1]
+    return ms
+
+
+async def pool_run() -> tuple[float, float] | str:
+    pool = stt_pool.SttPool(workers=1, queue_size=1)
+    try:
+        t0 = time.perf_counter()
+        await pool.start()
+        await pool.transcribe_pcm(SILENCE)
+        cold = (time.perf_counter() - t0) * 1000
+        t1 = time.perf_counter()
+        await pool.transcribe_pcm(SILENCE)
+        return cold, (time.perf_counter() - t1) * 1000
+    except stt_pool.SttError as e:
+        return f"SttError: {e}"
+    finally:
+        await pool.close()
+
+
+def report(name: str, samples: list) -> None:
+    errors = [s for s in samples if isinstance(s, str)]
+    if errors:
+        print(f"{name:<20} failed: {errors[0]}")
+    else:
+        print(f"{name:<20} median {statistics.median(samples):8.1f} ms   "
+              f"min {min(samples):8.1f}   max {max(samples):8.1f}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    p.add_argument("--model", default=os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-ru-0.22"))
+    p.add_argument("--runs", type=int, default=3)
+    args = p.parse_args()
+    os.environ["VOSK_MODEL_PATH"] = args.model
+    stt_pool.JOB_TIMEOUT = 60
+    stt_pool.MAX_RESTARTS = 0  # a worker that cannot load the model fails the run
+
+    report("interpreter", [in_fresh_interpreter("pass") for _ in range(args.runs)])
+    baseline = f"from vosk import Model; Model({args.model!r})"
+    report("baseline import", [in_fresh_interpreter(baseline) for _ in range(args.runs)])
+    report("bot import share", [in_fresh_interpreter("import vosk") for _ in range(args.runs)])
+    runs = [asyncio.run(pool_run()) for _ in range(args.runs)]
+    report("pool cold", [r if isinstance(r, str) else r[0] for r in runs])
+    report("pool warm", [r if isinstance(r, str) else r[1] for r in runs])
+
+
+if __name__ == "__main__":
+    main()
@@ -9,28 +9,35 @@ bot.py  •  Telegram‑бот «Личный планировщик»
 Дальше можно постепенно наполнять каждую секцию логикой и inline‑кнопками.
 """
 
+import asyncio
 import logging
+import os
 
 from config import load
-import stt_vosk
+import stt_pool
 from datetime import date, datetime
-from datetime import timedelta
+from datetime import timedelta, timezone
 from datetime import time
 import re
 from typing import List
-from tinydb import where
-import subprocess
-from pathlib import Path
 from calendar import month_name
  # Small DB helper
-def get_objective(obj_id: int):
-    return database._table("okr").get(doc_id=obj_id)
+async def get_objective(obj_id: int):
+    return await adb.get_objective(obj_id)
 
 import database  # TinyDB helper functions
+import database_async as adb  # same API, run off the event loop
 import ai_service  # DeepSeek wrapper module
+import llm_gateway
+import inbox_reminder
+import callbacks
+import outbound
+import search_index
+from screen_cache import cached_screen, edit_screen
+import screen_cache
+import updates
+from planner import abacus_client
 from planner.abacus_client import ask_rocky
-from database import close_db
-from database import get_task
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
 from aiogram import F
@@ -71,6 +78,7 @@ from telegram import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
 )
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     Application,
     ApplicationBuilder,
@@ -84,10 +92,9 @@ from telegram.ext import (
 
 # ---------- Reset user data handler ---------- #
 async def cmd_reset_me(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Полное удаление всех данных пользователя (цели, задачи, категории, inbox)."""
+    """Полное удаление всех данных пользователя (цели, задачи, категории, inbox, напоминания)."""
     uid = update.effective_user.id
-    for tab in ("okr", "tasks", "categories", "inbox"):
-        database._table(tab).remove(where("uid") == uid)
+    await adb.delete_user_data(uid)
     await update.message.reply_text(
         "Все твои данные полностью удалены!\n"
         "Бот сброшен. Введите /start для чистого теста."
@@ -157,7 +164,8 @@ async def lifeplan_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         await update.message.reply_text("Формулирую твои цели на основе ответов...")
         summary = await ai_service.ask_ai(
-            "Сформулируй 3-5 конкретных жизненных цели и смысловых ориентира на основании:\n" + "\n".join(answers)
+            "Сформулируй 3-5 конкретных жизненных цели и смысловых ориентира на основании:\n" + "\n".join(answers),
+            uid=update.effective_user.id,
         )
         logging.info(f"[lifeplan_router] ai_service.ask_ai returned: {summary!r}")
         if isinstance(summary, str):
@@ -190,12 +198,14 @@ async def lifeplan_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     answers = context.user_data.get(LIFEPLAN_ANSWERS, [])
     if txt in ("да", "ok", "давай", "сохранить"):
         # Сохраняем цели как OKR (один obj на каждый абзац/пункт)
-        goals = await ai_service.ask_ai("Выдели списком 3-5 ключевых жизненных целей на основании:\n" + "\n".join(answers))
+        goals = await ai_service.ask_ai(
+            "Выдели списком 3-5 ключевых жизненных целей на основании:\n" + "\n".join(answers), uid=uid
+        )
         # допустим, goals — это список строк или 1 строка с \n
         if isinstance(goals, str):
             goals = [g.strip("–• \n") for g in goals.split("\n") if g.strip()]
         for g in goals:
-            database.add_objective(uid, g)
+            await adb.add_objective(uid, g)
         await update.message.reply_text("Цели сохранены! Теперь они всегда доступны в разделе 'Цели'.")
         # --- Запуск сбора категорий ---
         context.user_data["awaiting_categories"] = True
@@ -216,7 +226,7 @@ async def lifeplan_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Принять пользовательский вариант целей (разделить по строкам)
         user_goals = [g.strip("–• \n") for g in txt.split("\n") if g.strip()]
         for g in user_goals:
-            database.add_objective(uid, g)
+            await adb.add_objective(uid, g)
         await update.message.reply_text("Твои формулировки целей сохранены! Теперь они всегда доступны в разделе 'Цели'.")
         # --- Запуск сбора категорий ---
         context.user_data["awaiting_categories"] = True
@@ -237,7 +247,7 @@ async def categories_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return "categories_state"
         uid = update.effective_user.id
         for c in cats:
-            database.add_category(uid, c)
+            await adb.add_category(uid, c)
         await update.message.reply_text("Категории сохранены!\nТеперь все твои задачи будут планироваться по этим приоритетам.")
         context.user_data.pop("categories")
         context.user_data.pop("awaiting_categories")
@@ -412,26 +422,23 @@ async def echo_to_rocky(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"Ошибка Rocky: {e}")
 
 # --- Helper: find matching tasks for AI ---
-def find_matching_tasks(uid: int, query: str, days_ahead: int = 30):
+MATCH_LIMIT = 20  # tasks listed in a secretary answer
+async def find_matching_tasks(uid: int, query: str, days_ahead: int | None = None,
+                              limit: int = MATCH_LIMIT):
     """
-    Return LIST of upcoming tasks whose text contains any keyword from query
-    (case‑insensitive, ignores words ≤ 2 chars and common stopwords), sorted by due date/time.
+    Return LIST of upcoming tasks matching any keyword from query: the
+    limit best matches (search_index: Russian‑normalised terms and
+    prefixes, question words ignored), in date and time order.
+    days_ahead limits how far ahead to look; None = no limit.
     """
-    words = [w.lower() for w in re.findall(r"\w+", query) if len(w) > 2]
-    if not words:
-        return []
-    tasks = database.list_future_tasks(uid, days_ahead)
-    # sort by due then start_ts (if any)
-    tasks.sort(key=lambda t: (t["due"], t.get("start_ts") or ""))
-    # Ignore common question words to avoid false negatives
-    stop = {"когда", "что", "где", "сколько", "запланировано", "подскажи", "у", "меня"}
-    key_words = [w for w in words if w not in stop]
-    if not key_words:
-        key_words = words  # fallback to original list
-    return [
-        t for t in tasks
-        if any(w in t["text"].lower() for w in key_words)
-    ]
+    lo = date.today().isoformat()
+    hi = (date.today() + timedelta(days=days_ahead)).isoformat() if days_ahead is not None else None
+    hits = await search_index.search(
+        uid, query, tables=("tasks",), limit=limit,
+        where=lambda t: t["due"] >= lo and (hi is None or t["due"] <= hi),
+    )
+    return sorted((t for _score, _table, t in hits),
+                  key=lambda t: (t["due"], t.get("start_ts") or "", t.doc_id))
 
 # --- Secretary question auto-detect helper ---
 QUESTION_WORDS = ("когда", "подскажи", "что", "где", "сколько", "запланировано")
@@ -441,45 +448,128 @@ def is_secretary_query(text: str) -> bool:
     low = text.lower().strip()
     return low.endswith("?") and any(w in low for w in QUESTION_WORDS)
 
-def schedule_task_jobs(job_queue, chat_id: int, task_id: int, start_dt: datetime, end_dt: datetime):
-    """Plan callback jobs for start and end reminders using delay seconds."""
-    now = datetime.now(tz=USER_TZ)
-    start_delay = max(0, (start_dt - now).total_seconds())
-    end_delay = max(0, (end_dt - now).total_seconds())
+# --- Streaming secretary replies ---
+STREAM_EDIT_INTERVAL = 1.2  # seconds between edits; Telegram throttles ~1 edit/s per chat
+TG_TEXT_LIMIT = 4096
+
 
-    job_queue.run_once(start_notify, when=start_delay, data={"cid": chat_id, "tid": task_id})
-    job_queue.run_once(end_notify, when=end_delay, data={"cid": chat_id, "tid": task_id})
+async def safe_edit(message, text: str, **kwargs) -> None:
+    """Edit message text, ignoring Telegram's 'message is not modified'."""
+    try:
+        await message.edit_text(text[:TG_TEXT_LIMIT], **kwargs)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
+
+async def stream_ai_reply(message, prompt: str, uid: int) -> str:
+    """
+    Stream the AI answer into message, editing it at most once per
+    STREAM_EDIT_INTERVAL; return the complete reply text.
+    """
+    loop = asyncio.get_running_loop()
+    last_edit = loop.time()
+    content = ""
+    async for content in ai_service.ask_ai_stream(prompt, uid=uid):
+        if loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+            await safe_edit(message, content + " ▌")
+            last_edit = loop.time()
+    await safe_edit(message, content or "🤷")
+    return content
+
+
+async def schedule_task_jobs(job_queue, chat_id: int, task_id: int, start_dt: datetime, end_dt: datetime):
+    """Persist start and end reminders; they survive restarts (see dispatch_reminders)."""
+    await schedule_reminder(job_queue, chat_id, task_id, "start", start_dt)
+    await schedule_reminder(job_queue, chat_id, task_id, "end", end_dt)
 
 # ---------- Voice handler ---------- #
+# Vocabulary for the STT grammar fast mode (stt_vosk.Stream): typical short
+# commands plus the words they are built from; menu labels and the user's
+# own categories / goals are added per request in voice_phrases().
+VOICE_COMMANDS = [
+    "добавь задачу", "добавь задачу на сегодня", "добавь задачу на завтра",
+    "что у меня сегодня", "что у меня завтра", "что у меня на неделе",
+    "покажи инбокс", "покажи цели", "покажи статистику",
+    "запиши в инбокс", "отметь выполненной", "перенеси на завтра",
+    "сегодня", "завтра", "послезавтра", "неделя", "месяц", "в", "на", "утром", "вечером",
+    "понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье",
+    "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять",
+    "десять", "одиннадцать", "двенадцать", "час", "часа", "часов", "тридцать", "пятнадцать",
+]
+# Notes longer than this skip the grammar pass (stt_vosk uses the same setting)
+STT_FAST_MAX_SECONDS = float(os.getenv("STT_FAST_MAX_SECONDS", "4"))
+# Phrase lists per user, rebuilt only after a write to the user's rows
+_voice_phrases = screen_cache.ScreenCache(screen_cache.SCREEN_CACHE_SIZE)
+
+
+async def voice_phrases(uid: int) -> List[str]:
+    """Phrase list for the grammar pass: commands, menu labels, user titles."""
+    version = database.data_version(uid)
+    hit = _voice_phrases.get((uid,), version)
+    if hit is not None:
+        return hit
+    labels = [
+        button.text
+        for markup in (QUICK_MENU, MAIN_MENU)
+        for row in markup.keyboard
+        for button in row
+    ]
+    categories, goals = await asyncio.gather(
+        adb.list_categories(uid), adb.list_objectives(uid)
+    )
+    titles = [d.get("title", "") for d in [*categories, *goals]]
+    phrases = VOICE_COMMANDS + labels + [t for t in titles if t]
+    _voice_phrases.put((uid,), version, phrases)
+    return phrases
+
+
 async def voice_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Handle Telegram voice messages:
-    1. Download voice.ogg
-    2. Convert to 16 kHz mono WAV via ffmpeg
-    3. Transcribe with Vosk
+    Handle Telegram voice messages (all in memory, no temp files):
+    1. Download the OGG into a bytearray
+    2. Decode to raw 16 kHz mono PCM via ffmpeg stdin → stdout
+    3. Stream the PCM into Vosk (STT worker pool) while ffmpeg decodes,
+       showing the partial transcript in a status message; short notes
+       try the command grammar (voice_phrases) before free‑form decoding
     4. Route resulting text through text_input_router
     """
-    voice_file = await update.message.voice.get_file()
-    ogg_path = Path("tmp_voice.ogg")
-    wav_path = Path("tmp_voice.wav")
-    await voice_file.download_to_drive(custom_path=ogg_path)
-
-    # Convert with ffmpeg (suppress stdout/stderr)
-    subprocess.run(
-        ["ffmpeg", "-y", "-i", str(ogg_path), "-ar", "16000", "-ac", "1", str(wav_path)],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
-
-    text = stt_vosk.transcribe_wav(str(wav_path))
+    voice = update.message.voice
+    phrases = None
+    if (voice.duration or 0) <= STT_FAST_MAX_SECONDS:
+        voice_file, phrases = await asyncio.gather(
+            voice.get_file(), voice_phrases(update.effective_user.id)
+        )
+    else:
+        voice_file = await voice.get_file()
+    ogg = await voice_file.download_as_bytearray()
+    status = await update.message.reply_text("🎙 Распознаю…")
 
-    # Clean temp files
-    ogg_path.unlink(missing_ok=True)
-    wav_path.unlink(missing_ok=True)
+    loop = asyncio.get_running_loop()
+    last_edit = loop.time()
+    text = ""
+    try:
+        pcm = stt_pool.decode_ogg_stream(ogg)
+        async for kind, text in stt_pool.stream(pcm, phrases=phrases):
+            if kind == "partial" and loop.time() - last_edit >= STREAM_EDIT_INTERVAL:
+                await safe_edit(status, f"🎙 {text} ▌")
+                last_edit = loop.time()
+    except stt_pool.SttBusy:
+        await safe_edit(status, "Распознавание речи сейчас перегружено, попробуй чуть позже 🙏")
+        return
+    except (stt_pool.SttError, asyncio.TimeoutError):
+        logger.exception("voice recognition failed")
+        await safe_edit(status, "Распознавание речи сейчас недоступно 😔 Напиши текстом.")
+        return
+    except (stt_pool.DecodeError, OSError):
+        # OSError: ffmpeg missing or not executable
+        logger.exception("voice decode failed")
+        text = ""
 
     if not text:
-        await update.message.reply_text("Не удалось распознать речь 🤷")
+        await safe_edit(status, "Не удалось распознать речь 🤷")
         return
+    await safe_edit(status, f"🎙 {text}")
 
     # Route recognized text as if it was a normal message
     from types import SimpleNamespace
@@ -498,7 +588,7 @@ async def voice_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def start_notify(context: ContextTypes.DEFAULT_TYPE):
     cid = context.job.data["cid"]
     tid = context.job.data["tid"]
-    task = database._table("tasks").get(doc_id=tid)
+    task = await adb.get_task(tid)
     title = task["text"] if task else ""
     keyboard = InlineKeyboardMarkup(
         [
@@ -510,12 +600,13 @@ async def start_notify(context: ContextTypes.DEFAULT_TYPE):
         cid,
         f"⏰ Время начать задачу «{title}»",
         reply_markup=keyboard,
+        rate_limit_args=outbound.NOTIFY,
     )
 
 async def end_notify(context: ContextTypes.DEFAULT_TYPE):
     cid = context.job.data["cid"]
     tid = context.job.data["tid"]
-    task = database._table("tasks").get(doc_id=tid)
+    task = await adb.get_task(tid)
     title = task["text"] if task else ""
     keyboard = InlineKeyboardMarkup(
         [
@@ -527,7 +618,95 @@ async def end_notify(context: ContextTypes.DEFAULT_TYPE):
         cid,
         f"🕑 Подходит время завершить задачу «{title}»",
         reply_markup=keyboard,
+        rate_limit_args=outbound.NOTIFY,
+    )
+
+# ---------- Persistent reminders ---------- #
+# Reminders live in the "reminders" table, indexed by fire time. One repeating
+# dispatcher job loads only what falls due within the next REMINDER_WINDOW
+# seconds and arms an exact run_once for each. So the JobQueue holds at most
+# one window of jobs, however many reminders are pending. The first pass
+# after startup is the bulk restore; reminders missed while the bot was down
+# (late by more than REMINDER_GRACE) follow REMINDER_CATCHUP:
+#   all    – send every missed reminder
+#   latest – per task, send only the most recent missed one (default)
+#   skip   – drop missed reminders
+# Moving, rescheduling, finishing or deleting a task drops its pending
+# reminders in database.py; an already armed job finds its row gone and
+# stays silent.
+REMINDER_WINDOW = int(os.getenv("REMINDER_WINDOW", "60"))
+REMINDER_GRACE = int(os.getenv("REMINDER_GRACE", "300"))
+REMINDER_CATCHUP = os.getenv("REMINDER_CATCHUP", "latest").lower()
+REMINDER_HANDLERS = {"start": start_notify, "end": end_notify}
+_armed_reminders: set[int] = set()
+
+
+def _arm_reminder(job_queue, rec, now: datetime) -> None:
+    delay = max(0.0, (database.reminder_time(rec) - now).total_seconds())
+    job_queue.run_once(
+        fire_reminder,
+        when=delay,
+        # rows stored before "chat" existed were keyed by the chat id
+        data={"rid": rec.doc_id, "cid": rec.get("chat", rec["uid"]), "tid": rec["task_id"],
+              "kind": rec["kind"]},
+        name=f"reminder_{rec.doc_id}",
     )
+    _armed_reminders.add(rec.doc_id)
+
+
+async def schedule_reminder(job_queue, chat_id: int, task_id: int, kind: str, fire_dt: datetime):
+    """Store a reminder; arm it right away if it falls due before the next pass."""
+    rid = await adb.add_reminder(chat_id, task_id, kind, fire_dt)
+    now = datetime.now(timezone.utc)
+    if fire_dt <= now + timedelta(seconds=REMINDER_WINDOW):
+        rec = await adb.get_reminder(rid)
+        if rec is not None and rid not in _armed_reminders:
+            _arm_reminder(job_queue, rec, now)
+
+
+async def fire_reminder(context: ContextTypes.DEFAULT_TYPE):
+    data = context.job.data
+    if await adb.get_reminder(data["rid"]) is None:
+        # cancelled after it was armed (task moved, done or deleted)
+        _armed_reminders.discard(data["rid"])
+        return
+    try:
+        await REMINDER_HANDLERS[data["kind"]](context)
+    finally:
+        # delete before disarming, so a concurrent dispatcher pass can't re-arm it
+        await adb.remove_reminders([data["rid"]])
+        _armed_reminders.discard(data["rid"])
+
+
+def _missed_to_drop(missed: list) -> list:
+    """Apply REMINDER_CATCHUP to reminders missed beyond the grace period."""
+    if REMINDER_CATCHUP == "all":
+        return []
+    if REMINDER_CATCHUP == "skip":
+        return missed
+    latest = {}
+    for rec in missed:  # due_reminders() is ordered by fire time
+        latest[(rec["uid"], rec["task_id"])] = rec.doc_id
+    keep = set(latest.values())
+    return [rec for rec in missed if rec.doc_id not in keep]
+
+
+async def dispatch_reminders(context: ContextTypes.DEFAULT_TYPE):
+    """Arm reminders due within the next window (first run: bulk restore)."""
+    now = datetime.now(timezone.utc)
+    due = [
+        r for r in await adb.due_reminders(now + timedelta(seconds=REMINDER_WINDOW))
+        if r.doc_id not in _armed_reminders
+    ]
+    late = now - timedelta(seconds=REMINDER_GRACE)
+    drop = _missed_to_drop([r for r in due if database.reminder_time(r) < late])
+    if drop:
+        await adb.remove_reminders([r.doc_id for r in drop])
+        logger.info("Dropped %d missed reminders (policy %s)", len(drop), REMINDER_CATCHUP)
+    dropped = {r.doc_id for r in drop}
+    for rec in due:
+        if rec.doc_id not in dropped:
+            _arm_reminder(context.job_queue, rec, now)
 
 # ---------- Клавиатуры ---------- #
 # Compact main keyboard (2 columns, symmetric)
@@ -572,22 +751,14 @@ async def free_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(resp)
 
 
-async def echo_to_rocky(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Send any text message to Rocky and echo the reply."""
-    if update.message and update.message.text:
-        resp = await ask_rocky(update.message.text)
-        await update.message.reply_text(resp)
-
 # ---------- Базовые хендлеры ---------- #
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Стартовое сообщение и главное меню."""
     user = update.effective_user
     # сохраняем chat_id для восстановления job’ов
-    database.remember_chat(user.id, update.effective_chat.id)
+    await adb.remember_chat(user.id, update.effective_chat.id)
     # Если целей нет — сразу lifeplan
-    objs = database._table("okr").search(
-        (database.where("uid") == user.id) & (database.where("type") == "objective")
-    )
+    objs = await adb.list_objectives(user.id)
     if not objs:
         await update.message.reply_text(
             "Давай определим твои жизненные цели — это основа всей системы! Ответь на несколько вопросов."
@@ -599,26 +770,31 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "Это твой личный планировщик. Выбирай раздел:"
     )
     await update.message.reply_text(text, reply_markup=QUICK_MENU)
-    # Персональное напоминание Инбокса (не менять)
-    jobs = [j for j in context.job_queue.get_jobs_by_name(f"inbox_reminder_{user.id}")]
-    if not jobs:
-        context.job_queue.run_daily(
-            inbox_daily_reminder,
-            time(hour=20, minute=0, tzinfo=USER_TZ),
-            data={"uid": user.id, "chat_id": update.effective_chat.id},
-            name=f"inbox_reminder_{user.id}",
-        )
+    # Напоминание Инбокса: remember_chat выше добавляет чат в inbox_reminder
 
 
-def render_today(uid: int) -> tuple[str, InlineKeyboardMarkup]:
-    """Return text and inline‑keyboard for today's tasks."""
-    tasks = database.list_tasks(uid, date.today(), lvl="day", include_done=True)
+def pager_row(screen: str, page: database.Page) -> list:
+    """◀️ / ▶️ buttons for a paged screen (callback pg_<screen>_<cursor>)."""
+    row = []
+    if page.prev:
+        row.append(InlineKeyboardButton("◀️", callback_data=f"pg_{screen}_{page.prev}"))
+    if page.next:
+        row.append(InlineKeyboardButton("▶️", callback_data=f"pg_{screen}_{page.next}"))
+    return row
+
+
+@cached_screen("today")
+async def render_today(uid: int, cursor: str | None = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Return text and inline‑keyboard for one page of today's tasks."""
+    page = await adb.tasks_page(uid, date.today(), "day", cursor)
+    tasks = page.items
     lines = []
     buttons = []
     if not tasks:
         text = "Сегодня пока нет задач. Добавь первую!"
     else:
-        for idx, t in enumerate(tasks, 1):
+        # numbers run on across pages: page 2 starts at PAGE_SIZE + 1
+        for idx, t in enumerate(tasks, page.offset + 1):
             status = "✅" if t["done"] else "🔸"
             lines.append(f"{status} {idx}. {t['text']}")
             btn_row = [
@@ -628,6 +804,8 @@ def render_today(uid: int) -> tuple[str, InlineKeyboardMarkup]:
             ]
             buttons.append(btn_row)
         text = "📅 Задачи на сегодня:\n" + "\n".join(lines)
+    if page.prev or page.next:
+        buttons.append(pager_row("today", page))
     # add control row at bottom
     buttons.append(
         [
@@ -647,10 +825,12 @@ def next_monday(d: date) -> date:
     return monday_of_week(d) + timedelta(days=7)
 
 
-def render_week(uid: int) -> tuple[str, InlineKeyboardMarkup]:
-    """Return text and inline‑keyboard for current week's tasks (lvl=week)."""
+@cached_screen("week")
+async def render_week(uid: int, cursor: str | None = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Return text and inline‑keyboard for one page of current week's tasks (lvl=week)."""
     week_start = monday_of_week(date.today())
-    tasks = database.list_tasks(uid, week_start, lvl="week", include_done=True)
+    page = await adb.tasks_page(uid, week_start, "week", cursor)
+    tasks = page.items
 
     lines, buttons = [], []
     if not tasks:
@@ -665,6 +845,8 @@ def render_week(uid: int) -> tuple[str, InlineKeyboardMarkup]:
             ]
             buttons.append(btn_row)
         text = "Спринт недели:\n" + "\n".join(lines)
+    if page.prev or page.next:
+        buttons.append(pager_row("week", page))
 
     # control row
     buttons.append(
@@ -681,11 +863,13 @@ def render_week(uid: int) -> tuple[str, InlineKeyboardMarkup]:
 def first_day_of_month(d: date) -> date:
     return d.replace(day=1)
 
-def render_month(uid: int, month: int | None = None, year: int | None = None) -> tuple[str, InlineKeyboardMarkup]:
+async def render_month(uid: int, month: int | None = None, year: int | None = None) -> tuple[str, InlineKeyboardMarkup]:
     if month is None:
         today = date.today()
         month, year = today.month, today.year
-    stages = database.list_stages_for_month(uid, month, year)
+    stages, goals = await asyncio.gather(
+        adb.list_stages_for_month(uid, month, year), adb.objectives_by_id(uid)
+    )
     lines, buttons = [], []
     if not stages:
         text = f"📆 {month_name[month]}: пока нет этапов.\nНажми ➕ чтобы добавить."
@@ -694,8 +878,8 @@ def render_month(uid: int, month: int | None = None, year: int | None = None) ->
         for st in stages:
             grouped.setdefault(st["goal_id"], []).append(st)
         for gid, lst in grouped.items():
-            goal = database._table("okr").get(doc_id=gid)
-            lines.append(f"🎯 {goal['title']}")
+            goal = goals.get(gid)
+            lines.append(f"🎯 {goal['title'] if goal else '—'}")
             for st in lst:
                 lines.append(f"   • {st['title']}")
         text = "📆 " + month_name[month] + ":\n" + "\n".join(lines)
@@ -707,38 +891,37 @@ def render_month(uid: int, month: int | None = None, year: int | None = None) ->
 # --- Month menu handler ---
 async def show_month_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     uid = update.effective_user.id
-    text, kb = render_month(uid)
+    text, kb = await render_month(uid)
     await update.message.reply_text(text, reply_markup=kb)
 
 
 async def show_today_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     uid = update.effective_user.id
-    text, kb = render_today(uid)
+    context.user_data.pop("page_today", None)  # a fresh screen starts on page 1
+    text, kb = await render_today(uid)
     await update.message.reply_text(text, reply_markup=kb)
 
 
 async def show_week_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     uid = update.effective_user.id
-    text, kb = render_week(uid)
+    context.user_data.pop("page_week", None)
+    text, kb = await render_week(uid)
     await update.message.reply_text(text, reply_markup=kb)
 
 
 
 # --- Dynamic goals/OKR rendering ---
-def render_goals(uid: int) -> tuple[str, InlineKeyboardMarkup]:
-    """Return text + keyboard listing all top-level objectives."""
-    objs = database._table("okr").search(
-        (database.where("uid") == uid) & (database.where("type") == "objective")
-    )
+@cached_screen("goals")
+async def render_goals(uid: int, cursor: str | None = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Return text + keyboard listing one page of top-level objectives."""
+    page = await adb.objectives_page(uid, cursor)
+    objs = page.items
     buttons = []
     if objs:
         for obj in objs:
-            # calculate average progress of all KR for this objective
-            krs = database._table("okr").search(
-                (database.where("type") == "kr") & (database.where("obj_id") == obj.doc_id)
-            )
-            if krs:
-                avg = sum(k.get("progress", 0) for k in krs) // len(krs)
+            # average KR progress, kept on the objective (database.kr_progress)
+            avg = database.kr_progress(obj)
+            if avg is not None:
                 prog_prefix = progress_dot(avg) + " "
                 prog_suffix = f"  [{avg}%]"
             else:
@@ -752,6 +935,8 @@ def render_goals(uid: int) -> tuple[str, InlineKeyboardMarkup]:
                 InlineKeyboardButton("➕ Этап", callback_data=f"goal_add_stage_{obj.doc_id}")
             ])
         text = "🎯 Твои цели:"
+        if page.prev or page.next:
+            buttons.append(pager_row("goals", page))
     else:
         text = "У тебя пока нет целей. Добавь первую!"
     # control row
@@ -759,33 +944,27 @@ def render_goals(uid: int) -> tuple[str, InlineKeyboardMarkup]:
     return text, InlineKeyboardMarkup(buttons)
 
 # --- OKR Quarters and KRs ---
-def render_quarters(obj_id: int) -> tuple[str, InlineKeyboardMarkup]:
-    """Show four quarter buttons for chosen objective."""
-    buttons = [
-        [
-            InlineKeyboardButton("I кв", callback_data=f"okr_q_{obj_id}_Q1"),
-            InlineKeyboardButton("II кв", callback_data=f"okr_q_{obj_id}_Q2"),
-            InlineKeyboardButton("III кв", callback_data=f"okr_q_{obj_id}_Q3"),
-            InlineKeyboardButton("IV кв", callback_data=f"okr_q_{obj_id}_Q4"),
-        ],
-        [InlineKeyboardButton("⬅️ Назад", callback_data="okr_back")],
-    ]
+def render_quarters(obj_id: int, obj: dict | None = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Show four quarter buttons for chosen objective (with KR progress, if obj given)."""
+    row = []
+    for label, q in (("I кв", "Q1"), ("II кв", "Q2"), ("III кв", "Q3"), ("IV кв", "Q4")):
+        avg = database.kr_progress(obj, q) if obj else None
+        if avg is not None:
+            label = f"{label} · {avg}%"
+        row.append(InlineKeyboardButton(label, callback_data=f"okr_q_{obj_id}_{q}"))
+    buttons = [row, [InlineKeyboardButton("⬅️ Назад", callback_data="okr_back")]]
     return "Выбери квартал:", InlineKeyboardMarkup(buttons)
 
 
-def render_krs(obj_id: int, quarter: str) -> tuple[str, InlineKeyboardMarkup]:
+async def render_krs(obj_id: int, quarter: str) -> tuple[str, InlineKeyboardMarkup]:
     """List KRs for an objective and quarter."""
-    obj = get_objective(obj_id)
+    obj = await get_objective(obj_id)
     if not obj:
         return "Цель не найдена.", InlineKeyboardMarkup(
             [[InlineKeyboardButton("⬅️ Назад", callback_data="okr_back")]]
         )
     # KRs: type == "kr", obj_id == obj_id, quarter == quarter
-    krs = database._table("okr").search(
-        (database.where("type") == "kr") &
-        (database.where("obj_id") == obj_id) &
-        (database.where("quarter") == quarter)
-    )
+    krs = await adb.list_key_results(obj_id, quarter)
     lines = []
     buttons = []
     if krs:
@@ -811,13 +990,16 @@ def render_krs(obj_id: int, quarter: str) -> tuple[str, InlineKeyboardMarkup]:
 
 async def show_goal_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     uid = update.effective_user.id
-    text, kb = render_goals(uid)
+    context.user_data.pop("page_goals", None)
+    text, kb = await render_goals(uid)
     await update.message.reply_text(text, reply_markup=kb)
 
 
-def render_inbox(uid: int) -> tuple[str, InlineKeyboardMarkup]:
-    """Return text + keyboard for inbox notes."""
-    notes = database.list_inbox(uid)
+@cached_screen("inbox")
+async def render_inbox(uid: int, cursor: str | None = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Return text + keyboard for one page of inbox notes."""
+    page = await adb.inbox_page(uid, cursor)
+    notes = page.items
     buttons = []
     if notes:
         for n in notes:
@@ -825,6 +1007,8 @@ def render_inbox(uid: int) -> tuple[str, InlineKeyboardMarkup]:
             buttons.append(
                 [InlineKeyboardButton(preview or "(пусто)", callback_data=f"inbox_note_{n.doc_id}")]
             )
+        if page.prev or page.next:
+            buttons.append(pager_row("inbox", page))
         text = "🔔 Инбокс — идеи, мысли и планы.\nПозже ты сможешь превратить запись в цель или задачу:"
     else:
         text = (
@@ -836,7 +1020,8 @@ def render_inbox(uid: int) -> tuple[str, InlineKeyboardMarkup]:
 
 async def show_inbox_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     uid = update.effective_user.id
-    text, kb = render_inbox(uid)
+    context.user_data.pop("page_inbox", None)
+    text, kb = await render_inbox(uid)
     await update.message.reply_text(text, reply_markup=kb)
 
 
@@ -850,9 +1035,9 @@ async def show_stats_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )
     await update.message.reply_text("📊 Статистика:", reply_markup=kb)
 # ---------- Statistics helpers ----------
-def render_stats_today(uid: int) -> str:
+async def render_stats_today(uid: int) -> str:
     """Return textual summary for today's stats."""
-    tasks = database.list_tasks(uid, date.today(), lvl="day", include_done=True)
+    tasks = await adb.list_tasks(uid, date.today(), lvl="day", include_done=True)
     total = len(tasks)
     done = sum(1 for t in tasks if t["done"])
     percent = int(done / total * 100) if total else 0
@@ -888,550 +1073,550 @@ async def collapse_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 ### --- Категории: получить список категорий, не покрытых задачами сегодня ---
-def get_uncovered_categories_for_today(uid: int):
+async def category_coverage(uid: int, day: date):
+    """Категории пользователя и id тех, по которым на day есть задачи."""
+    cats, counts = await asyncio.gather(
+        adb.list_categories(uid), adb.task_counts_by_category(uid, day)
+    )
+    return cats, {c.doc_id for c in cats if counts[c.doc_id]}
+
+async def get_uncovered_categories_for_today(uid: int):
     """Вернуть id и названия категорий, по которым сегодня нет задач."""
-    cats = database.list_categories(uid)
-    covered = set()
-    today = date.today()
-    for c in cats:
-        tasks = database.list_tasks_by_category(uid, c.doc_id, due=today)
-        if tasks:
-            covered.add(c.doc_id)
+    cats, covered = await category_coverage(uid, date.today())
     return [c for c in cats if c.doc_id not in covered]
 
-### --- Категории: router для выбора категории при добавлении задачи ---
-async def choose_category_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    data = query.data
-    uid = query.from_user.id
-    if data.startswith("choose_cat_"):
-        if data == "choose_cat_none":
-            context.user_data["category_id"] = None
-        else:
-            cat_id = int(data.split("_")[-1])
-            context.user_data["category_id"] = cat_id
-        context.user_data["awaiting_todo_text"] = True
-        await query.edit_message_text("Введи текст задачи для этой категории:")
-        return
-
 # ---------- Callback‑router ---------- #
-async def inline_router(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    # Ensure we have callback data before any checks
-    if not update.callback_query:
-        return
-    query = update.callback_query
-    await query.answer()
-    data = query.data
-    uid = query.from_user.id
-    # ---------- STATISTICS ----------
-    # --- GOAL → NEW STAGE title ---
-    if data.startswith("goal_add_stage_"):
-        goal_id = int(data.split("_")[-1])
-        context.user_data[CURRENT_GOAL_ID] = goal_id
-        context.user_data[AWAIT_STAGE_TITLE] = True
-        await query.edit_message_text("Введите название этапа:")
-        return
+# Inline buttons: one handler per callback namespace, see callbacks.py.
+# Registered in main(); buttons that ask for text set an awaiting_* flag
+# that text_input_router picks up.
+router = callbacks.CallbackRouter()
+
+
+### --- Категории: выбор категории при добавлении задачи ---
+@router.route("choose_cat_none")
+@router.route("choose_cat_{cat_id:int}")
+async def choose_category(query, context, uid, cat_id=None):
+    context.user_data.pop("awaiting_category_choice", None)
+    context.user_data["category_id"] = cat_id
+    context.user_data["awaiting_todo_text"] = True
+    await query.edit_message_text("Введи текст задачи для этой категории:")
+
+
+# --- GOAL → NEW STAGE title ---
+@router.route("goal_add_stage_{goal_id:int}")
+@router.route("stage_goal_{goal_id:int}")
+async def goal_add_stage(query, context, uid, goal_id):
+    context.user_data[CURRENT_GOAL_ID] = goal_id
+    context.user_data[AWAIT_STAGE_TITLE] = True
+    await query.edit_message_text("Введите название этапа:")
+
+
+# month selection for stage
+@router.route("stage_month_done")
+async def stage_month_done(query, context, uid):
+    context.user_data.pop(AWAIT_STAGE_MONTH, None)
+    context.user_data.pop(CURRENT_STAGE_TITLE, None)
+    context.user_data.pop(CURRENT_GOAL_ID, None)
+    await query.edit_message_text("Добавление этапов завершено.")
+
+
+@router.route("stage_month_{month:int}")
+async def stage_month(query, context, uid, month):
+    goal_id = context.user_data[CURRENT_GOAL_ID]
+    title = context.user_data[CURRENT_STAGE_TITLE]
+    await adb.add_stage(uid, goal_id, title, month, date.today().year)
+    # reset stage title, stay in loop
+    context.user_data.pop(CURRENT_STAGE_TITLE, None)
+    await query.edit_message_text(
+        f"Этап «{title}» добавлен на {month_name[month]}.\nДобавить ещё этап к этой цели?",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Да", callback_data=f"goal_add_stage_{goal_id}")],
+            [InlineKeyboardButton("✅ Готово", callback_data="stage_month_done")],
+        ])
+    )
 
-    # month selection for stage
-    if data.startswith("stage_month_"):
-        _, _, m = data.split("_")
-        if m == "done":
-            context.user_data.pop(AWAIT_STAGE_MONTH, None)
-            context.user_data.pop(CURRENT_STAGE_TITLE, None)
-            context.user_data.pop(CURRENT_GOAL_ID, None)
-            await query.edit_message_text("Добавление этапов завершено.")
-            return
-        month = int(m)
-        goal_id = context.user_data[CURRENT_GOAL_ID]
-        title = context.user_data[CURRENT_STAGE_TITLE]
-        uid = query.from_user.id
-        database.add_stage(uid, goal_id, title, month, date.today().year)
-        # reset stage title, stay in loop
-        context.user_data.pop(CURRENT_STAGE_TITLE, None)
-        await query.edit_message_text(
-            f"Этап «{title}» добавлен на {month_name[month]}.\nДобавить ещё этап к этой цели?",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("➕ Да", callback_data=f"goal_add_stage_{goal_id}")],
-                [InlineKeyboardButton("✅ Готово", callback_data="stage_month_done")],
-            ])
-        )
-        return
-    # ---------- LINK TASK TO GOAL ----------
-    if data == "link_skip":
-        # simply refresh today list
-        context.user_data.pop("new_task_id", None)
-        text, kb = render_today(uid)
-        await query.edit_message_text("Ок, без привязки.", reply_markup=kb)
-        return
 
-    if data == "link_choose_goal":
-        task_id = context.user_data.get("new_task_id")
-        if not task_id:
-            await query.edit_message_text("Нет задачи для привязки.")
-            return
-        # build goal selection keyboard
-        goals = database._table("okr").search(
-            (database.where("uid") == uid) & (database.where("type") == "objective")
-        )
-        rows = [
-            [InlineKeyboardButton(g["title"], callback_data=f"link_goal_{task_id}_{g.doc_id}")]
-            for g in goals
-        ] or [[InlineKeyboardButton("Нет целей", callback_data="link_skip")]]
-        rows.append([InlineKeyboardButton("⬅️ Отмена", callback_data="link_skip")])
-        kb = InlineKeyboardMarkup(rows)
-        await query.edit_message_text("Выбери цель:", reply_markup=kb)
-        return
+# ---------- LINK TASK TO GOAL ----------
+@router.route("link_skip")
+async def link_skip(query, context, uid):
+    # simply refresh today list
+    context.user_data.pop("new_task_id", None)
+    text, kb = await render_today(uid)
+    await query.edit_message_text("Ок, без привязки.", reply_markup=kb)
 
-    if data.startswith("link_goal_"):
-        _, _, tid_str, gid_str = data.split("_")
-        task_id = int(tid_str)
-        goal_id = int(gid_str)
-        database.update_task(task_id, goal_id=goal_id)
-        context.user_data.pop("new_task_id", None)
-        await query.edit_message_text("Задача привязана к цели! 🎯")
-        text, kb = render_today(uid)
-        await query.message.reply_text(text, reply_markup=kb)
-        return
-    if data == "stats_today":
-        text = render_stats_today(uid)
-        kb = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data="stats_back")]])
-        await query.edit_message_text(text, reply_markup=kb)
-        return
 
-    if data == "stats_back":
-        # return to stats root
-        kb = InlineKeyboardMarkup(
-            [
-                [InlineKeyboardButton("📆 Сегодня", callback_data="stats_today")],
-                [InlineKeyboardButton("⬅️ Назад", callback_data="okr_back_disabled")],
-            ]
-        )
-        await query.edit_message_text("📊 Статистика:", reply_markup=kb)
+@router.route("link_choose_goal")
+async def link_choose_goal(query, context, uid):
+    task_id = context.user_data.get("new_task_id")
+    if not task_id:
+        await query.edit_message_text("Нет задачи для привязки.")
         return
+    # build goal selection keyboard
+    goals = await adb.list_objectives(uid)
+    rows = [
+        [InlineKeyboardButton(g["title"], callback_data=f"link_goal_{task_id}_{g.doc_id}")]
+        for g in goals
+    ] or [[InlineKeyboardButton("Нет целей", callback_data="link_skip")]]
+    rows.append([InlineKeyboardButton("⬅️ Отмена", callback_data="link_skip")])
+    kb = InlineKeyboardMarkup(rows)
+    await query.edit_message_text("Выбери цель:", reply_markup=kb)
+
+
+@router.route("link_goal_{task_id:int}_{goal_id:int}")
+async def link_goal(query, context, uid, task_id, goal_id):
+    await adb.update_task(task_id, goal_id=goal_id)
+    context.user_data.pop("new_task_id", None)
+    await query.edit_message_text("Задача привязана к цели! 🎯")
+    text, kb = await render_today(uid)
+    await query.message.reply_text(text, reply_markup=kb)
+
+
+# ---------- STATISTICS ----------
+@router.route("stats_today")
+async def stats_today(query, context, uid):
+    text = await render_stats_today(uid)
+    kb = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data="stats_back")]])
+    await edit_screen(query, text, kb)
+
+
+@router.route("stats_back")
+async def stats_back(query, context, uid):
+    # return to stats root
+    kb = InlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton("📆 Сегодня", callback_data="stats_today")],
+            [InlineKeyboardButton("⬅️ Назад", callback_data="okr_back_disabled")],
+        ]
+    )
+    await query.edit_message_text("📊 Статистика:", reply_markup=kb)
+
+
+# MONTH actions
+@router.route("month_add")
+async def month_add(query, context, uid):
+    context.user_data["awaiting_month_text"] = True
+    await query.edit_message_text("Введите текст задачи для месяца:")
+
 
-    # MONTH actions
-    if data == "month_add":
-        context.user_data["awaiting_month_text"] = True
-        await query.edit_message_text("Введите текст задачи для месяца:")
+@router.route("month_add_stage")
+async def month_add_stage(query, context, uid):
+    # Предлагаем выбрать, к какой цели относится этап
+    goals = await adb.list_objectives(uid)
+    if not goals:
+        await query.edit_message_text("Сначала создай хотя бы одну цель!")
         return
+    rows = [
+        [InlineKeyboardButton(g["title"], callback_data=f"stage_goal_{g.doc_id}")]
+        for g in goals
+    ]
+    rows.append([InlineKeyboardButton("⬅️ Отмена", callback_data="month_refresh")])
+    kb = InlineKeyboardMarkup(rows)
+    await query.edit_message_text("К какой цели добавить этап?", reply_markup=kb)
 
-    if data == "month_add_stage":
-        # Предлагаем выбрать, к какой цели относится этап
-        goals = database._table("okr").search(
-            (database.where("uid") == uid) & (database.where("type") == "objective")
-        )
-        if not goals:
-            await query.edit_message_text("Сначала создай хотя бы одну цель!")
-            return
-        rows = [
-            [InlineKeyboardButton(g["title"], callback_data=f"stage_goal_{g.doc_id}")]
-            for g in goals
+
+@router.route("month_toggle_{tid:int}")
+async def month_toggle(query, context, uid, tid):
+    await adb.toggle_done(tid)
+    text, kb = await render_month(uid)
+    await edit_screen(query, text, kb)
+
+
+@router.route("month_push_{tid:int}")
+async def month_push(query, context, uid, tid):
+    await adb.move_task(tid, monday_of_week(date.today()), new_lvl="week")
+    text, kb = await render_month(uid)
+    await edit_screen(query, text, kb)
+
+
+@router.route("month_refresh")
+async def month_refresh(query, context, uid):
+    text, kb = await render_month(uid)
+    await edit_screen(query, text, kb)
+
+
+# --- ADD NEW KR ---
+@router.route("okr_kr_add_{obj_id:int}_{quarter}")
+async def okr_kr_add(query, context, uid, obj_id, quarter):
+    context.user_data["new_kr_obj"] = obj_id
+    context.user_data["new_kr_q"] = quarter
+    context.user_data["awaiting_kr_title"] = True
+    await query.edit_message_text(f"Введите текст КР для {quarter}:")
+
+
+@router.route("okr_kr_pinc_{kr_id:int}_{delta:int}")
+async def okr_kr_pinc(query, context, uid, kr_id, delta):
+    await adb.update_kr_progress(kr_id, delta=delta)
+    kr = await adb.get_key_result(kr_id)
+    parent = kr["obj_id"]; q = kr["quarter"]
+    text, kb = await render_krs(parent, q)
+    await edit_screen(query, text, kb)
+
+
+# --- INBOX ---
+@router.route("inbox_add")
+async def inbox_add(query, context, uid):
+    context.user_data["awaiting_inbox_text"] = True
+    await query.edit_message_text("Напиши идею / заметку для инбокса:")
+
+
+@router.route("inbox_note_{note_id:int}")
+async def inbox_note(query, context, uid, note_id):
+    n = await adb.get_inbox_item(note_id)
+    if n:
+        dt = n["ts"].replace("T", " ")[:16]
+        text = f"🗒 Идея (ID {note_id})\n«{n['text']}»\n\n⏱ {dt}"
+    else:
+        text = "Запись не найдена."
+    kb = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton("✏️ Изменить", callback_data=f"inbox_edit_{note_id}"),
+                InlineKeyboardButton("🎯 В цель", callback_data=f"inbox_goal_{note_id}"),
+            ],
+            [
+                InlineKeyboardButton("🗓 В задачу", callback_data=f"inbox_task_{note_id}"),
+                InlineKeyboardButton("🗄 Архив", callback_data=f"inbox_archive_{note_id}"),
+            ],
+            [InlineKeyboardButton("⬅️ Назад", callback_data="inbox_back")],
         ]
-        rows.append([InlineKeyboardButton("⬅️ Отмена", callback_data="month_refresh")])
-        kb = InlineKeyboardMarkup(rows)
-        await query.edit_message_text("К какой цели добавить этап?", reply_markup=kb)
-        return
+    )
+    await edit_screen(query, text, kb)
 
-    if data.startswith("month_toggle_"):
-        tid = int(data.split("_")[-1])
-        database.toggle_done(tid)
-        text, kb = render_month(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
 
-    if data.startswith("month_push_"):
-        tid = int(data.split("_")[-1])
-        database.move_task(tid, monday_of_week(date.today()), new_lvl="week")
-        text, kb = render_month(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+# --- INBOX actions on note ---
+@router.route("inbox_edit_{nid:int}")
+async def inbox_edit(query, context, uid, nid):
+    context.user_data["edit_note_id"] = nid
+    context.user_data["awaiting_note_edit"] = True
+    await query.edit_message_text("Новый текст заметки? (оставь «-» чтобы не менять)")
 
-    if data == "month_refresh":
-        text, kb = render_month(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
 
-    # --- ADD NEW KR ---
-    if data.startswith("okr_kr_add_"):
-        # format okr_kr_add_<objId>_<Qx>
-        _, _, _, obj_id_str, quarter = data.split("_")
-        obj_id = int(obj_id_str)
-        context.user_data["new_kr_obj"] = obj_id
-        context.user_data["new_kr_q"] = quarter
-        context.user_data["awaiting_kr_title"] = True
-        await query.edit_message_text(f"Введите текст КР для {quarter}:")
+@router.route("inbox_archive_{nid:int}")
+async def inbox_archive(query, context, uid, nid):
+    await adb.archive_inbox_item(nid)
+    await query.edit_message_text("Запись перемещена в архив.")
+    text, kb = await render_inbox(uid)
+    await query.message.reply_text(text, reply_markup=kb)
+
+
+@router.route("inbox_goal_{nid:int}")
+async def inbox_goal(query, context, uid, nid):
+    note = await adb.get_inbox_item(nid)
+    if note:
+        obj_id = await adb.add_objective(uid, note["text"][:60])
+        await query.edit_message_text(f"Создана цель из заметки! ID цели: {obj_id}")
+        await adb.archive_inbox_item(nid)
+    else:
+        await query.edit_message_text("Заметка не найдена.")
+    text, kb = await render_inbox(uid)
+    await query.message.reply_text(text, reply_markup=kb)
+
+
+@router.route("inbox_task_{nid:int}")
+async def inbox_task(query, context, uid, nid):
+    note = await adb.get_inbox_item(nid)
+    if not note:
+        await query.edit_message_text("Заметка не найдена.")
         return
-    if data.startswith("okr_kr_pinc_"):
-        _, _, _, kr_id_str, delta_str = data.split("_")
-        kr_id = int(kr_id_str)
-        delta = int(delta_str)
-        database.update_kr_progress(kr_id, delta=delta)
-        kr = database._table("okr").get(doc_id=kr_id)
-        parent = kr["obj_id"]; q = kr["quarter"]
-        text, kb = render_krs(parent, q)
-        await query.edit_message_text(text, reply_markup=kb)
+    kb = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton("Завтра", callback_data=f"task_day_{nid}_tomorrow"),
+                InlineKeyboardButton("📅 Дата…", callback_data=f"task_day_{nid}_ask"),
+            ],
+            [InlineKeyboardButton("⬅️ Назад", callback_data=f"inbox_note_{nid}")],
+        ]
+    )
+    await query.edit_message_text("На какой день поставить задачу?", reply_markup=kb)
+
+
+@router.route("task_day_{nid:int}_{choice}")
+async def task_day(query, context, uid, nid, choice):
+    note = await adb.get_inbox_item(nid)
+    if not note:
+        await query.edit_message_text("Заметка не найдена.")
         return
-    # --- INBOX ---
-    if data == "inbox_add":
-        context.user_data["awaiting_inbox_text"] = True
-        await query.edit_message_text("Напиши идею / заметку для инбокса:")
+    if choice == "ask":
+        context.user_data["note_to_task_id"] = nid
+        context.user_data["awaiting_task_date"] = True
+        await query.edit_message_text("Введите дату задачи (DD.MM):")
         return
 
-    if data.startswith("inbox_note_"):
-        note_id = int(data.split("_")[-1])
-        n = database._table("inbox").get(doc_id=note_id)
-        if n:
-            dt = n["ts"].replace("T", " ")[:16]
-            text = f"🗒 Идея (ID {note_id})\n«{n['text']}»\n\n⏱ {dt}"
-        else:
-            text = "Запись не найдена."
-        kb = InlineKeyboardMarkup(
-            [
-                [
-                    InlineKeyboardButton("✏️ Изменить", callback_data=f"inbox_edit_{note_id}"),
-                    InlineKeyboardButton("🎯 В цель", callback_data=f"inbox_goal_{note_id}"),
-                ],
-                [
-                    InlineKeyboardButton("🗓 В задачу", callback_data=f"inbox_task_{note_id}"),
-                    InlineKeyboardButton("🗄 Архив", callback_data=f"inbox_archive_{note_id}"),
-                ],
-                [InlineKeyboardButton("⬅️ Назад", callback_data="inbox_back")],
-            ]
-        )
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+    # only 'tomorrow' option remains
+    due = date.today() + timedelta(days=1)
+    msg = "Задача добавлена на завтра!"
 
-    # --- INBOX actions on note ---
-    if data.startswith("inbox_edit_"):
-        nid = int(data.split("_")[-1])
-        context.user_data["edit_note_id"] = nid
-        context.user_data["awaiting_note_edit"] = True
-        await query.edit_message_text("Новый текст заметки? (оставь «-» чтобы не менять)")
-        return
+    await adb.add_task(uid, note["text"], due, lvl="day")
+    await adb.archive_inbox_item(nid)
+    await query.edit_message_text(msg)
 
-    if data.startswith("inbox_archive_"):
-        nid = int(data.split("_")[-1])
-        database.archive_inbox_item(nid)
-        await query.edit_message_text("Запись перемещена в архив.")
-        text, kb = render_inbox(uid)
-        await query.message.reply_text(text, reply_markup=kb)
-        return
 
-    if data.startswith("inbox_goal_"):
-        nid = int(data.split("_")[-1])
-        note = database._table("inbox").get(doc_id=nid)
-        if note:
-            obj_id = database.add_objective(uid, note["text"][:60])
-            await query.edit_message_text(f"Создана цель из заметки! ID цели: {obj_id}")
-            database.archive_inbox_item(nid)
-        else:
-            await query.edit_message_text("Заметка не найдена.")
-        text, kb = render_inbox(uid)
-        await query.message.reply_text(text, reply_markup=kb)
-        return
+@router.route("inbox_back")
+async def inbox_back(query, context, uid):
+    text, kb = await render_inbox(uid, context.user_data.get("page_inbox"))
+    await edit_screen(query, text, kb)
 
-    if data.startswith("inbox_task_"):
-        nid = int(data.split("_")[-1])
-        note = database._table("inbox").get(doc_id=nid)
-        if not note:
-            await query.edit_message_text("Заметка не найдена.")
-            return
+
+# TODAY actions
+@router.route("today_add")
+async def today_add(query, context, uid):
+    # Проверяем покрытие категорий
+    cats = await get_uncovered_categories_for_today(uid)
+    if cats:
+        context.user_data["awaiting_category_choice"] = True
         kb = InlineKeyboardMarkup(
-            [
-                [
-                    InlineKeyboardButton("Завтра", callback_data=f"task_day_{nid}_tomorrow"),
-                    InlineKeyboardButton("📅 Дата…", callback_data=f"task_day_{nid}_ask"),
-                ],
-                [InlineKeyboardButton("⬅️ Назад", callback_data=f"inbox_note_{nid}")],
-            ]
+            [[InlineKeyboardButton(c["title"], callback_data=f"choose_cat_{c.doc_id}")] for c in cats]
+            + [[InlineKeyboardButton("Без категории", callback_data="choose_cat_none")]]
         )
-        await query.edit_message_text("На какой день поставить задачу?", reply_markup=kb)
-        return
+        await query.edit_message_text("Выбери категорию для новой задачи:", reply_markup=kb)
+    else:
+        context.user_data["awaiting_todo_text"] = True
+        await query.edit_message_text("Введи текст задачи:")
 
-    # Handle task_day_<nid>_<choice>
-    if data.startswith("task_day_"):
-        _, _, nid_str, choice = data.split("_")
-        nid = int(nid_str)
-        note = database._table("inbox").get(doc_id=nid)
-        if not note:
-            await query.edit_message_text("Заметка не найдена.")
-            return
-        if choice == "ask":
-            context.user_data["note_to_task_id"] = nid
-            context.user_data["awaiting_task_date"] = True
-            await query.edit_message_text("Введите дату задачи (DD.MM):")
-            return
 
-        # only 'tomorrow' option remains
-        due = date.today() + timedelta(days=1)
-        msg = "Задача добавлена на завтра!"
+@router.route("today_edit_{task_id:int}")
+async def today_edit(query, context, uid, task_id):
+    context.user_data["edit_task_id"] = task_id
+    context.user_data["awaiting_edit_text"] = True
+    await query.edit_message_text("Новый текст задачи? (оставь «-» чтобы не менять)")
 
-        database.add_task(uid, note["text"], due, lvl="day")
-        database.archive_inbox_item(nid)
-        await query.edit_message_text(msg)
-        return
 
-    if data == "inbox_back":
-        text, kb = render_inbox(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+@router.route("today_toggle_{task_id:int}")
+async def today_toggle(query, context, uid, task_id):
+    task = await adb.get_task(task_id)
+    prev_done = task["done"]
+    await adb.toggle_done(task_id)
+    task = await adb.get_task(task_id)
+    kr_id = task.get("kr_id")
+    if kr_id:
+        delta = 10 if task["done"] and not prev_done else -10
+        await adb.update_kr_progress(kr_id, delta=delta)
+    text, kb = await render_today(uid, context.user_data.get("page_today"))
+    await edit_screen(query, text, kb)
 
-    if data == "today_add":
-        # Проверяем покрытие категорий
-        cats = get_uncovered_categories_for_today(uid)
-        if cats:
-            context.user_data["awaiting_category_choice"] = True
-            kb = InlineKeyboardMarkup(
-                [[InlineKeyboardButton(c["title"], callback_data=f"choose_cat_{c.doc_id}")] for c in cats]
-                + [[InlineKeyboardButton("Без категории", callback_data="choose_cat_none")]]
-            )
-            await query.edit_message_text("Выбери категорию для новой задачи:", reply_markup=kb)
-            return
-        else:
-            context.user_data["awaiting_todo_text"] = True
-            await query.edit_message_text("Введи текст задачи:")
-            return
 
-    if data.startswith("today_edit_"):
-        task_id = int(data.split("_")[-1])
-        context.user_data["edit_task_id"] = task_id
-        context.user_data["awaiting_edit_text"] = True
-        await query.edit_message_text("Новый текст задачи? (оставь «-» чтобы не менять)")
-        return
+@router.route("today_refresh")
+async def today_refresh(query, context, uid):
+    text, kb = await render_today(uid, context.user_data.get("page_today"))
+    await edit_screen(query, text, kb)
 
-    if data.startswith("today_toggle_"):
-        task_id = int(data.split("_")[-1])
-        task = database.get_task(task_id)
-        prev_done = task["done"]
-        database.toggle_done(task_id)
-        task = database.get_task(task_id)
-        kr_id = task.get("kr_id")
-        if kr_id:
-            delta = 10 if task["done"] and not prev_done else -10
-            database.update_kr_progress(kr_id, delta=delta)
-        text, kb = render_today(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
 
-    if data == "today_refresh":
-        text, kb = render_today(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+# WEEK actions
+@router.route("week_add")
+async def week_add(query, context, uid):
+    context.user_data["awaiting_week_text"] = True
+    await query.edit_message_text("Введите текст задачи для этой недели:")
 
-    # WEEK actions
-    if data == "week_add":
-        context.user_data["awaiting_week_text"] = True
-        await query.edit_message_text("Введите текст задачи для этой недели:")
-        return
 
-    if data.startswith("week_toggle_"):
-        task_id = int(data.split("_")[-1])
-        database.toggle_done(task_id)
-        text, kb = render_week(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+@router.route("week_toggle_{task_id:int}")
+async def week_toggle(query, context, uid, task_id):
+    await adb.toggle_done(task_id)
+    text, kb = await render_week(uid, context.user_data.get("page_week"))
+    await edit_screen(query, text, kb)
 
-    if data.startswith("week_push_"):
-        task_id = int(data.split("_")[-1])
-        database.move_task(task_id, date.today(), new_lvl="day")
-        text, kb = render_week(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
 
-    if data == "week_move_next":
-        # move all open tasks to next Monday
-        week_start = monday_of_week(date.today())
-        tasks = database.list_tasks(uid, week_start, lvl="week", include_done=False)
-        for t in tasks:
-            database.move_task(t.doc_id, next_monday(date.today()), new_lvl="week")
-        text, kb = render_week(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+@router.route("week_push_{task_id:int}")
+async def week_push(query, context, uid, task_id):
+    await adb.move_task(task_id, date.today(), new_lvl="day")
+    text, kb = await render_week(uid, context.user_data.get("page_week"))
+    await edit_screen(query, text, kb)
 
-    if data == "week_refresh":
-        text, kb = render_week(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
 
-    if data.startswith("task_start_ok_"):
-        task_id = int(data.split("_")[-1])
-        database.set_task_status(task_id, "started")
-        await query.edit_message_text("Старт подтверждён ✔️")
-        return
+@router.route("week_move_next")
+async def week_move_next(query, context, uid):
+    # move all open tasks to next Monday
+    week_start = monday_of_week(date.today())
+    tasks = await adb.list_tasks(uid, week_start, lvl="week", include_done=False)
+    for t in tasks:
+        await adb.move_task(t.doc_id, next_monday(date.today()), new_lvl="week")
+    text, kb = await render_week(uid, context.user_data.get("page_week"))
+    await edit_screen(query, text, kb)
 
-    # --- SNOOZE start/end ---
-    if data.startswith("task_start_snooze_"):
-        tid = int(data.split("_")[-1])
-        # schedule repeat start_notify in 15 minutes (900 sec)
-        context.job_queue.run_once(
-            start_notify,
-            when=900,
-            data={"cid": uid, "tid": tid},
-        )
-        await query.edit_message_text("Напоминание отложено на 15 минут ⏰")
-        return
 
-    if data.startswith("task_end_ok_"):
-        task_id = int(data.split("_")[-1])
-        # 1) помечаем статус 'done'
-        database.set_task_status(task_id, "done")
-        # 2) ставим флаг done=True, чтобы галочка отображалась в списке
-        database.toggle_done(task_id)
-        # --- bump KR progress if linked
-        task = database.get_task(task_id)
-        kr_id = task.get("kr_id")
-        if kr_id:
-            database.update_kr_progress(kr_id, delta=10)
-        # 3) обновляем экран "Сегодня", чтобы сразу увидеть выполненную задачу
-        text, kb = render_today(uid)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
+@router.route("week_refresh")
+async def week_refresh(query, context, uid):
+    text, kb = await render_week(uid, context.user_data.get("page_week"))
+    await edit_screen(query, text, kb)
 
-    if data.startswith("task_end_snooze_"):
-        tid = int(data.split("_")[-1])
-        context.job_queue.run_once(
-            end_notify,
-            when=900,
-            data={"cid": uid, "tid": tid},
-        )
-        await query.edit_message_text("Напоминание отложено на 15 минут ⏰")
-        return
 
-    # --- GOALS/OKR ---
-    if data == "okr_add_goal":
-        context.user_data["awaiting_goal_title"] = True
-        cancel_kb = InlineKeyboardMarkup(
-            [[InlineKeyboardButton("❌ Отмена", callback_data="okr_cancel_goal")]]
-        )
-        await query.edit_message_text("Введите название новой цели:", reply_markup=cancel_kb)
-        return
+# --- Task start/end reminders ---
+@router.route("task_start_ok_{task_id:int}")
+async def task_start_ok(query, context, uid, task_id):
+    await adb.set_task_status(task_id, "started")
+    await query.edit_message_text("Старт подтверждён ✔️")
 
-    if data == "okr_cancel_goal":
-        # Clear any pending goal creation flags
-        context.user_data.pop("awaiting_goal_title", None)
-        context.user_data.pop("awaiting_goal_due", None)
-        context.user_data.pop("new_goal_title", None)
-        text, kb = render_goals(uid)
-        await query.edit_message_text("Добавление цели отменено.", reply_markup=kb)
-        return
 
-    if context.user_data.get("awaiting_goal_title"):
-        # handled in text router
-        pass
-
-    if data.startswith("okr_obj_"):
-        obj_id = int(data.split("_")[-1])
-        obj = get_objective(obj_id)
-        due = obj.get("due", "—")
-        # Show quarter selection
-        text, kb = render_quarters(obj_id)
-        await query.edit_message_text(
-            f"Цель: {obj['title']}\nСрок: ⏳{due}\n\n{text}", reply_markup=kb
-        )
-        return
+# --- SNOOZE start/end ---
+@router.route("task_start_snooze_{tid:int}")
+async def task_start_snooze(query, context, uid, tid):
+    # repeat start_notify in 15 minutes (persisted like any reminder)
+    await schedule_reminder(
+        context.job_queue, uid, tid, "start",
+        datetime.now(timezone.utc) + timedelta(seconds=900),
+    )
+    await query.edit_message_text("Напоминание отложено на 15 минут ⏰")
+
+
+@router.route("task_end_ok_{task_id:int}")
+async def task_end_ok(query, context, uid, task_id):
+    # 1) помечаем статус 'done'
+    await adb.set_task_status(task_id, "done")
+    # 2) ставим флаг done=True, чтобы галочка отображалась в списке
+    await adb.toggle_done(task_id)
+    # --- bump KR progress if linked
+    task = await adb.get_task(task_id)
+    kr_id = task.get("kr_id")
+    if kr_id:
+        await adb.update_kr_progress(kr_id, delta=10)
+    # 3) обновляем экран "Сегодня", чтобы сразу увидеть выполненную задачу
+    text, kb = await render_today(uid)
+    await edit_screen(query, text, kb)
+
+
+@router.route("task_end_snooze_{tid:int}")
+async def task_end_snooze(query, context, uid, tid):
+    await schedule_reminder(
+        context.job_queue, uid, tid, "end",
+        datetime.now(timezone.utc) + timedelta(seconds=900),
+    )
+    await query.edit_message_text("Напоминание отложено на 15 минут ⏰")
 
-    if data.startswith("okr_q_"):
-        # e.g. okr_q_123_Q1
-        parts = data.split("_")
-        obj_id = int(parts[2])
-        quarter = parts[3]
-        text, kb = render_krs(obj_id, quarter)
-        await query.edit_message_text(text, reply_markup=kb)
-        return
-    # --- OKR KR progress and pin ---
-    if data.startswith("okr_kr_prog_"):
-        kr_id = int(data.split("_")[-1])
-        kr = database._table("okr").get(doc_id=kr_id)
-        if not kr:
-            await query.edit_message_text("КР не найден.")
-            return
-        context.user_data["edit_kr_id"] = kr_id
-        context.user_data["awaiting_kr_progress"] = True
-        await query.edit_message_text(
-            f"Текущий прогресс КР:\n«{kr['title']}»\n\nСейчас: {kr.get('progress',0)}%\nВведи новый прогресс (0-100):"
-        )
-        return
 
-    if data.startswith("okr_kr_pin_"):
-        kr_id = int(data.split("_")[-1])
-        kr = database._table("okr").get(doc_id=kr_id)
-        if not kr:
-            await query.edit_message_text("КР не найден.")
-            return
-        kb = InlineKeyboardMarkup(
-            [
-                [
-                    InlineKeyboardButton("📆 В месяц", callback_data=f"okr_pin_lvl_{kr_id}_month"),
-                    InlineKeyboardButton("🗓 В неделю", callback_data=f"okr_pin_lvl_{kr_id}_week"),
-                    InlineKeyboardButton("📋 На день", callback_data=f"okr_pin_lvl_{kr_id}_day"),
-                ],
-                [InlineKeyboardButton("⬅️ Отмена", callback_data="okr_back")]
-            ]
-        )
-        await query.edit_message_text(
-            f"Куда добавить задачу из КР «{kr['title']}»?", reply_markup=kb
-        )
-        return
+# --- GOALS/OKR ---
+@router.route("okr_add_goal")
+async def okr_add_goal(query, context, uid):
+    context.user_data["awaiting_goal_title"] = True
+    cancel_kb = InlineKeyboardMarkup(
+        [[InlineKeyboardButton("❌ Отмена", callback_data="okr_cancel_goal")]]
+    )
+    await query.edit_message_text("Введите название новой цели:", reply_markup=cancel_kb)
+
+
+@router.route("okr_cancel_goal")
+async def okr_cancel_goal(query, context, uid):
+    # Clear any pending goal creation flags
+    context.user_data.pop("awaiting_goal_title", None)
+    context.user_data.pop("awaiting_goal_due", None)
+    context.user_data.pop("new_goal_title", None)
+    text, kb = await render_goals(uid)
+    await query.edit_message_text("Добавление цели отменено.", reply_markup=kb)
+
+
+@router.route("okr_obj_{obj_id:int}")
+async def okr_obj(query, context, uid, obj_id):
+    obj = await get_objective(obj_id)
+    due = obj.get("due", "—")
+    # Show quarter selection
+    text, kb = render_quarters(obj_id, obj)
+    await query.edit_message_text(
+        f"Цель: {obj['title']}\nСрок: ⏳{due}\n\n{text}", reply_markup=kb
+    )
 
-    if data.startswith("okr_pin_lvl_"):
-        _, _, _, kr_id_str, lvl = data.split("_")
-        kr_id = int(kr_id_str)
-        kr = database._table("okr").get(doc_id=kr_id)
-        if not kr:
-            await query.edit_message_text("КР не найден.")
-            return
-        title = kr["title"]
-        today = date.today()
-        if lvl == "month":
-            due = today.replace(day=1)
-        elif lvl == "week":
-            due = monday_of_week(today)
-        else:  # day
-            due = today
-        database.add_task(uid, title, due, lvl=lvl, kr_id=kr_id)
-        await query.edit_message_text(f"Задача добавлена в {lvl}! 🔗 связана с КР.")
-        # optional: mark pinned true
-        database._table("okr").update({"pinned": True}, doc_ids=[kr_id])
+
+@router.route("okr_q_{obj_id:int}_{quarter}")
+async def okr_q(query, context, uid, obj_id, quarter):
+    text, kb = await render_krs(obj_id, quarter)
+    await edit_screen(query, text, kb)
+
+
+# --- OKR KR progress and pin ---
+@router.route("okr_kr_prog_{kr_id:int}")
+async def okr_kr_prog(query, context, uid, kr_id):
+    kr = await adb.get_key_result(kr_id)
+    if not kr:
+        await query.edit_message_text("КР не найден.")
         return
-    # --- OKR: KR progress edit via text input ---
-    if context.user_data.get("awaiting_kr_progress"):
-        kr_id = context.user_data.pop("edit_kr_id")
-        context.user_data.pop("awaiting_kr_progress", None)
-        try:
-            val = int(txt)
-            if not (0 <= val <= 100):
-                raise ValueError
-        except Exception:
-            await update.message.reply_text("Введи число от 0 до 100.")
-            return
-        database.update_kr_progress(kr_id, progress=val)
-        kr = database._table("okr").get(doc_id=kr_id)
-        parent = kr.get("parent")
-        quarter = kr.get("quarter")
-        await update.message.reply_text(f"Прогресс КР обновлён: {val}%")
-        # Show updated KR list
-        if parent and quarter:
-            text, kb = render_krs(parent, quarter)
-            await update.message.reply_text(text, reply_markup=kb)
+    context.user_data["edit_kr_id"] = kr_id
+    context.user_data["awaiting_kr_progress"] = True
+    await query.edit_message_text(
+        f"Текущий прогресс КР:\n«{kr['title']}»\n\nСейчас: {kr.get('progress',0)}%\nВведи новый прогресс (0-100):"
+    )
+
+
+@router.route("okr_kr_pin_{kr_id:int}")
+async def okr_kr_pin(query, context, uid, kr_id):
+    kr = await adb.get_key_result(kr_id)
+    if not kr:
+        await query.edit_message_text("КР не найден.")
         return
+    kb = InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton("📆 В месяц", callback_data=f"okr_pin_lvl_{kr_id}_month"),
+                InlineKeyboardButton("🗓 В неделю", callback_data=f"okr_pin_lvl_{kr_id}_week"),
+                InlineKeyboardButton("📋 На день", callback_data=f"okr_pin_lvl_{kr_id}_day"),
+            ],
+            [InlineKeyboardButton("⬅️ Отмена", callback_data="okr_back")]
+        ]
+    )
+    await query.edit_message_text(
+        f"Куда добавить задачу из КР «{kr['title']}»?", reply_markup=kb
+    )
 
-    if data.startswith("okr_due_"):
-        obj_id = int(data.split("_")[-1])
-        context.user_data["edit_obj_id"] = obj_id
-        context.user_data["awaiting_due_edit"] = True
-        await query.edit_message_text("Новый срок? (Qx-YYYY или DD.MM.YYYY, «-» чтобы оставить)")
+
+@router.route("okr_pin_lvl_{kr_id:int}_{lvl}")
+async def okr_pin_lvl(query, context, uid, kr_id, lvl):
+    kr = await adb.get_key_result(kr_id)
+    if not kr:
+        await query.edit_message_text("КР не найден.")
         return
+    title = kr["title"]
+    today = date.today()
+    if lvl == "month":
+        due = today.replace(day=1)
+    elif lvl == "week":
+        due = monday_of_week(today)
+    else:  # day
+        due = today
+    await adb.add_task(uid, title, due, lvl=lvl, kr_id=kr_id)
+    await query.edit_message_text(f"Задача добавлена в {lvl}! 🔗 связана с КР.")
+    # optional: mark pinned true
+    await adb.set_kr_pinned(kr_id)
+
+
+@router.route("okr_due_{obj_id:int}")
+async def okr_due(query, context, uid, obj_id):
+    context.user_data["edit_obj_id"] = obj_id
+    context.user_data["awaiting_due_edit"] = True
+    await query.edit_message_text("Новый срок? (Qx-YYYY или DD.MM.YYYY, «-» чтобы оставить)")
+
+
+@router.route("okr_back")
+async def okr_back(query, context, uid):
+    text, kb = await render_goals(uid, context.user_data.get("page_goals"))
+    await edit_screen(query, text, kb)
+
+
+# --- Paged lists: ◀️ / ▶️ ---
+PAGED_SCREENS = {
+    "today": render_today,
+    "week": render_week,
+    "goals": render_goals,
+    "inbox": render_inbox,
+}
+
 
-    if data == "okr_back":
-        text, kb = render_goals(uid)
-        await query.edit_message_text(text, reply_markup=kb)
+@router.route("pg_{screen}_{cursor}")
+async def page_screen(query, context, uid, screen, cursor):
+    render = PAGED_SCREENS.get(screen)
+    if render is None:
         return
+    # later redraws of this screen (toggle, refresh, …) stay on this page
+    context.user_data[f"page_{screen}"] = cursor
+    text, kb = await render(uid, cursor)
+    await edit_screen(query, text, kb)
 
+
+@router.fallback
+async def not_implemented(query, context, uid, data):
     await query.edit_message_text(f"Нажата кнопка: {data} (ещё не реализовано)")
 
 # ---------- Text handler for adding today/week task ---------- #
 async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Plain text: the step an awaiting_* flag asks for, a secretary question
+    (streamed, see stream_ai_reply), or else echo_to_rocky.
+    """
     uid = update.effective_user.id
     txt = update.message.text.strip()
     # Auto-switch to secretary if it's a standalone question
@@ -1444,7 +1629,7 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # --- AI QUESTION ---
     # Check existing tasks before invoking AI
     if context.user_data.get("awaiting_ai_question"):
-        matches = find_matching_tasks(uid, txt)
+        matches = await find_matching_tasks(uid, txt)
         if matches:
             lines = []
             for t in matches:
@@ -1465,28 +1650,30 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(reply_text)
             return
         context.user_data.pop("awaiting_ai_question")
-        await update.message.reply_text("Думаю… (это может занять несколько секунд) ⏳")
-        prompt = ai_service.build_context(uid) + "\n\n## user-question\n" + txt
+        thinking = await update.message.reply_text("Думаю… (это может занять несколько секунд) ⏳")
+        prompt = (await ai_service.build_context(uid)) + "\n\n## user-question\n" + txt
         try:
-            resp = await ai_service.ask_ai(prompt)
+            content = await stream_ai_reply(thinking, prompt, uid)
+            resp = ai_service.parse_reply(content)
             # If JSON returned, just pretty‑print; else text
             if isinstance(resp, dict):
                 import json, textwrap
-                await update.message.reply_text(
+                await safe_edit(
+                    thinking,
                     "Ответ ассистента:\n" + textwrap.fill(json.dumps(resp, ensure_ascii=False, indent=2), 80)
                 )
                 # basic action: create tasks if specified
                 if resp.get("action") == "create_tasks":
                     for t in resp["tasks"]:
                         due = datetime.strptime(t["date"], "%Y-%m-%d").date()
-                        database.add_task(uid, t["text"], due, lvl="day")
+                        await adb.add_task(uid, t["text"], due, lvl="day")
                     await update.message.reply_text("Новые задачи созданы ✅")
             else:
                 # Try parse plain text into task
                 slot = parse_ai_slot(resp)
                 if slot:
                     due, t1, t2, desc = slot
-                    tid = database.add_task(
+                    tid = await adb.add_task(
                         uid,
                         desc,
                         due,
@@ -1494,7 +1681,7 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         start_ts=datetime.combine(due, t1, tzinfo=USER_TZ).isoformat(),
                         end_ts=datetime.combine(due, t2, tzinfo=USER_TZ).isoformat(),
                     )
-                    schedule_task_jobs(
+                    await schedule_task_jobs(
                         context.job_queue,
                         update.effective_chat.id,
                         tid,
@@ -1506,10 +1693,8 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     )
                     # Always refresh today's list if task is for today
                     if due == date.today():
-                        text_today, kb_today = render_today(uid)
+                        text_today, kb_today = await render_today(uid)
                         await update.message.reply_text(text_today, reply_markup=kb_today)
-                else:
-                    await update.message.reply_text(str(resp))
         except Exception as e:
             logger.exception("AI error")
             await update.message.reply_text(f"Ошибка AI: {e}")
@@ -1520,12 +1705,12 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not title:
             await update.message.reply_text("Пустой текст — отмена.")
             context.user_data.pop("awaiting_goal_title")
-            text, kb = render_goals(uid)
+            text, kb = await render_goals(uid)
             await update.message.reply_text(text, reply_markup=kb)
             return
 
         # сохраняем цель без срока (срок можно будет добавить позднее при редактировании)
-        goal_id = database.add_objective(uid, title)
+        goal_id = await adb.add_objective(uid, title)
         context.user_data.pop("awaiting_goal_title", None)
 
         # сразу переходим к этапам
@@ -1564,6 +1749,47 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Стартовый прогресс КР (0‑100)?")
         return
 
+    # --- CREATE KR STEP 2: initial progress ---
+    if context.user_data.get("awaiting_kr_init"):
+        try:
+            val = int(txt)
+            if not (0 <= val <= 100):
+                raise ValueError
+        except Exception:
+            await update.message.reply_text("Введи число от 0 до 100.")
+            return
+        context.user_data.pop("awaiting_kr_init")
+        title = context.user_data.pop("new_kr_title")
+        obj_id = context.user_data.pop("new_kr_obj")
+        quarter = context.user_data.pop("new_kr_q")
+        await adb.add_key_result(uid, obj_id, title, quarter, progress=val)
+        await update.message.reply_text(f"КР «{title}» добавлен: {val}%")
+        text, kb = await render_krs(obj_id, quarter)
+        await update.message.reply_text(text, reply_markup=kb)
+        return
+
+    # --- OKR: KR progress edit (after ✏️ on a KR) ---
+    if context.user_data.get("awaiting_kr_progress"):
+        kr_id = context.user_data.pop("edit_kr_id")
+        context.user_data.pop("awaiting_kr_progress", None)
+        try:
+            val = int(txt)
+            if not (0 <= val <= 100):
+                raise ValueError
+        except Exception:
+            await update.message.reply_text("Введи число от 0 до 100.")
+            return
+        await adb.update_kr_progress(kr_id, progress=val)
+        kr = await adb.get_key_result(kr_id)
+        parent = kr.get("obj_id")
+        quarter = kr.get("quarter")
+        await update.message.reply_text(f"Прогресс КР обновлён: {val}%")
+        # Show updated KR list
+        if parent and quarter:
+            text, kb = await render_krs(parent, quarter)
+            await update.message.reply_text(text, reply_markup=kb)
+        return
+
     # --- STEP 1: text for today's task (с учётом категории) ---
     if context.user_data.get("awaiting_todo_text"):
         if txt:
@@ -1576,8 +1802,7 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Пустой текст — отмена.")
             context.user_data.pop("awaiting_todo_text", None)
             return
-    # --- CREATE KR STEP 2: initial progress ---
-        # --- STEP 2: start time ---
+    # --- STEP 2: start time ---
     if context.user_data.get("awaiting_todo_start"):
         t = parse_time(txt)
         if not t:
@@ -1612,7 +1837,7 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         start_dt = datetime.combine(today_dt, context.user_data["new_task_start"], tzinfo=USER_TZ)
         # --- Категория для задачи ---
         category_id = context.user_data.pop("category_id", None) if "category_id" in context.user_data else None
-        task_id = database.add_task(
+        task_id = await adb.add_task(
             uid,
             context.user_data["new_task_txt"],
             today_dt,
@@ -1638,7 +1863,7 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # --- СТАВИМ JOB НА СТАРТ И КОНЕЦ задачи ---
         from datetime import timedelta
         end_dt = start_dt + timedelta(minutes=duration)
-        schedule_task_jobs(
+        await schedule_task_jobs(
             context.job_queue,
             update.effective_chat.id,
             task_id,
@@ -1648,12 +1873,7 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         for k in ["awaiting_todo_duration", "new_task_txt", "new_task_start"]:
             context.user_data.pop(k, None)
         # --- Проверить покрытие категорий ---
-        cats = database.list_categories(uid)
-        covered = set()
-        for c in cats:
-            tasks = database.list_tasks_by_category(uid, c.doc_id, due=today_dt)
-            if tasks:
-                covered.add(c.doc_id)
+        cats, covered = await category_coverage(uid, today_dt)
         if len(covered) < 2 and len(cats) >= 2:
             # Нужно минимум 2 разные категории
             await update.message.reply_text("Добавь задачу ещё по другой категории. Выбери категорию:")
@@ -1668,37 +1888,156 @@ async def text_input_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         return
 
+    # --- INBOX: new note ---
+    if context.user_data.get("awaiting_inbox_text"):
+        context.user_data.pop("awaiting_inbox_text")
+        if not txt:
+            await update.message.reply_text("Пустой текст — отмена.")
+            return
+        await adb.add_inbox(uid, txt)
+        text, kb = await render_inbox(uid, context.user_data.get("page_inbox"))
+        await update.message.reply_text("Заметка сохранена ✅")
+        await update.message.reply_text(text, reply_markup=kb)
+        return
 
-# ---------- Daily inbox reminder ---------- #
-async def inbox_daily_reminder(context: ContextTypes.DEFAULT_TYPE):
-    """At 20:00 remind user about new Inbox notes created today."""
-    uid = context.job.data.get("uid")
-    chat_id = context.job.data.get("chat_id")
-    if not uid or not chat_id:
+    # --- INBOX: note edit ("-" keeps the text) ---
+    if context.user_data.get("awaiting_note_edit"):
+        context.user_data.pop("awaiting_note_edit")
+        nid = context.user_data.pop("edit_note_id", None)
+        if nid is not None and txt and txt != "-":
+            await adb.update_inbox_text(nid, txt)
+        text, kb = await render_inbox(uid, context.user_data.get("page_inbox"))
+        await update.message.reply_text(text, reply_markup=kb)
         return
-    today_iso = date.today().isoformat()
-    notes_today = [
-        n
-        for n in database.list_inbox(uid)
-        if not n.get("archived") and n["ts"].startswith(today_iso)
-    ]
-    if notes_today:
-        await context.bot.send_message(
-            chat_id,
-            f"🔔 Сегодня появилось {len(notes_today)} новых заметок в Инбоксе.\n"
-            "Подумай, нужно ли превратить их в цели или задачи!",
-        )
+
+    # --- INBOX → task on a date (DD.MM) ---
+    if context.user_data.get("awaiting_task_date"):
+        try:
+            d, m = map(int, txt.replace("/", ".").split("."))
+            due = date(date.today().year, m, d)
+        except ValueError:
+            await update.message.reply_text("Формат даты DD.MM, попробуй ещё раз.")
+            return
+        if due < date.today():
+            due = due.replace(year=due.year + 1)
+        context.user_data.pop("awaiting_task_date")
+        nid = context.user_data.pop("note_to_task_id", None)
+        note = await adb.get_inbox_item(nid) if nid is not None else None
+        if not note:
+            await update.message.reply_text("Заметка не найдена.")
+            return
+        await adb.add_task(uid, note["text"], due, lvl="day")
+        await adb.archive_inbox_item(nid)
+        await update.message.reply_text(f"Задача добавлена на {due.strftime('%d.%m.%Y')}!")
+        return
+
+    # --- MONTH: new task ---
+    if context.user_data.get("awaiting_month_text"):
+        context.user_data.pop("awaiting_month_text")
+        if not txt:
+            await update.message.reply_text("Пустой текст — отмена.")
+            return
+        await adb.add_task(uid, txt, date.today().replace(day=1), lvl="month")
+        text, kb = await render_month(uid)
+        await update.message.reply_text(text, reply_markup=kb)
+        return
+
+    # --- WEEK: new task ---
+    if context.user_data.get("awaiting_week_text"):
+        context.user_data.pop("awaiting_week_text")
+        if not txt:
+            await update.message.reply_text("Пустой текст — отмена.")
+            return
+        await adb.add_task(uid, txt, monday_of_week(date.today()), lvl="week")
+        text, kb = await render_week(uid, context.user_data.get("page_week"))
+        await update.message.reply_text(text, reply_markup=kb)
+        return
+
+    # --- TODAY: task text edit ("-" keeps the text) ---
+    if context.user_data.get("awaiting_edit_text"):
+        context.user_data.pop("awaiting_edit_text")
+        task_id = context.user_data.pop("edit_task_id", None)
+        if task_id is not None and txt and txt != "-":
+            await adb.update_task(task_id, text=txt)
+        text, kb = await render_today(uid, context.user_data.get("page_today"))
+        await update.message.reply_text(text, reply_markup=kb)
+        return
+
+    # --- OKR: objective due edit ("-" keeps it) ---
+    if context.user_data.get("awaiting_due_edit"):
+        if txt != "-":
+            due = parse_due(txt)
+            if not due:
+                await update.message.reply_text("Формат: Qx-YYYY или DD.MM.YYYY, «-» чтобы оставить.")
+                return
+            await adb.update_objective(context.user_data["edit_obj_id"], due=due)
+        context.user_data.pop("awaiting_due_edit")
+        context.user_data.pop("edit_obj_id", None)
+        text, kb = await render_goals(uid, context.user_data.get("page_goals"))
+        await update.message.reply_text(text, reply_markup=kb)
+        return
+
+    # --- nothing awaited: plain text goes to Rocky ---
+    await echo_to_rocky(update, context)
+
+
+# ---------- Daily inbox reminder ---------- #
+async def inbox_dispatch(context: ContextTypes.DEFAULT_TYPE):
+    """Every minute: remind users whose local 20:00 came about today's Inbox notes."""
+
+    async def send(chat_id: int, count: int) -> None:
+        try:
+            await context.bot.send_message(
+                chat_id,
+                f"🔔 Сегодня появилось {count} новых заметок в Инбоксе.\n"
+                "Подумай, нужно ли превратить их в цели или задачи!",
+                rate_limit_args=outbound.BROADCAST,
+            )
+        except TelegramError:
+            logger.warning("Inbox reminder to %s failed", chat_id, exc_info=True)
+
+    # all queued at once: the outbound limiter paces them behind interactive traffic
+    await asyncio.gather(*(send(c, n) for c, n in await inbox_reminder.collect()))
+
+async def on_startup(application: Application) -> None:
+    """Repair KR aggregates; start the STT workers in the background when STT_WARMUP=1."""
+    await adb.reconcile_kr_stats()
+    if stt_pool.WARMUP:
+        application.create_task(stt_pool.warm_up())
 
 async def on_shutdown(application: Application) -> None:
-    """Flush TinyDB cache to disk when the bot stops."""
-    close_db()
-    logger.info("Database closed and cache flushed.")
+    """Close the AI HTTP pools and flush TinyDB cache to disk when the bot stops."""
+    await ai_service.close_client()
+    await abacus_client.close_client()
+    logger.info("STT pool: %s", stt_pool.metrics())
+    await stt_pool.close()
+    await adb.close_db()
+    logger.info("Database closed and cache flushed. Storage: %s", database.storage_metrics())
+    logger.info("LLM gateways: %s", llm_gateway.metrics())
+    logger.info("Outbound: %s", application.bot.rate_limiter.metrics())
+    logger.info("Updates: %s", application.update_processor.metrics())
+    logger.info("Callbacks: %s", router.metrics())
+    logger.info("Screens: %s", screen_cache.metrics())
 
 # ---------- main ---------- #
+# Updates processed in parallel (per‑user order is kept, see updates.py)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+# Webhook mode (cfg.webhook_url set): local listener behind the HTTPS proxy
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+
+
 def main(return_app: bool = False) -> Application | None:
+    # shared keep‑alive HTTP pool for DeepSeek, closed in on_shutdown
+    ai_service.open_client()
+    abacus_client.open_client()
     application: Application = (
         ApplicationBuilder()
         .token(cfg.tg_token)
+        .rate_limiter(outbound.OutboundLimiter())
+        .concurrent_updates(updates.PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(on_startup)
         .post_shutdown(on_shutdown)
         .build()
     )
@@ -1743,27 +2082,44 @@ def main(return_app: bool = False) -> Application | None:
     application.add_handler(MessageHandler(filters.Regex("^⬅️ Свернуть$"), collapse_menu))
     application.add_handler(MessageHandler(filters.Regex("^🤖 Секретарь$"), cmd_ai))
 
-    # Text to Rocky
+    # Inline buttons
+    application.add_handler(CallbackQueryHandler(router.dispatch))
+
+    # Voice notes → STT → the same text routing
+    application.add_handler(MessageHandler(filters.VOICE, voice_router))
+
+    # Text: awaited answers and secretary questions, the rest to Rocky
     application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, echo_to_rocky)
+        MessageHandler(filters.TEXT & ~filters.COMMAND, text_input_router)
     )
 
     logger.info("Bot started…")
-    # --- восстановить ежедневные напоминания Инбокса после рестарта ---
-    from datetime import time as _t
-
-    for uid, chat in database.all_known_chats():
-        name = f"inbox_reminder_{uid}"
-        if not application.job_queue.get_jobs_by_name(name):
-            application.job_queue.run_daily(
-                inbox_daily_reminder,
-                time(hour=20, minute=0, tzinfo=USER_TZ),
-                data={"uid": uid, "chat_id": chat},
-                name=name,
-            )
+    # --- persistent task reminders: first pass restores / catches up ---
+    application.job_queue.run_repeating(
+        dispatch_reminders, interval=REMINDER_WINDOW, first=0, name="reminder_dispatcher"
+    )
+    # --- напоминание Инбокса: один диспетчер на всех, по минутам ---
+    inbox_reminder.start()
+    application.job_queue.run_repeating(
+        inbox_dispatch, interval=60, first=60 - datetime.now().second, name="inbox_dispatcher"
+    )
     if return_app:
         return application
-    application.run_polling()
+    if cfg.webhook_url:
+        if not cfg.webhook_secret:
+            raise RuntimeError("WEBHOOK_SECRET is required in webhook mode")
+        # Telegram sends the secret in X-Telegram-Bot-Api-Secret-Token;
+        # PTB answers 403 to requests without it
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=cfg.webhook_url,
+            secret_token=cfg.webhook_secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling()
 
 
 if __name__ == "__main__":
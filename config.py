@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from dotenv import load_dotenv
 import os
+from typing import Optional
 
 load_dotenv()
 
@@ -13,6 +14,9 @@ class Config:
     deploy_id: str
     tg_token: str
     deepseek_key: str
+    # webhook mode when set: public HTTPS URL Telegram posts updates to
+    webhook_url: Optional[str] = None
+    webhook_secret: Optional[str] = None
 
 
 def load() -> Config:
@@ -22,5 +26,7 @@ def load() -> Config:
         deploy_id=os.getenv("ABACUS_DEPLOYMENT_ID"),
         tg_token=os.getenv("TG_TOKEN"),
         deepseek_key=os.getenv("DEEPSEEK_KEY"),
+        webhook_url=os.getenv("WEBHOOK_URL") or None,
+        webhook_secret=os.getenv("WEBHOOK_SECRET") or None,
     )
 
@@ -1,41 +1,192 @@
 """
 database.py  •  Storage layer for the Telegram‑planner bot
-TinyDB structure:
+The engine (TinyDB JSON file or SQLite) is chosen by PLANNER_DB_BACKEND,
+see storage.py. Collections:
     - tasks      : day / week tasks linked to KR or free
     - okr        : objectives and key‑results (tree)
     - inbox      : quick notes
     - stats      : aggregated daily statistics
     - settings   : per‑user preferences (notifications, tz, etc.)
     - categories : life priorities linked to objectives
+    - reminders  : pending task start / end notifications, by fire time
 """
 
-from datetime import date, datetime, timedelta
-from typing import Optional
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+import logging
+import os
+import threading
 
-from tinydb import TinyDB, Query, where
-
-# pathlib & TinyDB middleware for robust file handling & caching
+# pathlib for robust file handling
 from pathlib import Path
-from tinydb.storages import JSONStorage
-from tinydb.middlewares import CachingMiddleware
+
+from tinydb.table import Document
+
+from storage import SQLiteStore, Store, TinyDBStore, migrate_json
+
+logger = logging.getLogger(__name__)
 
 #
 # Use a hidden directory in the user's home for persistence
 DATA_DIR = Path.home() / ".planner_bot"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "db.json"
+SQLITE_PATH = DATA_DIR / "db.sqlite3"
+
+# Storage engine: "tinydb" (JSON file, default) or "sqlite"
+DB_BACKEND = os.getenv("PLANNER_DB_BACKEND", "tinydb").lower()
+# TinyDB write cache: flush every N seconds or after N pending writes
+FLUSH_INTERVAL = float(os.getenv("PLANNER_DB_FLUSH_INTERVAL", "2"))
+FLUSH_MAX_WRITES = int(os.getenv("PLANNER_DB_FLUSH_MAX_WRITES", "200"))
+
+
+def _open_store() -> Store:
+    if DB_BACKEND == "sqlite":
+        fresh = not SQLITE_PATH.exists()
+        store = SQLiteStore(SQLITE_PATH)
+        # one‑shot import of the legacy JSON database on first start
+        if fresh and DB_PATH.exists():
+            n = migrate_json(DB_PATH, store)
+            logger.info("Migrated %d documents from %s to %s", n, DB_PATH, SQLITE_PATH)
+        return store
+    return TinyDBStore(DB_PATH, flush_interval=FLUSH_INTERVAL,
+                       flush_max_writes=FLUSH_MAX_WRITES)
+
+
+_store = _open_store()
+
+# Per‑user data version, bumped on every write that touches the user's rows.
+# Caches (AI responses, rendered screens) key on it to invalidate themselves.
+_versions: dict[int, int] = {}
+
+
+def data_version(uid: int) -> int:
+    return _versions.get(uid, 0)
+
+
+# Change listeners: fn(table, doc, removed) is called after every write with
+# the document as stored (or as it was, when removed). They run on the
+# writing thread, so they must be quick and thread‑safe.
+_listeners: list[Callable[[str, Document, bool], None]] = []
+
+
+def on_change(listener: Callable[[str, Document, bool], None]) -> None:
+    _listeners.append(listener)
+
+
+# Writes inside _transaction() notify only once it is over: after the
+# commit, or never when the store rolled them back (see Store.rolls_back),
+# so no cache is keyed on a version whose data was undone.
+_deferred = threading.local()
+
+
+@contextmanager
+def _transaction() -> Iterator[None]:
+    """_store.transaction() whose change notifications wait for the commit."""
+    if getattr(_deferred, "changes", None) is not None:
+        with _store.transaction():  # nested: the outer block notifies
+            yield
+        return
+    _deferred.changes = changes = []
+    committed = False
+    try:
+        with _store.transaction():
+            yield
+        committed = True
+    finally:
+        _deferred.changes = None
+        if committed or not _store.rolls_back:
+            for change in changes:
+                _notify(*change)
+
+
+def _changed(name: str, docs: list, removed: bool = False) -> None:
+    changes = getattr(_deferred, "changes", None)
+    if changes is not None:
+        changes.append((name, docs, removed))
+    else:
+        _notify(name, docs, removed)
+
 
-# TinyDB with write‑cache; flushes to disk on close()
-_db = TinyDB(DB_PATH, storage=CachingMiddleware(JSONStorage))
+def _notify(name: str, docs: list, removed: bool) -> None:
+    for uid in {d.get("uid") for d in docs}:
+        if uid is not None:
+            _versions[uid] = _versions.get(uid, 0) + 1
+    for listener in _listeners:
+        for doc in docs:
+            try:
+                listener(name, doc, removed)
+            except Exception:
+                logger.exception("change listener %r failed", listener)
 
 # ---------- helpers ---------- #
-def _table(name: str):
-    return _db.table(name)
+def _get(name: str, doc_id: int):
+    return _store.get(name, doc_id)
+
+
+def _insert(name: str, doc: dict) -> int:
+    doc_id = _store.insert(name, doc)
+    _changed(name, [Document(doc, doc_id=doc_id)])
+    return doc_id
+
+
+def _update(name: str, fields: dict, doc_ids: Iterable[int]) -> None:
+    _changed(name, _store.update(name, fields, doc_ids))
+
+
+def _remove(name: str, doc_ids: Iterable[int]) -> None:
+    _changed(name, _store.remove(name, doc_ids), removed=True)
+
+
+def _find(name: str, uid: int, **eq: Any) -> list:
+    """Return documents of one user matching all equality filters in eq."""
+    return _store.find(name, uid, **eq)
+
+
+# ---------- pagination ---------- #
+# Keyset pages in doc_id order. A cursor is "a<id>" (the page after doc id)
+# or "b<id>" (the page before it); it fits in callback_data and stays valid
+# when rows are added or removed elsewhere in the list.
+PAGE_SIZE = int(os.getenv("PLANNER_PAGE_SIZE", "10"))
+
+
+class Page(NamedTuple):
+    items: list
+    prev: Optional[str]  # cursor of the previous page, None on the first
+    next: Optional[str]  # cursor of the next page, None on the last
+    offset: int = 0  # rows before this page, for numbering
+
+
+def _page(name: str, uid: int, cursor: Optional[str] = None,
+          limit: int = PAGE_SIZE, **eq: Any) -> Page:
+    after = before = None
+    if cursor:
+        if cursor[0] == "a":
+            after = int(cursor[1:])
+        else:
+            before = int(cursor[1:])
+    # one extra row tells whether there is more in the direction of travel
+    docs = _store.find_page(name, uid, limit + 1, after=after, before=before, **eq)
+    if not docs and cursor:
+        return _page(name, uid, None, limit, **eq)
+    if before is not None:
+        more, docs = len(docs) > limit, docs[-limit:]
+        offset = _store.count(name, uid, before=docs[0].doc_id, **eq) if more else 0
+        return Page(docs, f"b{docs[0].doc_id}" if more else None, f"a{docs[-1].doc_id}", offset)
+    more, docs = len(docs) > limit, docs[:limit]
+    return Page(
+        docs,
+        f"b{docs[0].doc_id}" if after is not None and docs else None,
+        f"a{docs[-1].doc_id}" if more else None,
+        _store.count(name, uid, before=docs[0].doc_id, **eq) if after is not None else 0,
+    )
 
 # --- 1. Добавить категорию ---
 def add_category(user_id: int, title: str, obj_id: Optional[int] = None) -> int:
     """Добавить новую категорию (жизненный приоритет, связан с целью)."""
-    return _table("categories").insert({
+    return _insert("categories", {
         "uid": user_id,
         "title": title,
         "obj_id": obj_id,
@@ -44,11 +195,11 @@ def add_category(user_id: int, title: str, obj_id: Optional[int] = None) -> int:
 
 def list_categories(user_id: int):
     """Вернуть все категории пользователя."""
-    return _table("categories").search(where("uid") == user_id)
+    return _find("categories", user_id)
 
 def get_category(cat_id: int):
     """Вернуть одну категорию по doc_id."""
-    return _table("categories").get(doc_id=cat_id)
+    return _get("categories", cat_id)
 
 # ---------- TASKS ---------- #
 def add_task(user_id: int, text: str, due: date,
@@ -59,8 +210,7 @@ def add_task(user_id: int, text: str, due: date,
              duration_minutes: Optional[int] = None,
              category_id: Optional[int] = None) -> int:
     """Добавить задачу, опционально с привязкой к категории."""
-    tbl = _table("tasks")
-    return tbl.insert({
+    return _insert("tasks", {
         "uid": user_id,
         "text": text,
         "due": due.isoformat(),
@@ -79,82 +229,89 @@ def add_task(user_id: int, text: str, due: date,
 
 def list_tasks(user_id: int, due: Optional[date] = None,
                lvl: Optional[str] = None, include_done: bool = True):
-    tbl = _table("tasks")
-    q = (where("uid") == user_id)
+    eq = {}
     if due:
-        q &= where("due") == due.isoformat()
+        eq["due"] = due.isoformat()
     if lvl:
-        q &= where("lvl") == lvl
+        eq["lvl"] = lvl
     if not include_done:
-        q &= where("done") == False
-    return tbl.search(q)
+        eq["done"] = False
+    return _find("tasks", user_id, **eq)
+
+def tasks_page(user_id: int, due: date, lvl: str, cursor: Optional[str] = None) -> Page:
+    """One page of the user's tasks due on due at level lvl."""
+    return _page("tasks", user_id, cursor, due=due.isoformat(), lvl=lvl)
 
 # --- 3. Получить задачи по категории ---
 def list_tasks_by_category(user_id: int, category_id: int, due: Optional[date] = None):
     """Вернуть все задачи по user_id и category_id, опционально с датой due."""
-    tbl = _table("tasks")
-    q = (where("uid") == user_id) & (where("category_id") == category_id)
+    eq = {"category_id": category_id}
     if due:
-        q &= where("due") == due.isoformat()
-    return tbl.search(q)
+        eq["due"] = due.isoformat()
+    return _find("tasks", user_id, **eq)
 
 # --- 4. Получить, сколько категорий покрыто задачами за день ---
+def task_counts_by_category(user_id: int, dt: date) -> Counter:
+    """category_id → число задач пользователя на dt, за один проход."""
+    return Counter(
+        t["category_id"] for t in _find("tasks", user_id, due=dt.isoformat())
+        if t.get("category_id")
+    )
+
 def count_categories_covered(user_id: int, dt: date) -> int:
     """Вернуть число уникальных категорий, по которым есть задачи на dt."""
-    tbl = _table("tasks")
-    q = (where("uid") == user_id) & (where("due") == dt.isoformat())
-    tasks = tbl.search(q)
-    covered = set()
-    for t in tasks:
-        if t.get("category_id"):
-            covered.add(t["category_id"])
-    return len(covered)
+    return len(task_counts_by_category(user_id, dt))
 
 # --- Added helper for listing future tasks ---
 def list_future_tasks(user_id: int, days_ahead: int = 30, include_done: bool = True):
     """
     Return tasks for the user with due dates from today up to today + days_ahead.
     """
-    tbl = _table("tasks")
     today = date.today()
     end = today + timedelta(days=days_ahead)
-    q = (where("uid") == user_id) & \
-        (where("due") >= today.isoformat()) & \
-        (where("due") <= end.isoformat())
-    if not include_done:
-        q &= where("done") == False  # noqa: E712
-    return tbl.search(q)
+    eq = {} if include_done else {"done": False}
+    return _store.find_range("tasks", user_id, "due",
+                             today.isoformat(), end.isoformat(), **eq)
 
 def toggle_done(task_id: int):
-    tbl = _table("tasks")
-    rec = tbl.get(doc_id=task_id)
+    rec = _get("tasks", task_id)
     if rec:
-        tbl.update({"done": not rec["done"]}, doc_ids=[task_id])
+        with _transaction():
+            _update("tasks", {"done": not rec["done"]}, [task_id])
+            if not rec["done"]:
+                _cancel_reminders(rec)
 
 def move_task(task_id: int, new_due: date, new_lvl: str = "day"):
-    _table("tasks").update({"due": new_due.isoformat(), "lvl": new_lvl}, doc_ids=[task_id])
+    rec = _get("tasks", task_id)
+    if rec:
+        with _transaction():
+            _update("tasks", {"due": new_due.isoformat(), "lvl": new_lvl}, [task_id])
+            _cancel_reminders(rec)
 
 def set_task_times(task_id: int, start_ts: Optional[str], end_ts: Optional[str]):
-    """Update start/end timestamps for a task."""
-    _table("tasks").update({"start_ts": start_ts, "end_ts": end_ts}, doc_ids=[task_id])
+    """Update start/end timestamps for a task (its pending reminders are dropped)."""
+    rec = _get("tasks", task_id)
+    if rec:
+        with _transaction():
+            _update("tasks", {"start_ts": start_ts, "end_ts": end_ts}, [task_id])
+            _cancel_reminders(rec)
 
 def set_task_status(task_id: int, status: str):
     """Update status: plan | started | done."""
-    _table("tasks").update({"status": status}, doc_ids=[task_id])
+    _update("tasks", {"status": status}, [task_id])
 
 
 # ---------- TASKS: helpers for fetch/update with history ---------- #
 def get_task(task_id: int):
     """Return a task record or None."""
-    return _table("tasks").get(doc_id=task_id)
+    return _get("tasks", task_id)
 
 def update_task(task_id: int, **new_fields):
     """
     Update one or more fields of a task.
     The previous snapshot is appended to the 'history' list with timestamp.
     """
-    tbl = _table("tasks")
-    rec = tbl.get(doc_id=task_id)
+    rec = _get("tasks", task_id)
     if not rec:
         return
     history = rec.get("history", [])
@@ -164,12 +321,16 @@ def update_task(task_id: int, **new_fields):
     history.append(snapshot)
     # merge fields
     new_fields["history"] = history
-    tbl.update(new_fields, doc_ids=[task_id])
+    with _transaction():
+        _update("tasks", new_fields, [task_id])
+        # reminders were computed from the old time / date, or are moot once done
+        if new_fields.get("done") or RESCHEDULING_FIELDS & new_fields.keys():
+            _cancel_reminders(rec)
 
 # ---------- OKR ---------- #
 
 def add_objective(user_id: int, title: str) -> int:
-    return _table("okr").insert({
+    return _insert("okr", {
         "uid": user_id,
         "type": "objective",
         "title": title,
@@ -179,15 +340,14 @@ def add_objective(user_id: int, title: str) -> int:
 # ---------- OBJECTIVE due-date helpers ---------- #
 def get_objective(obj_id: int):
     """Fetch a single objective by doc_id."""
-    return _table("okr").get(doc_id=obj_id)
+    return _get("okr", obj_id)
 
 def update_objective(obj_id: int, **fields):
     """
     Update fields of an objective, preserving history of 'due' changes.
     If 'due' is changing, push previous value into history list.
     """
-    tbl = _table("okr")
-    rec = tbl.get(doc_id=obj_id)
+    rec = _get("okr", obj_id)
     if not rec:
         return
     history = rec.get("history", [])
@@ -196,7 +356,67 @@ def update_objective(obj_id: int, **fields):
         history.append({"ts": datetime.utcnow().isoformat(), "due": rec.get("due")})
     if history:
         fields["history"] = history
-    tbl.update(fields, doc_ids=[obj_id])
+    _update("okr", fields, [obj_id])
+
+# ---------- Objective progress aggregates ---------- #
+# Every objective carries "kr_stats": KR count and progress sum, overall and
+# per quarter, kept current by the KR writers below. Screens and the AI
+# context read progress from the objective instead of scanning its KRs.
+# The KR and its objective are written in one store transaction, so they
+# persist together; startup reconciles any objective that still drifted.
+def _empty_kr_stats() -> dict:
+    return {"count": 0, "sum": 0, "updated": None, "quarters": {}}
+
+
+def _add_to_kr_stats(stats: dict, quarter: Optional[str], count: int, total: int) -> None:
+    stats["count"] += count
+    stats["sum"] += total
+    q = stats["quarters"].setdefault(quarter or "-", {"count": 0, "sum": 0})
+    q["count"] += count
+    q["sum"] += total
+
+
+def _bump_kr_stats(obj_id: int, quarter: Optional[str], count: int, total: int) -> None:
+    obj = _get("okr", obj_id)
+    if not obj:
+        return
+    old = obj.get("kr_stats") or _empty_kr_stats()
+    stats = dict(old, quarters={q: dict(v) for q, v in old["quarters"].items()})
+    _add_to_kr_stats(stats, quarter, count, total)
+    stats["updated"] = datetime.utcnow().isoformat()
+    _update("okr", {"kr_stats": stats}, [obj_id])
+
+
+def kr_progress(obj, quarter: Optional[str] = None) -> Optional[int]:
+    """Average KR progress of an objective (or one quarter); None without KRs."""
+    stats = obj.get("kr_stats") or _empty_kr_stats()
+    if quarter is not None:
+        stats = stats["quarters"].get(quarter) or {"count": 0}
+    if not stats["count"]:
+        return None
+    return stats["sum"] // stats["count"]
+
+
+def reconcile_kr_stats() -> None:
+    """One pass over okr: recompute every objective's kr_stats, store the ones that differ."""
+    rows = _store.all("okr")
+    objectives = {r.doc_id: r for r in rows if r.get("type") == "objective"}
+    stats = {obj_id: _empty_kr_stats() for obj_id in objectives}
+    for r in rows:
+        if r.get("type") == "kr" and r.get("obj_id") in stats:
+            _add_to_kr_stats(stats[r["obj_id"]], r.get("quarter"), 1, r.get("progress", 0))
+    fixed = 0
+    for obj_id, st in stats.items():
+        old = objectives[obj_id].get("kr_stats")
+        if old is not None and {**old, "updated": None} == st:
+            continue
+        if old is not None:
+            st["updated"] = old.get("updated")
+        _store.update("okr", {"kr_stats": st}, [obj_id])
+        fixed += 1
+    if fixed:
+        logger.info("Recomputed KR aggregates for %d objectives", fixed)
+
 
 def add_key_result(
     user_id: int,
@@ -208,31 +428,62 @@ def add_key_result(
     """
     quarter – string 'Q1' … 'Q4'
     """
-    return _table("okr").insert({
-        "uid": user_id,
-        "type": "kr",
-        "obj_id": objective_id,
-        "title": title,
-        "quarter": quarter,
-        "progress": progress,
-        "created": datetime.utcnow().isoformat(),
-    })
+    with _transaction():
+        kr_id = _insert("okr", {
+            "uid": user_id,
+            "type": "kr",
+            "obj_id": objective_id,
+            "title": title,
+            "quarter": quarter,
+            "progress": progress,
+            "created": datetime.utcnow().isoformat(),
+        })
+        _bump_kr_stats(objective_id, quarter, 1, progress)
+    return kr_id
+
+def list_objectives(user_id: int):
+    """Return all objectives of the user."""
+    return _find("okr", user_id, type="objective")
+
+def objectives_page(user_id: int, cursor: Optional[str] = None) -> Page:
+    return _page("okr", user_id, cursor, type="objective")
+
+def list_key_results(obj_id: int, quarter: Optional[str] = None):
+    """Return KRs of one objective, optionally only for quarter 'Q1' … 'Q4'."""
+    obj = _get("okr", obj_id)
+    if not obj:
+        return []
+    eq = {"type": "kr", "obj_id": obj_id}
+    if quarter:
+        eq["quarter"] = quarter
+    return _find("okr", obj["uid"], **eq)
+
+def objectives_by_id(user_id: int) -> dict:
+    """All objectives of the user keyed by doc_id."""
+    return {o.doc_id: o for o in list_objectives(user_id)}
+
+def key_results_by_objective(user_id: int) -> dict:
+    """All KRs of the user grouped by objective doc_id, in one query."""
+    grouped: dict = {}
+    for kr in _find("okr", user_id, type="kr"):
+        grouped.setdefault(kr.get("obj_id"), []).append(kr)
+    return grouped
+
+def get_key_result(kr_id: int):
+    return _get("okr", kr_id)
+
+def set_kr_pinned(kr_id: int, pinned: bool = True):
+    _update("okr", {"pinned": pinned}, [kr_id])
 
 def list_okr_tree(user_id: int):
-    tbl = _table("okr")
-    objs = tbl.search((where("uid") == user_id) & (where("type") == "objective"))
-    tree = []
-    for obj in objs:
-        krs = tbl.search((where("uid") == user_id) & (where("type") == "kr") & (where("obj_id") == obj.doc_id))
-        tree.append((obj, krs))
-    return tree
+    krs = key_results_by_objective(user_id)
+    return [(obj, krs.get(obj.doc_id, [])) for obj in list_objectives(user_id)]
 
 def update_kr_progress(kr_id: int, progress: Optional[int] = None, delta: Optional[int] = None):
     """
     Either set absolute progress (0‑100) or adjust by delta (+/‑).
     """
-    tbl = _table("okr")
-    rec = tbl.get(doc_id=kr_id)
+    rec = _get("okr", kr_id)
     if not rec:
         return
     current = rec.get("progress", 0)
@@ -242,11 +493,15 @@ def update_kr_progress(kr_id: int, progress: Optional[int] = None, delta: Option
         new_val = max(0, min(100, progress))
     else:
         return
-    tbl.update({"progress": new_val}, doc_ids=[kr_id])
+    with _transaction():
+        _update("okr", {"progress": new_val}, [kr_id])
+        if new_val != current:
+            _bump_kr_stats(rec["obj_id"], rec.get("quarter"), 0, new_val - current)
+
 
 # ---------- INBOX ---------- #
 def add_inbox(user_id: int, text: str) -> int:
-    return _table("inbox").insert({
+    return _insert("inbox", {
         "uid": user_id,
         "text": text,
         "ts": datetime.utcnow().isoformat(),
@@ -255,25 +510,34 @@ def add_inbox(user_id: int, text: str) -> int:
     })
 
 def list_inbox(user_id: int):
-    return _table("inbox").search(where("uid") == user_id)
+    return _find("inbox", user_id)
+
+def inbox_page(user_id: int, cursor: Optional[str] = None) -> Page:
+    return _page("inbox", user_id, cursor)
+
+def inbox_since(ts: str):
+    """Inbox notes of all users with ts >= the given naive‑UTC ISO time."""
+    return _store.scan_range("inbox", "ts", ts, None)
+
+def get_inbox_item(doc_id: int):
+    return _get("inbox", doc_id)
 
 def clear_inbox_item(doc_id: int):
-    _table("inbox").remove(doc_ids=[doc_id])
+    _remove("inbox", [doc_id])
 
 def update_inbox_text(doc_id: int, new_text: str):
     """Save new text while pushing old version to history."""
-    tbl = _table("inbox")
-    rec = tbl.get(doc_id=doc_id)
+    rec = _get("inbox", doc_id)
     if not rec:
         return
     history = rec.get("history", [])
     history.append({"ts": datetime.utcnow().isoformat(), "text": rec["text"]})
-    tbl.update({"text": new_text, "history": history}, doc_ids=[doc_id])
+    _update("inbox", {"text": new_text, "history": history}, [doc_id])
 
 
 def archive_inbox_item(doc_id: int):
     """Mark inbox note as archived (soft delete)."""
-    _table("inbox").update({"archived": True}, doc_ids=[doc_id])
+    _update("inbox", {"archived": True}, [doc_id])
 
 # ---------- STAGES (Goal → Monthly stages) ---------- #
 def add_stage(uid: int, goal_id: int, title: str, month: int, year: int) -> int:
@@ -281,7 +545,7 @@ def add_stage(uid: int, goal_id: int, title: str, month: int, year: int) -> int:
     Добавить этап‑месяц для цели goal_id.
     month: 1‑12, year: календарный.
     """
-    return _table("stages").insert({
+    return _insert("stages", {
         "uid": uid,
         "goal_id": goal_id,
         "title": title,
@@ -294,22 +558,17 @@ def list_stages_for_month(uid: int, month: int, year: int):
     """
     Вернуть все этапы пользователя uid для указанного месяца/года.
     """
-    tbl = _table("stages")
-    return tbl.search(
-        (where("uid") == uid) &
-        (where("month") == month) &
-        (where("year") == year)
-    )
+    return _find("stages", uid, month=month, year=year)
 
 def get_stage(stage_id: int):
-    return _table("stages").get(doc_id=stage_id)
+    return _get("stages", stage_id)
 
 # ---------- WEEKS (Stage → Weekly targets) ---------- #
 def add_week_target(uid: int, stage_id: int, title: str, week_start: date) -> int:
     """
     Добавить недельную подцель; week_start — дата понедельника.
     """
-    return _table("weeks").insert({
+    return _insert("weeks", {
         "uid": uid,
         "stage_id": stage_id,
         "title": title,
@@ -318,60 +577,126 @@ def add_week_target(uid: int, stage_id: int, title: str, week_start: date) -> in
     })
 
 def list_weeks_for_stage(uid: int, stage_id: int):
-    tbl = _table("weeks")
-    return tbl.search(
-        (where("uid") == uid) & (where("stage_id") == stage_id)
-    )
+    return _find("weeks", uid, stage_id=stage_id)
 
 def get_week(week_id: int):
-    return _table("weeks").get(doc_id=week_id)
+    return _get("weeks", week_id)
 
 # ---------- STATS ---------- #
 def add_stat(user_id: int, stat_date: date, done: int, total: int):
-    tbl = _table("stats")
     key = stat_date.isoformat()
-    rec = tbl.get((where("uid") == user_id) & (where("date") == key))
-    if rec:
-        tbl.update({"done": done, "total": total}, doc_ids=[rec.doc_id])
+    recs = _find("stats", user_id, date=key)
+    if recs:
+        _update("stats", {"done": done, "total": total}, [recs[0].doc_id])
     else:
-        tbl.insert({"uid": user_id, "date": key, "done": done, "total": total})
+        _insert("stats", {"uid": user_id, "date": key, "done": done, "total": total})
 
 def get_stat(user_id: int, stat_date: date):
-    rec = _table("stats").get((where("uid") == user_id) & (where("date") == stat_date.isoformat()))
-    return rec or {"done": 0, "total": 0}
+    recs = _find("stats", user_id, date=stat_date.isoformat())
+    return recs[0] if recs else {"done": 0, "total": 0}
 
 # ---------- SETTINGS ---------- #
 def get_setting(user_id: int, key: str, default=None):
-    rec = _table("settings").get((where("uid") == user_id) & (where("key") == key))
-    return rec["value"] if rec else default
+    recs = _find("settings", user_id, key=key)
+    return recs[0]["value"] if recs else default
 
 def set_setting(user_id: int, key: str, value):
-    tbl = _table("settings")
-    rec = tbl.get((where("uid") == user_id) & (where("key") == key))
-    if rec:
-        tbl.update({"value": value}, doc_ids=[rec.doc_id])
+    recs = _find("settings", user_id, key=key)
+    if recs:
+        _update("settings", {"value": value}, [recs[0].doc_id])
     else:
-        tbl.insert({"uid": user_id, "key": key, "value": value})
+        _insert("settings", {"uid": user_id, "key": key, "value": value})
+
+# ---------- REMINDERS ---------- #
+def _utc_key(dt: datetime) -> str:
+    """Fixed‑width UTC timestamp, so string order is time order."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+# Task fields a reminder's fire time is derived from
+RESCHEDULING_FIELDS = {"due", "start_ts", "end_ts"}
+
+
+def add_reminder(chat_id: int, task_id: int, kind: str, fire_at: datetime) -> int:
+    """
+    Persist a 'start' / 'end' reminder for a task; fire_at must be tz‑aware.
+    The row belongs to the task's owner ("uid") and is sent to "chat".
+    """
+    task = _get("tasks", task_id)
+    return _insert("reminders", {
+        "uid": task["uid"] if task else chat_id,
+        "chat": chat_id,
+        "task_id": task_id,
+        "kind": kind,
+        "fire_at": _utc_key(fire_at),
+    })
+
+
+def get_reminder(doc_id: int):
+    return _get("reminders", doc_id)
+
+
+def due_reminders(until: datetime, limit: Optional[int] = None):
+    """Reminders of all chats with fire time <= until, earliest first."""
+    return _store.scan_range("reminders", "fire_at", None, _utc_key(until), limit)
+
+
+def reminder_time(rec) -> datetime:
+    return datetime.strptime(rec["fire_at"], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def remove_reminders(doc_ids: Iterable[int]) -> None:
+    _remove("reminders", list(doc_ids))
+
+
+def _cancel_reminders(task) -> None:
+    _remove("reminders", [r.doc_id for r in _find("reminders", task["uid"], task_id=task.doc_id)])
+
+
+def cancel_task_reminders(task_id: int) -> None:
+    """Drop every pending reminder of a task."""
+    task = _get("tasks", task_id)
+    if task:
+        _cancel_reminders(task)
 
 # ---------- Chat-remember helpers (для ежедневных job’ов) ----------
 def remember_chat(uid: int, chat_id: int) -> None:
     """Сохранить (или обновить) chat_id пользователя, чтобы восстановить
     ежедневные задачи после перезапуска бота."""
-    tbl = _table("settings")
-    rec = tbl.get(where("uid") == uid)
-    if rec:
-        tbl.update({"chat": chat_id}, where("uid") == uid)
+    recs = _find("settings", uid)
+    if recs:
+        _update("settings", {"chat": chat_id}, [r.doc_id for r in recs])
     else:
-        tbl.insert({"uid": uid, "chat": chat_id})
+        _insert("settings", {"uid": uid, "chat": chat_id})
 
 def all_known_chats():
     """Вернуть список (uid, chat_id) всех пользователей, для которых мы
     уже ставили напоминание Инбокса."""
     return [
-        (r["uid"], r["chat"]) for r in _table("settings").all() if r.get("chat")
+        (r["uid"], r["chat"]) for r in _store.all("settings") if r.get("chat")
     ]
-    
+
+
+def chat_timezones():
+    """(uid, chat_id, tz setting or None) for every user with a known chat."""
+    chats, tzs = {}, {}
+    for r in _store.all("settings"):
+        if r.get("chat"):
+            chats[r["uid"]] = r["chat"]
+        if r.get("key") == "tz":
+            tzs[r["uid"]] = r.get("value")
+    return [(uid, chat, tzs.get(uid)) for uid, chat in chats.items()]
+
+def delete_user_data(uid: int, tables=("okr", "tasks", "categories", "inbox", "reminders")) -> None:
+    """Remove every document of uid from the given tables."""
+    for name in tables:
+        _remove(name, [d.doc_id for d in _find(name, uid)])
+
+def storage_metrics() -> dict:
+    """Flush latency / bytes written counters of the storage engine."""
+    return _store.metrics()
+
 # ---------- SAFE SHUTDOWN ----------
 def close_db():
-    """Flush TinyDB cache and close file."""
-    _db.close()
\ No newline at end of file
+    """Flush the storage engine (TinyDB write cache / SQLite WAL) and close it."""
+    _store.close()
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+database_async.py  •  Async facade over database.py for the bot handlers
+
+Every call is shipped to a thread so the asyncio loop never waits on a
+scan, an SQLite commit or a flush:
+    - writes : one dedicated writer thread, executed in submission order
+    - reads  : a small reader pool (SQLite serves them from per‑thread
+               WAL connections, TinyDB from its in‑memory cache)
+
+Usage mirrors database.py:  tasks = await adb.list_tasks(uid, date.today())
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import database
+
+READER_THREADS = int(os.getenv("PLANNER_DB_READERS", "4"))
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+_readers = ThreadPoolExecutor(max_workers=READER_THREADS, thread_name_prefix="db-reader")
+
+
+def _on(pool: ThreadPoolExecutor, fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+    return wrapper
+
+
+def _read(fn: Callable) -> Callable:
+    return _on(_readers, fn)
+
+
+def _write(fn: Callable) -> Callable:
+    return _on(_writer, fn)
+
+
+# ---------- categories ---------- #
+add_category = _write(database.add_category)
+list_categories = _read(database.list_categories)
+get_category = _read(database.get_category)
+
+# ---------- tasks ---------- #
+add_task = _write(database.add_task)
+list_tasks = _read(database.list_tasks)
+tasks_page = _read(database.tasks_page)
+list_tasks_by_category = _read(database.list_tasks_by_category)
+task_counts_by_category = _read(database.task_counts_by_category)
+count_categories_covered = _read(database.count_categories_covered)
+list_future_tasks = _read(database.list_future_tasks)
+toggle_done = _write(database.toggle_done)
+move_task = _write(database.move_task)
+set_task_times = _write(database.set_task_times)
+set_task_status = _write(database.set_task_status)
+get_task = _read(database.get_task)
+update_task = _write(database.update_task)
+
+# ---------- okr ---------- #
+add_objective = _write(database.add_objective)
+get_objective = _read(database.get_objective)
+update_objective = _write(database.update_objective)
+add_key_result = _write(database.add_key_result)
+list_objectives = _read(database.list_objectives)
+objectives_page = _read(database.objectives_page)
+objectives_by_id = _read(database.objectives_by_id)
+list_key_results = _read(database.list_key_results)
+key_results_by_objective = _read(database.key_results_by_objective)
+get_key_result = _read(database.get_key_result)
+set_kr_pinned = _write(database.set_kr_pinned)
+list_okr_tree = _read(database.list_okr_tree)
+update_kr_progress = _write(database.update_kr_progress)
+reconcile_kr_stats = _write(database.reconcile_kr_stats)
+
+# ---------- inbox ---------- #
+add_inbox = _write(database.add_inbox)
+list_inbox = _read(database.list_inbox)
+inbox_page = _read(database.inbox_page)
+inbox_since = _read(database.inbox_since)
+get_inbox_item = _read(database.get_inbox_item)
+clear_inbox_item = _write(database.clear_inbox_item)
+update_inbox_text = _write(database.update_inbox_text)
+archive_inbox_item = _write(database.archive_inbox_item)
+
+# ---------- stages / weeks ---------- #
+add_stage = _write(database.add_stage)
+list_stages_for_month = _read(database.list_stages_for_month)
+get_stage = _read(database.get_stage)
+add_week_target = _write(database.add_week_target)
+list_weeks_for_stage = _read(database.list_weeks_for_stage)
+get_week = _read(database.get_week)
+
+# ---------- reminders ---------- #
+add_reminder = _write(database.add_reminder)
+get_reminder = _read(database.get_reminder)
+due_reminders = _read(database.due_reminders)
+remove_reminders = _write(database.remove_reminders)
+cancel_task_reminders = _write(database.cancel_task_reminders)
+
+# ---------- stats / settings ---------- #
+add_stat = _write(database.add_stat)
+get_stat = _read(database.get_stat)
+get_setting = _read(database.get_setting)
+set_setting = _write(database.set_setting)
+remember_chat = _write(database.remember_chat)
+all_known_chats = _read(database.all_known_chats)
+chat_timezones = _read(database.chat_timezones)
+delete_user_data = _write(database.delete_user_data)
+
+
+async def close_db() -> None:
+    """Drain pending writes, close the store and stop the executor threads."""
+    await _write(database.close_db)()
+    _writer.shutdown(wait=True)
+    _readers.shutdown(wait=True)
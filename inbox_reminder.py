@@ -0,0 +1,126 @@
+"""
+inbox_reminder.py  •  Evening Inbox reminder for every user from one job
+
+Instead of a run_daily job per user, bot.py runs inbox_dispatch() once a
+minute. Each tick:
+    1. Audience (uid → chat, timezone; kept current by a database.on_change
+       listener) names the users whose local time just reached REMIND_AT;
+    2. one range scan over the inbox "ts" index (storage.ORDER_FIELDS) counts
+       today's notes for all of them at once;
+    3. the caller sends the messages through its rate‑limited sender.
+
+Timezones come from the per‑user "tz" setting (IANA name), falling back
+to the bot's default zone.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import database
+import database_async as adb
+
+logger = logging.getLogger(__name__)
+
+_h, _m = os.getenv("INBOX_REMINDER_AT", "20:00").split(":")
+REMIND_AT = time(int(_h), int(_m))
+# a tick delayed by up to this much still sends today's reminder
+CATCHUP = timedelta(minutes=int(os.getenv("INBOX_REMINDER_CATCHUP_MIN", "10")))
+
+
+class Audience:
+    """Known chats grouped by timezone, fed by database.on_change."""
+
+    def __init__(self, default_tz: str):
+        self.default_tz = default_tz
+        self._lock = threading.Lock()
+        self._chat: dict[int, int] = {}
+        self._tz: dict[int, str] = {}
+        self._by_tz: dict[str, set[int]] = {}
+        self._zones: dict[str, ZoneInfo] = {}
+        self._sent: dict[str, object] = {}  # tz → local date already served
+
+    def _zone(self, name: str) -> ZoneInfo:
+        zone = self._zones.get(name)
+        if zone is None:
+            try:
+                zone = ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                logger.warning("Unknown timezone %r, using %s", name, self.default_tz)
+                zone = ZoneInfo(self.default_tz)
+            self._zones[name] = zone
+        return zone
+
+    def _set(self, uid: int, chat: Optional[int] = None, tz: Optional[str] = None) -> None:
+        if chat:
+            self._chat[uid] = chat
+        old = self._tz.get(uid)
+        new = tz or old or self.default_tz
+        if old != new:
+            if old is not None:
+                self._by_tz.get(old, set()).discard(uid)
+            self._tz[uid] = new
+        self._by_tz.setdefault(new, set()).add(uid)
+
+    def load(self, rows) -> None:
+        """Bulk‑load (uid, chat_id, tz) rows from database.chat_timezones()."""
+        with self._lock:
+            for uid, chat, tz in rows:
+                self._set(uid, chat, tz)
+
+    def on_change(self, table: str, doc: dict, removed: bool) -> None:
+        if table != "settings" or doc.get("uid") is None:
+            return
+        tz = doc.get("value") if doc.get("key") == "tz" and not removed else None
+        if doc.get("chat") or tz:
+            with self._lock:
+                self._set(doc["uid"], doc.get("chat"), tz)
+
+    def due(self, now: datetime) -> list[tuple[int, int, str]]:
+        """
+        (uid, chat_id, local‑midnight as naive UTC ISO) for users whose
+        reminder is due at now; each timezone is served once per local day.
+        """
+        out = []
+        with self._lock:
+            for tz, uids in self._by_tz.items():
+                if not uids:
+                    continue
+                local = now.astimezone(self._zone(tz))
+                fire = datetime.combine(local.date(), REMIND_AT, tzinfo=local.tzinfo)
+                if not fire <= local < fire + CATCHUP or self._sent.get(tz) == local.date():
+                    continue
+                self._sent[tz] = local.date()
+                midnight = datetime.combine(local.date(), time(), tzinfo=local.tzinfo)
+                start = midnight.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+                out.extend((uid, self._chat[uid], start) for uid in uids if uid in self._chat)
+        return out
+
+
+audience = Audience(os.getenv("INBOX_REMINDER_DEFAULT_TZ", "Europe/Moscow"))
+database.on_change(audience.on_change)
+
+
+def start() -> None:
+    """Load every known chat once (called from bot.main())."""
+    audience.load(database.chat_timezones())
+
+
+async def collect(now: Optional[datetime] = None) -> list[tuple[int, int]]:
+    """(chat_id, notes today) for every user whose reminder is due now."""
+    due = audience.due(now or datetime.now(timezone.utc))
+    if not due:
+        return []
+    since = {uid: start for uid, _chat, start in due}
+    counts: Counter = Counter()
+    for note in await adb.inbox_since(min(since.values())):
+        start = since.get(note["uid"])
+        if start is not None and not note.get("archived") and note["ts"] >= start:
+            counts[note["uid"]] += 1
+    return [(chat, counts[uid]) for uid, chat, _start in due if counts[uid]]
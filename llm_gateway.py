@@ -0,0 +1,109 @@
+"""
+llm_gateway.py  •  Admission control in front of the LLM providers
+
+One Gateway per provider ("deepseek", "abacus"):
+    - slot()      : token‑bucket rate limit + semaphore on concurrent calls;
+                    take it per attempt, so retries are throttled too
+    - coalesce()  : single‑flight — identical in‑flight requests share one call
+    - metrics()   : queue depth, in‑flight, wait / call latency, counters
+
+Limits come from env: LLM_<NAME>_CONCURRENCY, LLM_<NAME>_RATE (calls/s),
+LLM_<NAME>_BURST.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from ratelimit import TokenBucket
+
+
+class Gateway:
+    def __init__(self, name: str, concurrency: int, rate: float, burst: float):
+        self.name = name
+        self._sem = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._inflight: dict[Any, asyncio.Task] = {}
+        self._stats = {
+            "calls": 0,
+            "errors": 0,
+            "coalesced": 0,
+            "waiting": 0,
+            "max_waiting": 0,
+            "active": 0,
+            "last_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "last_call_ms": 0.0,
+            "max_call_ms": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a rate token and a free concurrency slot."""
+        st = self._stats
+        st["waiting"] += 1
+        st["max_waiting"] = max(st["max_waiting"], st["waiting"])
+        t0 = time.perf_counter()
+        try:
+            await self._bucket.take()
+            await self._sem.acquire()
+        finally:
+            st["waiting"] -= 1
+        t1 = time.perf_counter()
+        st["last_wait_ms"] = round((t1 - t0) * 1000, 1)
+        st["max_wait_ms"] = max(st["max_wait_ms"], st["last_wait_ms"])
+        st["active"] += 1
+        st["calls"] += 1
+        try:
+            yield
+        except BaseException:
+            st["errors"] += 1
+            raise
+        finally:
+            self._sem.release()
+            st["active"] -= 1
+            st["last_call_ms"] = round((time.perf_counter() - t1) * 1000, 1)
+            st["max_call_ms"] = max(st["max_call_ms"], st["last_call_ms"])
+
+    async def coalesce(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() once per key at a time; concurrent callers with the
+        same key await the same result. A caller being cancelled does not
+        cancel the shared call.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def metrics(self) -> dict:
+        return dict(self._stats, inflight_keys=len(self._inflight))
+
+
+_gateways: dict[str, Gateway] = {}
+
+
+def gateway(name: str) -> Gateway:
+    """Return the process‑wide gateway for a provider, creating it on first use."""
+    gw = _gateways.get(name)
+    if gw is None:
+        env = f"LLM_{name.upper()}_"
+        gw = _gateways[name] = Gateway(
+            name,
+            concurrency=int(os.getenv(env + "CONCURRENCY", "8")),
+            rate=float(os.getenv(env + "RATE", "5")),
+            burst=float(os.getenv(env + "BURST", "10")),
+        )
+    return gw
+
+
+def metrics() -> dict:
+    return {name: gw.metrics() for name, gw in _gateways.items()}
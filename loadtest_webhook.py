@@ -0,0 +1,101 @@
+"""
+loadtest_webhook.py  •  Post synthetic updates to the bot's webhook listener
+
+Start the bot in webhook mode (WEBHOOK_URL / WEBHOOK_SECRET set), then point
+this script at the local listener, bypassing the HTTPS proxy:
+
+    python loadtest_webhook.py --users 50 --per-user 20 --concurrency 100
+
+Each synthetic user sends menu texts (no LLM calls). Replies to the fake
+chat ids fail on Telegram's side and are only logged by the bot, but every
+update goes through the handlers. Pass --user-base with a real chat id and
+--users 1 to see the answers. Requests without the right secret must be
+rejected; the script checks that first.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+TEXTS = ["📋 Сегодня", "🗓 Неделя", "🔔 Инбокс", "🎯 Цели", "/today"]
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def synthetic_update(update_id: int, uid: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": uid, "type": "private"},
+        "from": {"id": uid, "is_bot": False, "first_name": "load"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+async def run(args: argparse.Namespace) -> None:
+    headers = {SECRET_HEADER: args.secret}
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        r = await client.post("", json=synthetic_update(1, args.user_base, TEXTS[0]),
+                              headers={SECRET_HEADER: "wrong"})
+        print(f"wrong secret → HTTP {r.status_code}" + ("" if r.status_code == 403 else "  (expected 403!)"))
+
+        ids = itertools.count(10_000)
+        # users interleaved, each user's updates in order
+        jobs = [
+            synthetic_update(next(ids), args.user_base + u, TEXTS[(u + i) % len(TEXTS)])
+            for i in range(args.per_user)
+            for u in range(args.users)
+        ]
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies: list[float] = []
+        codes: dict[int, int] = {}
+
+        async def post(update: dict) -> None:
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post("", json=update, headers=headers)
+                    code = resp.status_code
+                except httpx.HTTPError:
+                    code = 0
+                latencies.append((time.perf_counter() - t0) * 1000)
+                codes[code] = codes.get(code, 0) + 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(post(u) for u in jobs))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+    print(f"{len(jobs)} updates in {elapsed:.2f}s → {len(jobs) / elapsed:.0f} updates/s")
+    print(f"latency ms: mean {statistics.fmean(latencies):.1f}  p50 {pct(.5):.1f}  "
+          f"p95 {pct(.95):.1f}  p99 {pct(.99):.1f}  max {latencies[-1]:.1f}")
+    print("status codes:", codes)
+
+
+def main() -> None:
+    load_dotenv()
+    port = os.getenv("WEBHOOK_PORT", "8443")
+    path = os.getenv("WEBHOOK_PATH", "telegram")
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    p.add_argument("--url", default=f"http://127.0.0.1:{port}/{path}")
+    p.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    p.add_argument("--users", type=int, default=20)
+    p.add_argument("--per-user", type=int, default=10)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--user-base", type=int, default=900_000_000)
+    asyncio.run(run(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
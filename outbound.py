@@ -0,0 +1,162 @@
+"""
+outbound.py  •  Rate limiter for every outgoing Bot API call
+
+Plugged in with ApplicationBuilder().rate_limiter(OutboundLimiter()), so
+replies, edits, reminders and broadcasts all pass through it:
+    - per‑chat token bucket: 1 msg/s in private chats, 20 msg/min in groups
+    - global token bucket (OUT_GLOBAL_RATE, default 28 msg/s) handed out by
+      priority lane, FIFO within a lane:
+          INTERACTIVE (default) < NOTIFY < BROADCAST
+      callers pick a lane with ``rate_limit_args=outbound.BROADCAST``
+    - RetryAfter: the chat (or the whole gate, for chat‑less calls) is held
+      for retry_after and the call retried, up to OUT_MAX_RETRIES times
+    - metrics(): queue depth per lane, waits, retries
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Any, Callable, Coroutine, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, NOTIFY, BROADCAST = 0, 1, 2
+LANES = {INTERACTIVE: "interactive", NOTIFY: "notify", BROADCAST: "broadcast"}
+
+GLOBAL_RATE = float(os.getenv("OUT_GLOBAL_RATE", "28"))
+CHAT_RATE = float(os.getenv("OUT_CHAT_RATE", "1"))
+CHAT_BURST = float(os.getenv("OUT_CHAT_BURST", "3"))
+GROUP_RATE = 20 / 60
+MAX_RETRIES = int(os.getenv("OUT_MAX_RETRIES", "3"))
+MAX_CHAT_BUCKETS = 10_000  # idle buckets are pruned beyond this
+
+
+def _seconds(retry_after: Any) -> float:
+    # int in older PTB, timedelta in newer
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class _PriorityGate:
+    """Hands out global tokens lowest lane first, FIFO within a lane."""
+
+    def __init__(self, bucket: TokenBucket):
+        self._bucket = bucket
+        self._heap: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self.depth = {lane: 0 for lane in LANES}
+        self.max_depth = {lane: 0 for lane in LANES}
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def wait(self, lane: int) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (lane, next(self._seq), fut))
+        self.depth[lane] += 1
+        self.max_depth[lane] = max(self.max_depth[lane], self.depth[lane])
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run())
+        try:
+            await fut
+        finally:
+            self.depth[lane] -= 1
+
+    async def _run(self) -> None:
+        while self._heap:
+            delay = max(self._bucket.delay(), self._paused_until - time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _lane, _seq, fut = heapq.heappop(self._heap)
+            if fut.done():
+                continue  # waiter was cancelled
+            self._bucket.reserve()
+            fut.set_result(None)
+
+    def close(self) -> None:
+        if self._pump is not None:
+            self._pump.cancel()
+
+
+class OutboundLimiter(BaseRateLimiter):
+    def __init__(self, global_rate: float = GLOBAL_RATE, max_retries: int = MAX_RETRIES):
+        self._gate = _PriorityGate(TokenBucket(global_rate, burst=global_rate))
+        self._chats: dict[Any, TokenBucket] = {}
+        self._max_retries = max_retries
+        self._stats = {"requests": 0, "retry_after": 0, "failed": 0,
+                       "last_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._gate.close()
+
+    def _chat(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                # drop buckets with a token available: they hold no backlog
+                self._chats = {c: b for c, b in self._chats.items() if b.delay() > 0}
+            group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+            bucket = self._chats[chat_id] = (
+                TokenBucket(GROUP_RATE, burst=CHAT_BURST) if group
+                else TokenBucket(CHAT_RATE, burst=CHAT_BURST)
+            )
+        return bucket
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        lane = rate_limit_args if rate_limit_args in LANES else INTERACTIVE
+        chat_id = data.get("chat_id")
+        st = self._stats
+        st["requests"] += 1
+        for attempt in range(self._max_retries + 1):
+            t0 = time.perf_counter()
+            if chat_id is not None:
+                wait = self._chat(chat_id).reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            await self._gate.wait(lane)
+            st["last_wait_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            st["max_wait_ms"] = max(st["max_wait_ms"], st["last_wait_ms"])
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                st["retry_after"] += 1
+                seconds = _seconds(exc.retry_after) + 0.1
+                if attempt == self._max_retries:
+                    st["failed"] += 1
+                    raise
+                logger.info("%s to %s hit flood control, retrying in %.1fs", endpoint, chat_id, seconds)
+                if chat_id is not None:
+                    self._chat(chat_id).pause(seconds)
+                else:
+                    self._gate.pause(seconds)
+
+    def metrics(self) -> dict:
+        return dict(
+            self._stats,
+            queued={LANES[l]: n for l, n in self._gate.depth.items()},
+            max_queued={LANES[l]: n for l, n in self._gate.max_depth.items()},
+            chats=len(self._chats),
+        )
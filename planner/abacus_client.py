@@ -1,27 +1,99 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any
+import os
+from typing import Any, Optional
 
 import backoff
-from abacusai import ApiClient
+import httpx
 
+import llm_gateway
 from config import load
 
-client = ApiClient()
+# getChatResponse over plain HTTP on a pooled client: no executor thread is
+# held while a message waits on the deployment.
+ABACUS_API_URL = os.getenv("ABACUS_API_URL", "https://api.abacus.ai").rstrip("/")
+ABACUS_CHAT_PATH = "/api/v0/getChatResponse"
+HTTP_TIMEOUT = float(os.getenv("ABACUS_READ_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("ABACUS_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("ABACUS_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("ABACUS_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = 30.0
+
+_cfg = load()
+_gw = llm_gateway.gateway("abacus")
+_client: Optional[httpx.AsyncClient] = None
+
+
+class AbacusError(RuntimeError):
+    """The API answered, but with success=false."""
+
+
+def open_client() -> httpx.AsyncClient:
+    """Create the shared client (called from bot.main(); idempotent)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=ABACUS_API_URL,
+            timeout=httpx.Timeout(
+                HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_CONNECT_TIMEOUT
+            ),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close pooled connections (called from bot.on_shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retryable(exc: Exception) -> bool:
+    # timeouts / connection errors / 429 / 5xx are worth another attempt
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return isinstance(exc, httpx.TransportError)
 
 
-@backoff.on_exception(backoff.expo, Exception, max_tries=3)
 async def ask_rocky(text: str) -> str:
     """Send a prompt to Abacus.AI deployment and return the reply text."""
-    cfg = load()
-    resp: Any = await asyncio.to_thread(
-        client.get_chat_response,
-        deployment_token=cfg.deploy_token,
-        deployment_id=cfg.deploy_id,
-        messages=[{"is_user": True, "text": text}],
-        temperature=0.2,
-    )
+    # identical messages in flight share one upstream call
+    return await _gw.coalesce(text, lambda: _ask_rocky(text))
+
+
+@backoff.on_exception(
+    backoff.expo,
+    (httpx.HTTPStatusError, httpx.TransportError),
+    max_tries=3,
+    giveup=lambda e: not _retryable(e),
+)
+async def _ask_rocky(text: str) -> str:
+    # every attempt, retries included, waits for a gateway slot
+    async with _gw.slot():
+        r = await open_client().post(
+            ABACUS_CHAT_PATH,
+            params={
+                "deploymentToken": _cfg.deploy_token,
+                "deploymentId": _cfg.deploy_id,
+            },
+            json={
+                "messages": [{"is_user": True, "text": text}],
+                "temperature": 0.2,
+            },
+        )
+        r.raise_for_status()
+        body: Any = r.json()
+    if isinstance(body, dict) and body.get("success") is False:
+        raise AbacusError(body.get("error") or "Abacus request failed")
+    resp = body.get("result", body) if isinstance(body, dict) else body
     if isinstance(resp, dict):
         if resp.get("messages"):
             return resp["messages"][-1]["text"]
@@ -33,5 +105,11 @@ async def ask_rocky(text: str) -> str:
 if __name__ == "__main__":
     import sys
 
+    async def _main(prompt: str) -> None:
+        try:
+            print(await ask_rocky(prompt))
+        finally:
+            await close_client()
+
     prompt = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else input("You: ")
-    print(asyncio.run(ask_rocky(prompt)))
+    asyncio.run(_main(prompt))
@@ -0,0 +1,49 @@
+"""
+ratelimit.py  •  Asyncio token bucket shared by the LLM gateway and other
+outbound paths.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second, at most ``burst``
+    stored. take() reserves a token immediately and sleeps off any deficit,
+    so waiters are served in arrival order without polling.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is ready now)."""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Take a token, possibly going into debt; return seconds to wait."""
+        self._refill()
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Hold the bucket empty for seconds (e.g. after a server RetryAfter)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def take(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
@@ -0,0 +1,97 @@
+"""
+screen_cache.py  •  Rendered screens keyed by the user's data version
+
+    @cached_screen("today")
+    async def render_today(uid, cursor=None): ...  -> (text, InlineKeyboardMarkup)
+
+The result is kept per (uid, screen, date, page cursor) together with
+database.data_version(uid) read *before* rendering; any write to the user's
+rows bumps the version, so the next call renders again. A write racing a
+render leaves an entry with the old version, which is simply not reused.
+
+edit_screen() skips the edit when the message already shows exactly this
+text and keyboard (Telegram would answer "message is not modified").
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import CallbackQuery, InlineKeyboardMarkup
+
+import database
+
+SCREEN_CACHE_SIZE = int(os.getenv("SCREEN_CACHE_SIZE", "2048"))
+
+
+class ScreenCache:
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[int, Any]] = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "edits_skipped": 0, "edits": 0}
+
+    def get(self, key: tuple, version: int) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: tuple, version: int, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def count(self, stat: str) -> None:
+        self._stats[stat] += 1
+
+    def metrics(self) -> dict:
+        return dict(self._stats, entries=len(self._entries))
+
+
+_cache = ScreenCache(SCREEN_CACHE_SIZE)
+
+
+def cached_screen(screen: str) -> Callable:
+    """Decorator for async render_x(uid, cursor=None) -> (text, markup)."""
+
+    def deco(fn: Callable[..., Awaitable[tuple[str, InlineKeyboardMarkup]]]):
+        @functools.wraps(fn)
+        async def wrapper(uid: int, cursor: Optional[str] = None) -> tuple[str, InlineKeyboardMarkup]:
+            key = (uid, screen, date.today(), cursor)
+            version = database.data_version(uid)
+            hit = _cache.get(key, version)
+            if hit is not None:
+                return hit
+            result = await fn(uid, cursor)
+            _cache.put(key, version, result)
+            return result
+
+        return wrapper
+
+    return deco
+
+
+async def edit_screen(query: CallbackQuery, text: str, markup: InlineKeyboardMarkup) -> None:
+    """Show a rendered screen in the query's message unless it is already there."""
+    msg = query.message
+    if getattr(msg, "text", None) == text and getattr(msg, "reply_markup", None) == markup:
+        _cache.count("edits_skipped")
+        return
+    _cache.count("edits")
+    await query.edit_message_text(text, reply_markup=markup)
+
+
+def metrics() -> dict:
+    return _cache.metrics()
@@ -0,0 +1,196 @@
+"""
+search_index.py  •  Per‑user inverted index over task and inbox text
+
+Terms are normalised for Russian: lower case, ё → е, then a light suffix
+stemmer strips one inflection ending ("стоматологу", "стоматолога" →
+"стоматолог"), so a question matches a task in another grammatical case.
+
+A user's index is built on their first search (one read of their tasks and
+notes) and then patched by database.on_change, like ai_service's context
+cache. A query term matches every indexed term it is a prefix of
+("созвон" finds "созвониться"), looked up by bisect in the user's sorted
+term list; hits are ranked by Σ tf · idf over the matched terms. The
+least recently searched users are dropped beyond SEARCH_INDEX_USERS.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Iterable, Optional
+
+from tinydb.table import Document
+
+import database
+import database_async as adb
+
+SEARCH_INDEX_USERS = int(os.getenv("SEARCH_INDEX_USERS", "1000"))
+PREFIX_MIN = 4  # shorter query terms match whole terms only
+TABLES = ("tasks", "inbox")
+
+_WORD = re.compile(r"[а-яa-z0-9]+")
+# longest first; one ending is stripped, leaving a stem of at least 3 letters
+_ENDINGS = sorted(
+    (
+        "иями ями ами ией ому ему ого его ыми ими ешь ете ишь ите ить ать ять еть уть "
+        "ться тся ая яя ое ее ые ие ый ий ой ем им ым ом ах ях ам ям ов ев ей ия ья ью ию "
+        "ть ет ит ут ют ат ят а я о е ы и у ю ь й"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+
+
+def stem(word: str) -> str:
+    if not ("а" <= word[0] <= "я"):
+        return word
+    for end in _ENDINGS:
+        if word.endswith(end) and len(word) - len(end) >= 3:
+            return word[: -len(end)]
+    return word
+
+
+# question words carry no topic; dropped from queries unless nothing is left
+STOP_WORDS = {stem(w) for w in ("когда", "что", "где", "сколько", "запланировано", "подскажи", "меня")}
+
+
+def terms(text: str) -> list[str]:
+    """Normalised terms of text, in order (duplicates kept)."""
+    return [stem(w) for w in _WORD.findall(text.lower().replace("ё", "е")) if len(w) > 2]
+
+
+class _UserIndex:
+    def __init__(self):
+        self.postings: dict[str, dict[tuple, int]] = {}  # term → {(table, id): tf}
+        self.docs: dict[tuple, tuple[dict, list[str]]] = {}  # (table, id) → (doc, terms)
+        self.terms: list[str] = []  # postings keys, sorted
+
+    def add(self, table: str, doc: Document) -> None:
+        key = (table, doc.doc_id)
+        self.discard(key)
+        counts = Counter(terms(doc.get("text") or ""))
+        snapshot = {k: v for k, v in doc.items() if k != "history"}
+        self.docs[key] = (snapshot, list(counts))
+        for term, tf in counts.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                bisect.insort(self.terms, term)
+            self.postings[term][key] = tf
+
+    def discard(self, key: tuple) -> None:
+        entry = self.docs.pop(key, None)
+        if entry is None:
+            return
+        for term in entry[1]:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(key, None)
+                if not docs:
+                    del self.postings[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def expand(self, word: str) -> list[str]:
+        """Indexed terms matching query term word: itself, and those it prefixes."""
+        if len(word) < PREFIX_MIN:
+            return [word] if word in self.postings else []
+        i = bisect.bisect_left(self.terms, word)
+        out = []
+        while i < len(self.terms) and self.terms[i].startswith(word):
+            out.append(self.terms[i])
+            i += 1
+        return out
+
+
+class SearchIndex:
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users: OrderedDict[int, _UserIndex] = OrderedDict()
+
+    def on_change(self, table: str, doc: dict, removed: bool) -> None:
+        if table not in TABLES:
+            return
+        with self._lock:
+            idx = self._users.get(doc.get("uid"))
+            if idx is None:
+                return
+            if removed:
+                idx.discard((table, doc.doc_id))
+            else:
+                idx.add(table, doc)
+
+    def fill(self, uid: int, version: int, docs: Iterable[tuple[str, Document]]) -> bool:
+        """Install uid's index unless a write landed after version was read."""
+        idx = _UserIndex()
+        for table, doc in docs:
+            idx.add(table, doc)
+        with self._lock:
+            # writers bump the version before notifying, so under the lock
+            # either the check fails or on_change sees the new index
+            if database.data_version(uid) != version:
+                return False
+            self._users[uid] = idx
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return True
+
+    def search(self, uid: int, query: str, tables: Iterable[str] = TABLES,
+               limit: Optional[int] = None, where: Optional[Callable[[dict], bool]] = None,
+               ) -> Optional[list]:
+        """
+        [(score, table, Document)] best first, or None when uid's index is
+        not loaded. Any query term may match (OR), also as a prefix; rarer
+        terms weigh more.
+        where filters candidates before limit is applied.
+        """
+        words = terms(query)
+        wanted = [w for w in words if w not in STOP_WORDS] or words
+        tables = set(tables)
+        with self._lock:
+            idx = self._users.get(uid)
+            if idx is None:
+                return None
+            self._users.move_to_end(uid)
+            n = len(idx.docs) or 1
+            scores: Counter = Counter()
+            matched = {term for word in set(wanted) for term in idx.expand(word)}
+            for term in matched:
+                docs = idx.postings[term]
+                idf = math.log(1 + n / len(docs))
+                for key, tf in docs.items():
+                    if key[0] in tables:
+                        scores[key] += tf * idf
+            ranked = sorted(
+                ((score, key, idx.docs[key][0]) for key, score in scores.items()),
+                key=lambda h: (-h[0], h[2].get("due") or h[2].get("ts") or ""),
+            )
+        hits = []
+        for score, (table, doc_id), doc in ranked:
+            if where is None or where(doc):
+                hits.append((score, table, Document(doc, doc_id=doc_id)))
+                if limit is not None and len(hits) >= limit:
+                    break
+        return hits
+
+
+_index = SearchIndex(SEARCH_INDEX_USERS)
+database.on_change(_index.on_change)
+
+
+async def search(uid: int, query: str, tables: Iterable[str] = TABLES,
+                 limit: Optional[int] = None, where: Optional[Callable[[dict], bool]] = None) -> list:
+    """Ranked [(score, table, Document)] of uid's tasks / notes matching query."""
+    hits = _index.search(uid, query, tables, limit, where)
+    while hits is None:
+        version = database.data_version(uid)
+        tasks = await adb.list_tasks(uid)
+        notes = await adb.list_inbox(uid)
+        docs = [("tasks", t) for t in tasks] + [("inbox", n) for n in notes]
+        # a write landed while loading: its event was missed, load again
+        if _index.fill(uid, version, docs):
+            hits = _index.search(uid, query, tables, limit, where)
+    return hits
@@ -0,0 +1,754 @@
+"""
+storage.py  •  Pluggable storage engines behind database.py
+Engines:
+    - TinyDBStore : JSON file + write cache + in‑memory secondary indexes,
+                    flushed atomically by a background thread
+    - SQLiteStore : one SQL table per collection, indexed columns, WAL mode
+
+Both speak the same small document API (insert / get / update / remove /
+find / find_range / find_page / scan_range / all) and return tinydb ``Document`` objects, so callers
+keep using ``doc.doc_id`` regardless of the engine.
+
+One‑shot migration from the legacy JSON file:
+    python storage.py migrate ~/.planner_bot/db.json ~/.planner_bot/db.sqlite3
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from tinydb import TinyDB
+from tinydb.storages import Storage
+from tinydb.table import Document
+
+logger = logging.getLogger(__name__)
+
+# Composite keys per table; every prefix of the tuple is indexed, so
+# ("uid", "type", "obj_id") serves uid‑only, (uid, type) and (uid, type, obj_id)
+# lookups. Tables not listed here get the plain per‑uid index.
+INDEX_FIELDS = {
+    "tasks": ("uid", "due"),
+    "okr": ("uid", "type", "obj_id"),
+    "reminders": ("uid", "task_id"),
+}
+
+
+# Tables that are also scanned across all users in the order of one field
+# (due reminders, today's inbox notes); that field gets a global ordered index.
+ORDER_FIELDS = {
+    "reminders": "fire_at",
+    "inbox": "ts",
+}
+
+
+def index_fields(name: str) -> tuple:
+    return INDEX_FIELDS.get(name, ("uid",))
+
+
+def order_field(name: str) -> Optional[str]:
+    return ORDER_FIELDS.get(name)
+
+
+def columns(name: str) -> tuple:
+    """Fields stored as real columns by SQLiteStore."""
+    fields = index_fields(name)
+    f = order_field(name)
+    return fields + (f,) if f and f not in fields else fields
+
+
+def _index_key(name: str, uid: int, eq: dict) -> tuple:
+    """Longest indexed prefix (starting with uid) covered by the filters."""
+    key = [uid]
+    for f in index_fields(name)[1:]:
+        if f not in eq:
+            break
+        key.append(eq[f])
+    return tuple(key)
+
+
+class Store:
+    """Document store interface used by database.py."""
+
+    # transaction() undoes the block's writes when it raises
+    rolls_back = False
+
+    def insert(self, name: str, doc: dict) -> int:
+        raise NotImplementedError
+
+    def get(self, name: str, doc_id: int) -> Optional[Document]:
+        raise NotImplementedError
+
+    def update(self, name: str, fields: dict, doc_ids: Iterable[int]) -> list[Document]:
+        """Merge fields into the documents; return them as updated."""
+        raise NotImplementedError
+
+    def remove(self, name: str, doc_ids: Iterable[int]) -> list[Document]:
+        """Delete the documents; return what was removed."""
+        raise NotImplementedError
+
+    def find(self, name: str, uid: int, **eq: Any) -> list[Document]:
+        """Documents of one user matching all equality filters, by doc_id."""
+        raise NotImplementedError
+
+    def count(self, name: str, uid: int, before: Optional[int] = None, **eq: Any) -> int:
+        """Number of find() documents, only those with doc_id < before if given."""
+        return sum(1 for d in self.find(name, uid, **eq) if before is None or d.doc_id < before)
+
+    def find_range(self, name: str, uid: int, field: str,
+                   lo: Any, hi: Any, **eq: Any) -> list[Document]:
+        """Like find(), plus lo <= doc[field] <= hi."""
+        return [
+            d for d in self.find(name, uid, **eq)
+            if d.get(field) is not None and lo <= d[field] <= hi
+        ]
+
+    def find_page(self, name: str, uid: int, limit: int, after: Optional[int] = None,
+                  before: Optional[int] = None, **eq: Any) -> list[Document]:
+        """Keyset page of find(): the first limit documents with doc_id > after,
+        or the last limit with doc_id < before; always in doc_id order."""
+        docs = self.find(name, uid, **eq)
+        if before is not None:
+            return [d for d in docs if d.doc_id < before][-limit:]
+        return [d for d in docs if after is None or d.doc_id > after][:limit]
+
+    def scan_range(self, name: str, field: str, lo: Any = None, hi: Any = None,
+                   limit: Optional[int] = None) -> list[Document]:
+        """Documents of every user with lo <= doc[field] <= hi (None = open
+        end), ordered by field; served by the ORDER_FIELDS index."""
+        docs = sorted(
+            (d for d in self.all(name)
+             if d.get(field) is not None
+             and (lo is None or d[field] >= lo) and (hi is None or d[field] <= hi)),
+            key=lambda d: (d[field], d.doc_id),
+        )
+        return docs[:limit] if limit is not None else docs
+
+    def all(self, name: str) -> list[Document]:
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group the writes made inside so they persist together. Only stores
+        with rolls_back (SQLite) also drop them when the block raises;
+        TinyDB keeps whatever was written before the error.
+        """
+        yield
+
+    def metrics(self) -> dict:
+        """Engine counters for logging / diagnostics."""
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+# ---------- TinyDB ---------- #
+class AtomicJSONCache(Storage):
+    """
+    Write cache for TinyDB that persists dirty tables in the background.
+
+    TinyDB reads and writes the in‑memory dict only; the owner marks the
+    tables it touched and calls snapshot() / commit() to persist them.
+    Clean tables keep their last serialized JSON, so a flush re‑encodes only
+    what changed, and the file is replaced atomically (temp file + fsync +
+    rename), so a crash leaves either the old or the new database on disk.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self._path = Path(path)
+        self.cache: Optional[dict] = None
+        self._fragments: dict[str, str] = {}
+        self._dirty: set[str] = set()
+        self.pending_writes = 0
+
+    def read(self):
+        if self.cache is None:
+            if self._path.exists() and self._path.stat().st_size:
+                with open(self._path, encoding="utf-8") as fh:
+                    self.cache = json.load(fh)
+            else:
+                return None
+        return self.cache
+
+    def write(self, data):
+        self.cache = data
+
+    def mark_dirty(self, name: str) -> None:
+        self._dirty.add(name)
+        self.pending_writes += 1
+
+    def snapshot(self) -> Optional[str]:
+        """Serialize dirty tables; return the whole file body or None if clean.
+
+        Must run under the owner's lock: it reads the live cache.
+        """
+        if not self._dirty:
+            return None
+        tables = self.cache or {}
+        # tables loaded from disk but never serialized yet are included too
+        for name in self._dirty | (tables.keys() - self._fragments.keys()):
+            if name in tables:
+                self._fragments[name] = json.dumps(tables[name])
+            else:
+                self._fragments.pop(name, None)
+        self._dirty.clear()
+        self.pending_writes = 0
+        return "{" + ", ".join(
+            f"{json.dumps(name)}: {frag}" for name, frag in self._fragments.items()
+        ) + "}"
+
+    def commit(self, body: str) -> int:
+        """Atomically replace the file with body; return bytes written."""
+        data = body.encode("utf-8")
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._path)
+        return len(data)
+
+    def close(self) -> None:
+        pass
+
+
+class _Indexes:
+    """In‑memory doc_id sets keyed by field prefixes, built lazily per table.
+
+    Kept in sync by TinyDBStore's write methods, so reads for one user cost
+    O(that user's rows) instead of a scan over every document in the table.
+    Tables in ORDER_FIELDS also keep a sorted (value, doc_id) list for
+    range scans across users.
+    """
+
+    def __init__(self, db: TinyDB):
+        self._db = db
+        self._keys: dict[str, dict[tuple, set[int]]] = {}
+        self._ordered: dict[str, list[tuple]] = {}
+
+    @staticmethod
+    def _prefixes(name: str, doc: dict):
+        fields = index_fields(name)
+        key = tuple(doc.get(f) for f in fields)
+        for n in range(1, len(fields) + 1):
+            yield key[:n]
+
+    def _ensure(self, name: str) -> dict[tuple, set[int]]:
+        keys = self._keys.get(name)
+        if keys is None:
+            keys = self._keys[name] = {}
+            for doc in self._db.table(name).all():
+                for k in self._prefixes(name, doc):
+                    keys.setdefault(k, set()).add(doc.doc_id)
+        return keys
+
+    def _ensure_ordered(self, name: str, field: str) -> list[tuple]:
+        entries = self._ordered.get(name)
+        if entries is None:
+            entries = self._ordered[name] = sorted(
+                (doc[field], doc.doc_id)
+                for doc in self._db.table(name).all()
+                if doc.get(field) is not None
+            )
+        return entries
+
+    def add(self, name: str, doc_id: int, doc: dict) -> None:
+        keys = self._ensure(name)
+        for k in self._prefixes(name, doc):
+            keys.setdefault(k, set()).add(doc_id)
+        field = order_field(name)
+        if field and doc.get(field) is not None:
+            bisect.insort(self._ensure_ordered(name, field), (doc[field], doc_id))
+
+    def discard(self, name: str, doc_id: int, doc: dict) -> None:
+        keys = self._ensure(name)
+        for k in self._prefixes(name, doc):
+            ids = keys.get(k)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del keys[k]
+        field = order_field(name)
+        if field and doc.get(field) is not None:
+            entries = self._ensure_ordered(name, field)
+            i = bisect.bisect_left(entries, (doc[field], doc_id))
+            if i < len(entries) and entries[i] == (doc[field], doc_id):
+                del entries[i]
+
+    def lookup(self, name: str, key: tuple) -> set[int]:
+        return self._ensure(name).get(key, set())
+
+    def ordered(self, name: str, lo: Any, hi: Any) -> Iterable[int]:
+        """doc_ids with lo <= value <= hi in value order (ORDER_FIELDS)."""
+        entries = self._ensure_ordered(name, order_field(name))
+        i = 0 if lo is None else bisect.bisect_left(entries, (lo,))
+        j = len(entries) if hi is None else bisect.bisect_right(entries, (hi, float("inf")))
+        for k in range(i, j):
+            yield entries[k][1]
+
+
+class TinyDBStore(Store):
+    """
+    TinyDB with write‑cache. A daemon thread flushes dirty tables every
+    flush_interval seconds, or sooner once flush_max_writes writes are
+    pending; close() stops it and flushes what is left.
+
+    Writes go straight into the cached table dicts: TinyDB's own
+    insert/update/remove rebuild the whole table per call, which makes
+    every write O(table size). Reads still go through TinyDB.
+    """
+
+    def __init__(self, path: Path, flush_interval: float = 2.0,
+                 flush_max_writes: int = 200):
+        self._db = TinyDB(path, storage=AtomicJSONCache)
+        self._cache: AtomicJSONCache = self._db.storage
+        self._idx = _Indexes(self._db)
+        self._next_ids: dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._flush_max_writes = flush_max_writes
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats = {
+            "flushes": 0,
+            "bytes_written": 0,
+            "last_flush_bytes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="tinydb-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    # --- background flushing ---
+    def _touch(self, name: str) -> None:
+        self._cache.mark_dirty(name)
+        if self._cache.pending_writes >= self._flush_max_writes:
+            self._wake.set()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("TinyDB background flush failed")
+
+    def flush(self) -> None:
+        """Persist dirty tables now; the file write happens outside the lock."""
+        with self._flush_lock:
+            t0 = time.perf_counter()
+            with self._lock:
+                body = self._cache.snapshot()
+            if body is None:
+                return
+            written = self._cache.commit(body)
+            ms = (time.perf_counter() - t0) * 1000
+            st = self._stats
+            st["flushes"] += 1
+            st["bytes_written"] += written
+            st["last_flush_bytes"] = written
+            st["last_flush_ms"] = round(ms, 2)
+            st["max_flush_ms"] = round(max(st["max_flush_ms"], ms), 2)
+            logger.debug("TinyDB flush: %d bytes in %.1f ms", written, ms)
+
+    def metrics(self) -> dict:
+        return {**self._stats, "pending_writes": self._cache.pending_writes}
+
+    def _raw(self, name: str) -> dict:
+        """The cached {str(doc_id): doc} dict of a table (lock held)."""
+        tables = self._cache.read()
+        if tables is None:
+            tables = self._cache.cache = {}
+        return tables.setdefault(name, {})
+
+    def insert(self, name, doc):
+        with self._lock:
+            raw = self._raw(name)
+            doc_id = self._next_ids.get(name) or max(map(int, raw), default=0) + 1
+            self._next_ids[name] = doc_id + 1
+            # index first: a lazily built index must not see the new row twice
+            self._idx.add(name, doc_id, doc)
+            raw[str(doc_id)] = dict(doc)
+            self._touch(name)
+            return doc_id
+
+    def get(self, name, doc_id):
+        with self._lock:
+            return self._db.table(name).get(doc_id=doc_id)
+
+    def update(self, name, fields, doc_ids):
+        with self._lock:
+            raw = self._raw(name)
+            updated = []
+            for doc_id in doc_ids:
+                old = raw.get(str(doc_id))
+                if old is None:
+                    continue
+                new = Document({**old, **fields}, doc_id=doc_id)
+                self._idx.discard(name, doc_id, old)
+                self._idx.add(name, doc_id, new)
+                raw[str(doc_id)] = dict(new)
+                updated.append(new)
+            if updated:
+                self._touch(name)
+            return updated
+
+    def remove(self, name, doc_ids):
+        with self._lock:
+            raw = self._raw(name)
+            removed = []
+            for doc_id in doc_ids:
+                old = raw.pop(str(doc_id), None)
+                if old is not None:
+                    self._idx.discard(name, doc_id, old)
+                    removed.append(Document(old, doc_id=doc_id))
+            if removed:
+                self._touch(name)
+            return removed
+
+    def find(self, name, uid, **eq):
+        with self._lock:
+            tbl = self._db.table(name)
+            out = []
+            for doc_id in sorted(self._idx.lookup(name, _index_key(name, uid, eq))):
+                doc = tbl.get(doc_id=doc_id)
+                if doc is not None and all(doc.get(k) == v for k, v in eq.items()):
+                    out.append(doc)
+            return out
+
+    def find_page(self, name, uid, limit, after=None, before=None, **eq):
+        with self._lock:
+            tbl = self._db.table(name)
+            ids = sorted(self._idx.lookup(name, _index_key(name, uid, eq)))
+            if before is not None:
+                # walk backwards from the cursor, then restore doc_id order
+                candidates = reversed(ids[:bisect.bisect_left(ids, before)])
+            else:
+                candidates = ids[bisect.bisect_right(ids, after):] if after is not None else ids
+            out = []
+            for doc_id in candidates:
+                doc = tbl.get(doc_id=doc_id)
+                if doc is not None and all(doc.get(k) == v for k, v in eq.items()):
+                    out.append(doc)
+                    if len(out) >= limit:
+                        break
+            return out[::-1] if before is not None else out
+
+    def scan_range(self, name, field, lo=None, hi=None, limit=None):
+        if field != order_field(name):
+            return super().scan_range(name, field, lo, hi, limit)
+        with self._lock:
+            tbl = self._db.table(name)
+            out = []
+            for doc_id in self._idx.ordered(name, lo, hi):
+                if limit is not None and len(out) >= limit:
+                    break
+                out.append(tbl.get(doc_id=doc_id))
+            return out
+
+    def all(self, name):
+        with self._lock:
+            return self._db.table(name).all()
+
+    @contextmanager
+    def transaction(self):
+        # snapshot() runs under the same lock, so a flush sees all of the
+        # writes made inside or none of them
+        with self._lock:
+            yield
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+
+# ---------- SQLite ---------- #
+def _qi(name: str) -> str:
+    """Quote an SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SQLiteStore(Store):
+    """
+    One table per collection: ``id INTEGER PRIMARY KEY``, the indexed fields
+    from INDEX_FIELDS as real columns (covered by one composite index), the
+    ORDER_FIELDS column with its own index, and the full document as JSON
+    in ``doc``. A write touches exactly one row.
+
+    Writes share one connection under a lock; reads use a connection per
+    thread, so in WAL mode they never wait for the writer. Reads made by the
+    thread inside a transaction go to the writer connection and see its
+    uncommitted writes.
+    """
+
+    rolls_back = True
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._in_tx = False  # writer connection inside BEGIN (lock held)
+        self._tx_thread: Optional[int] = None
+        self._tables: set[str] = set()
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self._path), check_same_thread=False,
+                               isolation_level=None)
+
+    def _reader(self) -> sqlite3.Connection:
+        if self._in_tx and self._tx_thread == threading.get_ident():
+            return self._conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def _ensure(self, name: str) -> None:
+        if name in self._tables:
+            return
+        cols = index_fields(name)
+        col_defs = "".join(f", {_qi(c)}" for c in columns(name))
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {_qi(name)} "
+                f"(id INTEGER PRIMARY KEY{col_defs}, doc TEXT NOT NULL)"
+            )
+            # tables created before a column was added to INDEX_FIELDS /
+            # ORDER_FIELDS: add it and backfill from the JSON document. This
+            # must precede CREATE INDEX: SQLite reads an unknown quoted name
+            # there as a string literal and the later ALTER corrupts the index
+            have = {r[1] for r in self._conn.execute(f"PRAGMA table_info({_qi(name)})")}
+            for c in columns(name):
+                if c not in have:
+                    self._conn.execute(f"ALTER TABLE {_qi(name)} ADD COLUMN {_qi(c)}")
+                    self._conn.execute(
+                        f"UPDATE {_qi(name)} SET {_qi(c)} = json_extract(doc, ?)", (f'$."{c}"',)
+                    )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {_qi(name + '_' + '_'.join(cols))} "
+                f"ON {_qi(name)} ({', '.join(_qi(c) for c in cols)})"
+            )
+            field = order_field(name)
+            if field:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_qi(name + '_by_' + field)} "
+                    f"ON {_qi(name)} ({_qi(field)}, id)"
+                )
+            self._tables.add(name)
+
+    @contextmanager
+    def transaction(self):
+        """One BEGIN … COMMIT on the writer connection; nested calls join it."""
+        with self._lock:
+            if self._in_tx:
+                yield
+                return
+            self._conn.execute("BEGIN")
+            self._in_tx, self._tx_thread = True, threading.get_ident()
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                # a CREATE TABLE inside the block was undone too
+                self._tables.clear()
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._in_tx, self._tx_thread = False, None
+
+    @staticmethod
+    def _row(name: str, doc: dict) -> tuple:
+        return tuple(doc.get(c) for c in columns(name)) + (
+            json.dumps(doc, ensure_ascii=False),
+        )
+
+    @staticmethod
+    def _docs(rows) -> list[Document]:
+        return [Document(json.loads(d), doc_id=i) for i, d in rows]
+
+    def _write(self, name: str, doc_id: Optional[int], doc: dict) -> int:
+        cols = ("id",) + columns(name) + ("doc",)
+        cur = self._conn.execute(
+            f"INSERT OR REPLACE INTO {_qi(name)} ({', '.join(_qi(c) for c in cols)}) "
+            f"VALUES ({', '.join('?' * len(cols))})",
+            (doc_id,) + self._row(name, doc),
+        )
+        return cur.lastrowid
+
+    def _get(self, conn: sqlite3.Connection, name: str, doc_id: int) -> Optional[Document]:
+        self._ensure(name)
+        rows = conn.execute(
+            f"SELECT id, doc FROM {_qi(name)} WHERE id = ?", (doc_id,)
+        ).fetchall()
+        return self._docs(rows)[0] if rows else None
+
+    def insert(self, name, doc):
+        self._ensure(name)
+        with self.transaction():
+            return self._write(name, None, doc)
+
+    def get(self, name, doc_id):
+        return self._get(self._reader(), name, doc_id)
+
+    def update(self, name, fields, doc_ids):
+        self._ensure(name)
+        updated = []
+        with self.transaction():
+            for doc_id in doc_ids:
+                old = self._get(self._conn, name, doc_id)
+                if old is not None:
+                    new = Document({**old, **fields}, doc_id=doc_id)
+                    self._write(name, doc_id, new)
+                    updated.append(new)
+        return updated
+
+    def remove(self, name, doc_ids):
+        self._ensure(name)
+        removed = []
+        with self.transaction():
+            for doc_id in doc_ids:
+                old = self._get(self._conn, name, doc_id)
+                if old is not None:
+                    self._conn.execute(f"DELETE FROM {_qi(name)} WHERE id = ?", (doc_id,))
+                    removed.append(old)
+        return removed
+
+    @staticmethod
+    def _where(name: str, uid: int, eq: dict) -> tuple[str, list]:
+        clauses, args = [], []
+        for k, v in {"uid": uid, **eq}.items():
+            if k in columns(name):
+                clauses.append(f"{_qi(k)} IS ?")
+            else:
+                clauses.append("json_extract(doc, ?) IS ?")
+                args.append(f'$."{k}"')
+            args.append(v)
+        return " AND ".join(clauses), args
+
+    def _select(self, name: str, uid: int, eq: dict,
+                extra_sql: str = "", extra_args: tuple = (),
+                desc: bool = False, limit: Optional[int] = None) -> list[Document]:
+        where, args = self._where(name, uid, eq)
+        sql = (
+            f"SELECT id, doc FROM {_qi(name)} WHERE {where}"
+            f"{extra_sql} ORDER BY id{' DESC' if desc else ''}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            extra_args += (limit,)
+        self._ensure(name)
+        return self._docs(self._reader().execute(sql, tuple(args) + extra_args).fetchall())
+
+    def find(self, name, uid, **eq):
+        return self._select(name, uid, eq)
+
+    def count(self, name, uid, before=None, **eq):
+        where, args = self._where(name, uid, eq)
+        if before is not None:
+            where += " AND id < ?"
+            args.append(before)
+        self._ensure(name)
+        return self._reader().execute(
+            f"SELECT COUNT(*) FROM {_qi(name)} WHERE {where}", tuple(args)
+        ).fetchone()[0]
+
+    def find_page(self, name, uid, limit, after=None, before=None, **eq):
+        if before is not None:
+            return self._select(name, uid, eq, " AND id < ?", (before,),
+                                desc=True, limit=limit)[::-1]
+        if after is not None:
+            return self._select(name, uid, eq, " AND id > ?", (after,), limit=limit)
+        return self._select(name, uid, eq, limit=limit)
+
+    def find_range(self, name, uid, field, lo, hi, **eq):
+        if field in columns(name):
+            return self._select(name, uid, eq, f" AND {_qi(field)} BETWEEN ? AND ?", (lo, hi))
+        return super().find_range(name, uid, field, lo, hi, **eq)
+
+    def scan_range(self, name, field, lo=None, hi=None, limit=None):
+        if field not in columns(name):
+            return super().scan_range(name, field, lo, hi, limit)
+        self._ensure(name)
+        clauses, args = [f"{_qi(field)} IS NOT NULL"], []
+        if lo is not None:
+            clauses.append(f"{_qi(field)} >= ?")
+            args.append(lo)
+        if hi is not None:
+            clauses.append(f"{_qi(field)} <= ?")
+            args.append(hi)
+        sql = (
+            f"SELECT id, doc FROM {_qi(name)} WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {_qi(field)}, id"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self._docs(self._reader().execute(sql, tuple(args)).fetchall())
+
+    def all(self, name):
+        self._ensure(name)
+        return self._docs(self._reader().execute(
+            f"SELECT id, doc FROM {_qi(name)} ORDER BY id"
+        ).fetchall())
+
+    def import_table(self, name: str, docs: dict[int, dict]) -> None:
+        """Bulk‑load documents keeping their original doc_ids."""
+        self._ensure(name)
+        with self.transaction():
+            for doc_id, doc in docs.items():
+                self._write(name, int(doc_id), doc)
+
+    def close(self):
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._conn.close()
+
+
+def migrate_json(json_path: Path, store: SQLiteStore) -> int:
+    """Copy every table of a TinyDB JSON file into store; return doc count."""
+    with open(json_path, encoding="utf-8") as fh:
+        raw = json.load(fh) or {}
+    total = 0
+    for name, docs in raw.items():
+        store.import_table(name, docs)
+        total += len(docs)
+    return total
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        print("usage: python storage.py migrate <db.json> <db.sqlite3>")
+        sys.exit(2)
+    dst = SQLiteStore(Path(sys.argv[3]))
+    n = migrate_json(Path(sys.argv[2]), dst)
+    dst.close()
+    print(f"migrated {n} documents")
@@ -0,0 +1,368 @@
+"""
+stt_pool.py  •  Vosk recognition off the event loop
+
+A fixed set of worker processes (STT_WORKERS, default: half the cores),
+each running ``python stt_vosk.py`` and loading the model (VOSK_MODEL_PATH)
+once. Nothing is loaded until the first voice note, or until warm_up() is
+called when STT_WARMUP=1. Jobs and
+answers travel as length‑prefixed pickles over the workers' stdin/stdout,
+so the bot process never imports Vosk and workers never import the bot.
+Every job goes to the least‑loaded worker, and a worker that dies is
+respawned after an exponential backoff (STT_RESTART_BACKOFF, doubling up
+to STT_RESTART_BACKOFF_MAX), at most STT_MAX_RESTARTS times in a row
+without becoming ready (vosk missing, model directory absent). Once every
+worker has given up the pool is marked failed and every job gets SttError.
+
+Backpressure: at most STT_QUEUE_SIZE jobs are admitted at a time; further
+callers wait their turn (or get SttBusy when STT_QUEUE_WAIT expires).
+
+Voice notes never touch the disk: decode_ogg_stream() pipes the OGG bytes
+through ffmpeg (stdin → stdout, raw 16 kHz mono PCM), and stream() feeds the
+chunks to one worker as ffmpeg produces them. Decoding and recognition
+overlap, and the caller gets partial hypotheses along the way.
+
+Usage:
+    async for kind, text in stt_pool.stream(stt_pool.decode_ogg_stream(data)):
+        ...   # kind: "partial" … then one "final"
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+import pickle
+import struct
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterable, AsyncIterator, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("STT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+QUEUE_SIZE = int(os.getenv("STT_QUEUE_SIZE", str(WORKERS * 4)))
+QUEUE_WAIT = float(os.getenv("STT_QUEUE_WAIT", "30"))
+JOB_TIMEOUT = float(os.getenv("STT_JOB_TIMEOUT", "120"))
+WARMUP = os.getenv("STT_WARMUP", "0") == "1"
+RESTART_BACKOFF = float(os.getenv("STT_RESTART_BACKOFF", "0.5"))
+RESTART_BACKOFF_MAX = float(os.getenv("STT_RESTART_BACKOFF_MAX", "30"))
+MAX_RESTARTS = int(os.getenv("STT_MAX_RESTARTS", "5"))
+WORKER_SCRIPT = str(Path(__file__).with_name("stt_vosk.py"))
+SAMPLE_RATE = 16000
+CHUNK_BYTES = 16000  # 0.5 s of 16 kHz s16le audio per feed
+
+
+class DecodeError(RuntimeError):
+    """ffmpeg could not decode the voice note."""
+
+
+class SttBusy(RuntimeError):
+    """The recognition queue stayed full for longer than STT_QUEUE_WAIT."""
+
+
+class SttError(RuntimeError):
+    """A worker failed on the job or died while holding it."""
+
+
+class _Worker:
+    def __init__(self, proc: asyncio.subprocess.Process, deaths: int = 0):
+        self.proc = proc
+        self.deaths = deaths  # predecessors in this slot that died, reset on ready
+        self.gave_up = False
+        self.started = time.perf_counter()
+        # job id → answer queue of the streaming session
+        self.pending: dict[int, asyncio.Queue] = {}
+        self.reader: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def send(self, msg: tuple) -> None:
+        data = pickle.dumps(msg)
+        self.proc.stdin.write(struct.pack("!I", len(data)) + data)
+        await self.proc.stdin.drain()
+
+
+class SttPool:
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE):
+        self._size = workers
+        self._workers: list[_Worker] = []
+        self._slots = asyncio.Semaphore(queue_size)
+        self._ids = itertools.count(1)
+        self._closing = False
+        self._stopped = asyncio.Event()  # wakes workers waiting out a backoff
+        self.failed: Optional[str] = None
+        self._stats = {"jobs": 0, "errors": 0, "rejected": 0, "restarts": 0,
+                       "waiting": 0, "max_waiting": 0, "last_ms": 0.0, "max_ms": 0.0,
+                       "cold_start_ms": 0.0, "model_load_ms": 0.0, "warmup_ms": 0.0}
+
+    async def start(self) -> None:
+        for _ in range(self._size):
+            self._workers.append(await self._spawn())
+
+    async def _spawn(self, deaths: int = 0) -> _Worker:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        w = _Worker(proc, deaths)
+        w.reader = asyncio.create_task(self._drain(w))
+        return w
+
+    async def _drain(self, w: _Worker) -> None:
+        out = w.proc.stdout
+        try:
+            while True:
+                (size,) = struct.unpack("!I", await out.readexactly(4))
+                kind, job_id, payload = pickle.loads(await out.readexactly(size))
+                if kind == "ready":
+                    self._ready(w, payload)
+                else:
+                    _deliver(w.pending, job_id, kind, payload)
+        except asyncio.IncompleteReadError:
+            pass
+        for job_id in list(w.pending):
+            _deliver(w.pending, job_id, "error", "STT worker exited")
+        code = await w.proc.wait()
+        if self._closing or self.failed:
+            return
+        deaths = w.deaths + 1
+        if deaths > MAX_RESTARTS:
+            w.gave_up = True
+            logger.error("STT worker %s exited (%s) %d times in a row, not respawning",
+                         w.proc.pid, code, deaths)
+            if all(x.gave_up for x in self._workers):
+                self.failed = f"STT workers keep exiting (last code {code})"
+            return
+        delay = min(RESTART_BACKOFF * 2 ** (deaths - 1), RESTART_BACKOFF_MAX)
+        logger.warning("STT worker %s exited (%s), respawning in %.1f s", w.proc.pid, code, delay)
+        try:
+            await asyncio.wait_for(self._stopped.wait(), delay)
+            return  # closed while waiting
+        except asyncio.TimeoutError:
+            pass
+        self._stats["restarts"] += 1
+        self._workers[self._workers.index(w)] = await self._spawn(deaths)
+
+    def _ready(self, w: _Worker, timings: dict) -> None:
+        # spawn → interpreter → model load → warm recognizer, as seen from here
+        cold = round((time.perf_counter() - w.started) * 1000, 1)
+        w.deaths = 0
+        self._stats.update(timings, cold_start_ms=cold)
+        logger.info("STT worker %s ready in %.0f ms (model %.0f ms, warm-up %.0f ms)",
+                    w.proc.pid, cold, timings["model_load_ms"], timings["warmup_ms"])
+
+    @asynccontextmanager
+    async def _job(self) -> AsyncIterator[tuple[_Worker, int]]:
+        """Admission (backpressure), worker choice and timing for one job."""
+        st = self._stats
+        if self.failed:
+            st["errors"] += 1
+            raise SttError(self.failed)
+        st["waiting"] += 1
+        st["max_waiting"] = max(st["max_waiting"], st["waiting"])
+        try:
+            await asyncio.wait_for(self._slots.acquire(), QUEUE_WAIT)
+        except asyncio.TimeoutError:
+            st["rejected"] += 1
+            raise SttBusy("speech recognition queue is full") from None
+        finally:
+            st["waiting"] -= 1
+        t0 = time.perf_counter()
+        worker = min((w for w in self._workers if w.alive),
+                     key=lambda w: len(w.pending), default=None)
+        job_id = next(self._ids)
+        st["jobs"] += 1
+        try:
+            if worker is None:
+                raise SttError("no STT worker is running")
+            yield worker, job_id
+        except Exception:
+            st["errors"] += 1
+            raise
+        finally:
+            if worker is not None:
+                worker.pending.pop(job_id, None)
+            self._slots.release()
+            st["last_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            st["max_ms"] = max(st["max_ms"], st["last_ms"])
+
+    async def stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        rate: int = SAMPLE_RATE,
+        phrases: Optional[Sequence[str]] = None,
+    ) -> AsyncIterator[tuple[str, str]]:
+        """
+        Recognise PCM chunks as they arrive; yield ("partial", text) whenever
+        the hypothesis changes and finally ("final", text). The session is
+        pinned to one worker; JOB_TIMEOUT bounds the silence between answers.
+        phrases enables the grammar fast mode for short commands
+        (see stt_vosk.Stream).
+        """
+        async with self._job() as (worker, job_id):
+            answers = worker.pending[job_id] = asyncio.Queue()
+            await worker.send(("open", job_id, (rate, list(phrases or ()))))
+
+            async def feed() -> None:
+                try:
+                    async for chunk in chunks:
+                        await worker.send(("feed", job_id, chunk))
+                    await worker.send(("close", job_id, None))
+                except Exception as exc:
+                    answers.put_nowait(("raise", exc))
+
+            feeder = asyncio.create_task(feed())
+            finished = False
+            try:
+                while True:
+                    kind, payload = await asyncio.wait_for(answers.get(), JOB_TIMEOUT)
+                    if kind == "raise":
+                        raise payload
+                    if kind == "error":
+                        raise SttError(payload)
+                    finished = kind == "final"
+                    yield kind, payload
+                    if finished:
+                        break
+            finally:
+                feeder.cancel()
+                if not finished and worker.alive:
+                    await worker.send(("drop", job_id, None))
+
+    async def transcribe_pcm(
+        self, pcm: bytes, rate: int = SAMPLE_RATE, phrases: Optional[Sequence[str]] = None
+    ) -> str:
+        text = ""
+        async for _kind, text in self.stream(_chunked(pcm), rate, phrases):
+            pass
+        return text
+
+    def metrics(self) -> dict:
+        return dict(
+            self._stats,
+            workers=len(self._workers),
+            failed=self.failed,
+            alive=sum(w.alive for w in self._workers),
+            in_flight=sum(len(w.pending) for w in self._workers),
+        )
+
+    async def close(self) -> None:
+        self._closing = True
+        self._stopped.set()
+        for w in self._workers:
+            if w.alive:
+                w.proc.stdin.close()
+        for w in self._workers:
+            try:
+                await asyncio.wait_for(w.proc.wait(), 5)
+            except asyncio.TimeoutError:
+                w.proc.kill()
+                await w.proc.wait()
+            if w.reader is not None:
+                await w.reader
+
+
+def _deliver(pending: dict, job_id: int, kind: str, payload: Any) -> None:
+    answers = pending.get(job_id)
+    if answers is None:
+        return  # caller already gave up
+    answers.put_nowait((kind, payload))
+    if kind in ("final", "error"):
+        del pending[job_id]
+
+
+async def _chunked(pcm: bytes) -> AsyncIterator[bytes]:
+    view = memoryview(pcm)
+    for i in range(0, len(view), CHUNK_BYTES):
+        yield bytes(view[i:i + CHUNK_BYTES])
+
+
+_pool: Optional[SttPool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool() -> SttPool:
+    """Start the workers on first use; voice notes are rare next to text."""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = SttPool()
+            await pool.start()
+            _pool = pool
+            logger.info("STT pool started: %d workers, queue %d", WORKERS, QUEUE_SIZE)
+    return _pool
+
+
+async def warm_up() -> None:
+    """Start the workers in the background (bot post_init, STT_WARMUP=1)."""
+    try:
+        await get_pool()
+    except Exception:
+        logger.exception("STT warm-up failed")
+
+
+async def decode_ogg_stream(data: bytes, rate: int = SAMPLE_RATE) -> AsyncIterator[bytes]:
+    """Decode an OGG/Opus voice note to raw s16le mono PCM, chunk by chunk."""
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(rate), "-ac", "1", "pipe:1",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def pump() -> None:
+        try:
+            proc.stdin.write(bytes(data))
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg gave up early; its exit code tells why
+        finally:
+            proc.stdin.close()
+
+    writer = asyncio.create_task(pump())
+    try:
+        while chunk := await proc.stdout.read(CHUNK_BYTES):
+            yield chunk
+        await writer
+        err = await proc.stderr.read()
+        if await proc.wait() != 0:
+            raise DecodeError(err.decode(errors="replace").strip() or f"ffmpeg exited {proc.returncode}")
+    finally:
+        writer.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+async def transcribe_pcm(
+    pcm: bytes, rate: int = SAMPLE_RATE, phrases: Optional[Sequence[str]] = None
+) -> str:
+    return await (await get_pool()).transcribe_pcm(pcm, rate, phrases)
+
+
+async def stream(
+    chunks: AsyncIterable[bytes],
+    rate: int = SAMPLE_RATE,
+    phrases: Optional[Sequence[str]] = None,
+) -> AsyncIterator[tuple[str, str]]:
+    async for item in (await get_pool()).stream(chunks, rate, phrases):
+        yield item
+
+
+def metrics() -> dict:
+    return _pool.metrics() if _pool is not None else {}
+
+
+async def close() -> None:
+    """Stop the workers (called from bot.on_shutdown)."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
@@ -1,15 +1,206 @@
 from vosk import Model, KaldiRecognizer
-import wave, json
+from collections import OrderedDict
+import json, os, pickle, re, struct, sys, time
 
-MODEL = Model("models/vosk-model-small-ru-0.22")
+MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-ru-0.22")
+IDLE_RECOGNIZERS = 4  # kept per (sample rate, grammar)
+IDLE_GRAMMARS = 16  # distinct grammars with idle recognizers, LRU
+# fast mode: grammar‑constrained pass for short commands, free‑form otherwise
+FAST_MAX_SECONDS = float(os.getenv("STT_FAST_MAX_SECONDS", "4"))
+FAST_MIN_CONF = float(os.getenv("STT_FAST_MIN_CONF", "0.6"))
+_model = None
+_idle = OrderedDict()  # (rate, grammar) -> reset KaldiRecognizers ready for reuse
 
-def transcribe_wav(path):
-    wf = wave.open(path, "rb")
-    rec = KaldiRecognizer(MODEL, wf.getframerate())
+
+def get_model():
+    # loaded on first use: once in each STT worker, never in the bot process
+    global _model
+    if _model is None:
+        _model = Model(MODEL_PATH)
+    return _model
+
+
+def grammar_for(phrases):
+    """Vosk grammar JSON: normalised unique phrases plus "[unk]"."""
+    seen = {}
+    for p in phrases:
+        p = " ".join(re.findall(r"[а-яёa-z0-9]+", p.lower()))
+        if p:
+            seen[p] = None
+    return json.dumps(sorted(seen) + ["[unk]"], ensure_ascii=False)
+
+
+def _acquire(key):
+    idle = _idle.get(key)
+    if idle:
+        _idle.move_to_end(key)
+        return idle.pop()
+    rate, grammar = key
+    if grammar:
+        rec = KaldiRecognizer(get_model(), rate, grammar)
+    else:
+        rec = KaldiRecognizer(get_model(), rate)
     rec.SetWords(True)
+    return rec
+
+
+def _release(key, rec):
+    rec.Reset()
+    idle = _idle.setdefault(key, [])
+    _idle.move_to_end(key)
+    if len(idle) < IDLE_RECOGNIZERS:
+        idle.append(rec)
+    while len(_idle) > IDLE_GRAMMARS:
+        _idle.popitem(last=False)
+
+
+def _parse(raw):
+    res = json.loads(raw)
+    return res.get("text", ""), res.get("result", [])
+
+
+class Stream:
+    """
+    Incremental recognition of raw s16le mono PCM. feed() returns the
+    hypothesis so far (finished utterances + current partial), finish()
+    the complete text. Finished utterances are kept, so long notes are not
+    cut down to their last phrase.
+
+    With phrases, the first FAST_MAX_SECONDS go to a grammar‑constrained
+    recognizer (fast mode) and the audio is buffered. The grammar result
+    wins if every word is in the phrase list with conf >= FAST_MIN_CONF.
+    Otherwise, or once the note is too long to be a command, the buffer is
+    replayed into the free‑form recognizer.
+    """
+
+    def __init__(self, rate=16000, phrases=None):
+        self.rate = rate
+        self.done = []
+        self.mode = "free"
+        self.key = (rate, None)
+        self.rec = None
+        if phrases:
+            self.mode = "grammar"
+            self.key = (rate, grammar_for(phrases))
+            self.buffer, self.buffered, self.words = [], 0, []
+        self.rec = _acquire(self.key)
+
+    def _join(self, tail):
+        return " ".join(t for t in self.done + [tail] if t)
+
+    def _fallback(self):
+        buffer = self.buffer
+        _release(self.key, self.rec)
+        self.mode, self.key, self.done = "free", (self.rate, None), []
+        self.rec = _acquire(self.key)
+        for chunk in buffer:
+            self._accept(chunk)
+        self.buffer = None
+
+    def _accept(self, chunk):
+        if self.rec.AcceptWaveform(chunk):
+            text, words = _parse(self.rec.Result())
+            self.done.append(text)
+            if self.mode == "grammar":
+                self.words += words
+            return True
+        return False
+
+    def feed(self, chunk):
+        text = self._feed(chunk)
+        # grammar partials mark out‑of‑list words; they are noise for a preview
+        return " ".join(w for w in text.split() if w != "[unk]")
+
+    def _feed(self, chunk):
+        if self.mode == "grammar":
+            self.buffer.append(chunk)
+            self.buffered += len(chunk)
+            if self.buffered > FAST_MAX_SECONDS * self.rate * 2:
+                self._fallback()
+                return self._join("")
+        if self._accept(chunk):
+            return self._join("")
+        return self._join(json.loads(self.rec.PartialResult())["partial"])
+
+    def finish(self):
+        text, words = _parse(self.rec.FinalResult())
+        if self.mode == "grammar":
+            words = self.words + words
+            full = self._join(text)
+            if full and "[unk]" not in full and words and \
+                    min(w.get("conf", 0) for w in words) >= FAST_MIN_CONF:
+                self.close()
+                return full
+            self._fallback()
+            text, _ = _parse(self.rec.FinalResult())
+        text = self._join(text)
+        self.close()
+        return text
+
+    def close(self):
+        if self.rec is not None:
+            _release(self.key, self.rec)
+            self.rec = None
+
+
+def serve():
+    """
+    stt_pool worker loop. stdin carries length‑prefixed pickled
+    (op, job_id, arg) jobs, stdout the (kind, job_id, payload) answers;
+    EOF on stdin stops the worker. On start the worker loads the model,
+    runs one silent recognition to warm the 16 kHz recognizer, and reports
+    ("ready", 0, timings).
+
+    Streaming sessions: "open" (arg = (rate, phrases)), any number of "feed" (PCM chunk,
+    answered with "partial" only when the hypothesis changed), then "close"
+    (answered with "final") or "drop".
+    """
+    inp, out = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr  # stray prints must not corrupt the frame stream
+    t0 = time.perf_counter()
+    get_model()
+    t1 = time.perf_counter()
+    Stream().finish()
+    t2 = time.perf_counter()
+    sessions, shown = {}, {}
+
+    def reply(kind, job_id, payload):
+        data = pickle.dumps((kind, job_id, payload))
+        out.write(struct.pack("!I", len(data)) + data)
+        out.flush()
+
+    reply("ready", 0, {"model_load_ms": round((t1 - t0) * 1000, 1),
+                       "warmup_ms": round((t2 - t1) * 1000, 1)})
     while True:
-        data = wf.readframes(4000)
-        if len(data) == 0:
+        head = inp.read(4)
+        if len(head) < 4:
             break
-        rec.AcceptWaveform(data)
-    return json.loads(rec.FinalResult())["text"]
\ No newline at end of file
+        op, job_id, arg = pickle.loads(inp.read(struct.unpack("!I", head)[0]))
+        try:
+            if op == "open":
+                sessions[job_id], shown[job_id] = Stream(*arg), ""
+            elif op == "feed":
+                text = sessions[job_id].feed(arg)
+                if text != shown[job_id]:
+                    shown[job_id] = text
+                    reply("partial", job_id, text)
+            elif op == "close":
+                shown.pop(job_id)
+                reply("final", job_id, sessions.pop(job_id).finish())
+            elif op == "drop":
+                shown.pop(job_id, None)
+                stream = sessions.pop(job_id, None)
+                if stream is not None:
+                    stream.close()
+            else:
+                raise ValueError(f"unknown STT op {op!r}")
+        except Exception as exc:
+            shown.pop(job_id, None)
+            if job_id in sessions:
+                # state unknown after a failure: don't put it back in the pool
+                sessions.pop(job_id).rec = None
+            reply("error", job_id, repr(exc))
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,49 @@
+import itertools
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+# database.py opens ~/.planner_bot/db.json on import: keep tests off the real one
+os.environ["HOME"] = tempfile.mkdtemp(prefix="planner-tests-")
+# bot.py builds its Bot objects at import time
+os.environ.setdefault("TG_TOKEN", "123456:TEST")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest  # noqa: E402
+
+import database  # noqa: E402
+from storage import SQLiteStore, TinyDBStore  # noqa: E402
+
+
+# database.py keeps per-user versions and caches for the whole session:
+# every test writes under users of its own
+_uids = itertools.count(1000)
+
+
+def next_uid() -> int:
+    return next(_uids)
+
+
+def fill(n: int, day: date = date(2026, 10, 16)):
+    """A new user with n day tasks on day: (uid, day, task ids in order)."""
+    uid = next_uid()
+    ids = [database.add_task(uid, f"t{i}", day) for i in range(n)]
+    return uid, day, ids
+
+
+def open_store(kind: str, tmp_path: Path):
+    if kind == "sqlite":
+        return SQLiteStore(tmp_path / "db.sqlite3")
+    # flush only when a test asks for it
+    return TinyDBStore(tmp_path / "db.json", flush_interval=3600, flush_max_writes=10**9)
+
+
+@pytest.fixture(params=["tinydb", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    """A fresh store of each engine, installed as database._store."""
+    s = open_store(request.param, tmp_path)
+    monkeypatch.setattr(database, "_store", s)
+    yield s
+    s.close()
@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+import llm_gateway
+from planner import abacus_client
+
+
+def run_with(monkeypatch, responses):
+    """ask_rocky against canned responses; returns (result or error, requests)."""
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        status, body = responses[min(len(seen), len(responses)) - 1]
+        return httpx.Response(status, json=body)
+
+    async def no_sleep(seconds):
+        pass
+
+    # backoff waits between attempts with asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(abacus_client, "_gw", llm_gateway.Gateway("test", 4, 100, 100))
+
+    async def run():
+        abacus_client._client = httpx.AsyncClient(
+            base_url="https://abacus.test", transport=httpx.MockTransport(handler)
+        )
+        try:
+            return await abacus_client.ask_rocky("свободное время")
+        except Exception as e:
+            return e
+        finally:
+            await abacus_client.close_client()
+
+    return asyncio.run(run()), seen
+
+
+OK = (200, {"success": True, "result": {"messages": [{"text": "q"}, {"text": "Свободно с 15:00"}]}})
+
+
+@pytest.mark.parametrize("status", [429, 502])
+def test_retries_rate_limits_and_server_errors(monkeypatch, status):
+    result, seen = run_with(monkeypatch, [(status, {}), OK])
+    assert result == "Свободно с 15:00"
+    assert len(seen) == 2
+    assert seen[1].url.path == abacus_client.ABACUS_CHAT_PATH
+
+
+def test_gives_up_after_three_attempts(monkeypatch):
+    result, seen = run_with(monkeypatch, [(503, {})])
+    assert isinstance(result, httpx.HTTPStatusError)
+    assert len(seen) == 3
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(monkeypatch, status):
+    result, seen = run_with(monkeypatch, [(status, {}), OK])
+    assert isinstance(result, httpx.HTTPStatusError)
+    assert len(seen) == 1
+
+
+def test_unsuccessful_body_raises_without_retry(monkeypatch):
+    result, seen = run_with(monkeypatch, [(200, {"success": False, "error": "bad deployment"}), OK])
+    assert isinstance(result, abacus_client.AbacusError)
+    assert str(result) == "bad deployment"
+    assert len(seen) == 1
@@ -0,0 +1,71 @@
+import asyncio
+
+import ai_service
+import database
+from conftest import next_uid
+
+
+def counting_backend(monkeypatch):
+    calls = []
+
+    async def complete(payload):
+        calls.append(payload["messages"][-1]["content"])
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(ai_service, "_complete", complete)
+    monkeypatch.setattr(ai_service, "_cache",
+                        ai_service._ResponseCache(16, ai_service.AI_CACHE_TTL))
+    return calls
+
+
+def test_same_request_is_served_from_cache(store, monkeypatch):
+    calls = counting_backend(monkeypatch)
+    uid = next_uid()
+    first = asyncio.run(ai_service.ask_ai("когда встреча?", uid=uid))
+    again = asyncio.run(ai_service.ask_ai("когда встреча?", uid=uid))
+    other = asyncio.run(ai_service.ask_ai("что завтра?", uid=uid))
+    assert (first, again, other) == ("answer 1", "answer 1", "answer 2")
+    assert len(calls) == 2
+
+
+def test_write_to_users_data_invalidates(store, monkeypatch):
+    calls = counting_backend(monkeypatch)
+    uid, other = next_uid(), next_uid()
+    asyncio.run(ai_service.ask_ai("q", uid=uid))
+    database.add_inbox(other, "someone else's note")
+    assert asyncio.run(ai_service.ask_ai("q", uid=uid)) == "answer 1"
+    database.add_inbox(uid, "note")
+    assert asyncio.run(ai_service.ask_ai("q", uid=uid)) == "answer 2"
+    assert len(calls) == 2
+
+
+def test_ttl_and_disk_tier(tmp_path, monkeypatch):
+    cache = ai_service._ResponseCache(2, ttl=60, disk_dir=str(tmp_path))
+    now = [1000.0]
+    monkeypatch.setattr(ai_service.time, "time", lambda: now[0])
+    cache.put("h", None, "text")
+    cache.put_disk("h", "text")
+    assert cache.get("h", None) == "text"
+    # a fresh process has only the disk tier
+    fresh = ai_service._ResponseCache(2, ttl=60, disk_dir=str(tmp_path))
+    assert fresh.get("h", None) is None
+    assert fresh.get_disk("h") == "text"
+    now[0] += 61
+    assert cache.get("h", None) is None
+    assert fresh.get_disk("h") is None
+    assert not (tmp_path / "h.json").exists()
+
+
+def test_disk_tier_takes_only_requests_without_a_user(store, tmp_path, monkeypatch):
+    calls = counting_backend(monkeypatch)
+    monkeypatch.setattr(ai_service, "AI_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ai_service, "_cache",
+                        ai_service._ResponseCache(16, 60, disk_dir=str(tmp_path)))
+    a, b = next_uid(), next_uid()
+    prompt = "цели на основании: здоровье, семья"
+    assert asyncio.run(ai_service.ask_ai(prompt, uid=a)) == "answer 1"
+    assert asyncio.run(ai_service.ask_ai(prompt, uid=b)) == "answer 2"
+    assert list(tmp_path.glob("*.json")) == []
+    asyncio.run(ai_service.ask_ai("общий вопрос"))
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    assert len(calls) == 3
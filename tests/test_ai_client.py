@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+import httpx
+
+import ai_service
+
+
+def test_one_pooled_client_serves_every_question(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        return httpx.Response(200, json={"choices": [{"message": {"content": f" re: {prompt} "}}]})
+
+    monkeypatch.setattr(ai_service, "_cache", ai_service._ResponseCache(8, 60))
+
+    async def run():
+        ai_service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = ai_service.open_client()
+        answers = await asyncio.gather(*(ai_service.ask_ai(f"q{i}") for i in range(3)))
+        assert ai_service.open_client() is client  # idempotent while open
+        await ai_service.close_client()
+        assert ai_service._client is None
+        return answers
+
+    assert asyncio.run(run()) == ["re: q0", "re: q1", "re: q2"]
+    assert len(seen) == 3
+
+
+def test_client_is_reopened_after_close():
+    async def run():
+        first = ai_service.open_client()
+        await ai_service.close_client()
+        second = ai_service.open_client()
+        assert second is not first and not second.is_closed
+        assert second.headers["Authorization"].startswith("Bearer ")
+        await ai_service.close_client()
+
+    asyncio.run(run())
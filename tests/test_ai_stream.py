@@ -0,0 +1,76 @@
+import asyncio
+import json
+from types import SimpleNamespace as NS
+
+import httpx
+
+import ai_service
+import bot
+
+SSE = (
+    'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n'
+    'data: {"choices":[{"delta":{"content":"Завтра "}}]}\n\n'
+    ': keep-alive\n\n'
+    'data: {"choices":[{"delta":{"content":"в 10:00"}}]}\n\n'
+    "data: [DONE]\n\n"
+)
+
+
+def test_stream_yields_the_growing_reply_and_caches_it(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, text=SSE, headers={"content-type": "text/event-stream"})
+
+    monkeypatch.setattr(ai_service, "_cache", ai_service._ResponseCache(8, 60))
+
+    async def run():
+        ai_service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            first = [c async for c in ai_service.ask_ai_stream("когда созвон?")]
+            again = [c async for c in ai_service.ask_ai_stream("когда созвон?")]
+        finally:
+            await ai_service.close_client()
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first == ["Завтра ", "Завтра в 10:00", "Завтра в 10:00"]
+    assert again == ["Завтра в 10:00"]  # cache hit: one value
+    assert len(requests) == 1
+    assert json.loads(requests[0].content)["stream"] is True
+
+
+def test_reply_is_edited_at_most_once_per_interval(monkeypatch):
+    edits = []
+
+    async def edit_text(text, **kwargs):
+        edits.append(text)
+
+    async def fake_stream(prompt, uid=None):
+        for i in range(1, 6):
+            await asyncio.sleep(0.02)
+            yield "слово " * i
+
+    monkeypatch.setattr(ai_service, "ask_ai_stream", fake_stream)
+    monkeypatch.setattr(bot, "STREAM_EDIT_INTERVAL", 0.05)
+    reply = asyncio.run(bot.stream_ai_reply(NS(edit_text=edit_text), "вопрос", uid=1))
+    assert reply == "слово " * 5
+    assert edits[-1] == reply  # final text without the cursor
+    assert all(e.endswith(" ▌") for e in edits[:-1])
+    assert 1 <= len(edits) - 1 < 5  # partial edits are throttled
+
+
+def test_fallback_reports_rocky_errors(monkeypatch):
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    async def failing(text):
+        raise RuntimeError("abacus down")
+
+    monkeypatch.setattr(bot, "ask_rocky", failing)
+    update = NS(message=NS(text="привет", reply_text=reply_text))
+    asyncio.run(bot.echo_to_rocky(update, NS(user_data={})))
+    assert replies == ["Ошибка Rocky: abacus down"]
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import date
+
+import bot
+import database
+from conftest import next_uid
+
+DAY = date(2026, 10, 16)
+
+
+def count_finds(store, monkeypatch):
+    calls = []
+    find = store.find
+
+    def counting(name, uid, **eq):
+        calls.append(name)
+        return find(name, uid, **eq)
+
+    monkeypatch.setattr(store, "find", counting)
+    return calls
+
+
+def test_category_coverage_in_two_queries(store, monkeypatch):
+    uid = next_uid()
+    health, work, family = (database.add_category(uid, t) for t in ("Здоровье", "Работа", "Семья"))
+    database.add_task(uid, "бег", DAY, category_id=health)
+    database.add_task(uid, "зал", DAY, category_id=health)
+    database.add_task(uid, "отчёт", DAY, category_id=work)
+    database.add_task(uid, "ужин", date(2026, 10, 17), category_id=family)
+    database.add_task(uid, "без категории", DAY)
+
+    assert database.task_counts_by_category(uid, DAY) == {health: 2, work: 1}
+    assert database.count_categories_covered(uid, DAY) == 2
+    calls = count_finds(store, monkeypatch)
+    cats, covered = asyncio.run(bot.category_coverage(uid, DAY))
+    assert [c.doc_id for c in cats] == [health, work, family]
+    assert covered == {health, work}
+    assert sorted(calls) == ["categories", "tasks"]
+
+
+def test_okr_tree_groups_key_results_per_objective(store):
+    uid = next_uid()
+    a, b, empty = (database.add_objective(uid, t) for t in ("A", "B", "C"))
+    kr1 = database.add_key_result(uid, a, "a1", "Q1")
+    kr2 = database.add_key_result(uid, b, "b1", "Q2")
+    kr3 = database.add_key_result(uid, a, "a2", "Q3")
+    database.add_key_result(next_uid(), a, "чужой", "Q1")
+
+    grouped = database.key_results_by_objective(uid)
+    assert {k: [kr.doc_id for kr in v] for k, v in grouped.items()} == {a: [kr1, kr3], b: [kr2]}
+    assert list(database.objectives_by_id(uid)) == [a, b, empty]
+    tree = [(o.doc_id, [kr.doc_id for kr in krs]) for o, krs in database.list_okr_tree(uid)]
+    assert tree == [(a, [kr1, kr3]), (b, [kr2]), (empty, [])]
+
+
+def test_month_screen_queries_do_not_grow_with_goals(store, monkeypatch):
+    uid = next_uid()
+    for i in range(5):
+        goal = database.add_objective(uid, f"Цель {i}")
+        database.add_stage(uid, goal, f"Этап {i}", 10, 2026)
+    database.add_stage(uid, 10**6, "Сирота", 10, 2026)
+
+    calls = count_finds(store, monkeypatch)
+    text, _ = asyncio.run(bot.render_month(uid, 10, 2026))
+    assert sorted(calls) == ["okr", "stages"]
+    assert "🎯 Цель 4\n   • Этап 4" in text
+    assert "🎯 —\n   • Сирота" in text
@@ -0,0 +1,209 @@
+import asyncio
+from datetime import date
+
+import pytest
+from telegram import Bot, Update
+
+import bot
+import database
+from callbacks import CallbackRouter
+from conftest import fill, next_uid
+
+# one sample per prefix / literal of the baseline inline_router if‑chain
+CASES = [
+    ("choose_cat_none", "choose_category", {}),
+    ("choose_cat_7", "choose_category", {"cat_id": 7}),
+    ("goal_add_stage_3", "goal_add_stage", {"goal_id": 3}),
+    ("stage_goal_3", "goal_add_stage", {"goal_id": 3}),
+    ("stage_month_done", "stage_month_done", {}),
+    ("stage_month_11", "stage_month", {"month": 11}),
+    ("link_skip", "link_skip", {}),
+    ("link_choose_goal", "link_choose_goal", {}),
+    ("link_goal_12_4", "link_goal", {"task_id": 12, "goal_id": 4}),
+    ("stats_today", "stats_today", {}),
+    ("stats_back", "stats_back", {}),
+    ("month_add", "month_add", {}),
+    ("month_add_stage", "month_add_stage", {}),
+    ("month_toggle_5", "month_toggle", {"tid": 5}),
+    ("month_push_5", "month_push", {"tid": 5}),
+    ("month_refresh", "month_refresh", {}),
+    ("okr_kr_add_2_Q3-2026", "okr_kr_add", {"obj_id": 2, "quarter": "Q3-2026"}),
+    ("okr_kr_pinc_9_-10", "okr_kr_pinc", {"kr_id": 9, "delta": -10}),
+    ("okr_kr_pinc_9_10", "okr_kr_pinc", {"kr_id": 9, "delta": 10}),
+    ("okr_kr_pin_9", "okr_kr_pin", {"kr_id": 9}),
+    ("okr_kr_prog_9", "okr_kr_prog", {"kr_id": 9}),
+    ("okr_pin_lvl_9_week", "okr_pin_lvl", {"kr_id": 9, "lvl": "week"}),
+    ("okr_add_goal", "okr_add_goal", {}),
+    ("okr_cancel_goal", "okr_cancel_goal", {}),
+    ("okr_obj_2", "okr_obj", {"obj_id": 2}),
+    ("okr_q_2_Q1-2027", "okr_q", {"obj_id": 2, "quarter": "Q1-2027"}),
+    ("okr_due_2", "okr_due", {"obj_id": 2}),
+    ("okr_back", "okr_back", {}),
+    ("inbox_add", "inbox_add", {}),
+    ("inbox_note_8", "inbox_note", {"note_id": 8}),
+    ("inbox_edit_8", "inbox_edit", {"nid": 8}),
+    ("inbox_archive_8", "inbox_archive", {"nid": 8}),
+    ("inbox_goal_8", "inbox_goal", {"nid": 8}),
+    ("inbox_task_8", "inbox_task", {"nid": 8}),
+    ("task_day_8_tomorrow", "task_day", {"nid": 8, "choice": "tomorrow"}),
+    ("inbox_back", "inbox_back", {}),
+    ("today_add", "today_add", {}),
+    ("today_edit_4", "today_edit", {"task_id": 4}),
+    ("today_toggle_4", "today_toggle", {"task_id": 4}),
+    ("today_refresh", "today_refresh", {}),
+    ("week_add", "week_add", {}),
+    ("week_toggle_4", "week_toggle", {"task_id": 4}),
+    ("week_push_4", "week_push", {"task_id": 4}),
+    ("week_move_next", "week_move_next", {}),
+    ("week_refresh", "week_refresh", {}),
+    ("task_start_ok_4", "task_start_ok", {"task_id": 4}),
+    ("task_start_snooze_4", "task_start_snooze", {"tid": 4}),
+    ("task_end_ok_4", "task_end_ok", {"task_id": 4}),
+    ("task_end_snooze_4", "task_end_snooze", {"tid": 4}),
+    ("pg_today_a14", "page_screen", {"screen": "today", "cursor": "a14"}),
+    ("pg_inbox_b14", "page_screen", {"screen": "inbox", "cursor": "b14"}),
+]
+
+
+@pytest.mark.parametrize("data,handler,params", CASES)
+def test_baseline_callbacks_resolve(data, handler, params):
+    route, got = bot.router.resolve(data)
+    assert route is not None, data
+    assert route.handler.__name__ == handler
+    assert got == params
+
+
+@pytest.mark.parametrize("data", ["", "today", "today_edit_x", "okr_kr_pinc_9", "nope_1"])
+def test_unknown_data_does_not_resolve(data):
+    assert bot.router.resolve(data) == (None, {})
+
+
+def test_longest_prefix_wins_and_bad_patterns_rejected():
+    r = CallbackRouter()
+
+    @r.route("a_b_{x:int}")
+    async def short(query, context, uid, x): ...
+
+    @r.route("a_b_c_{x:int}")
+    async def long(query, context, uid, x): ...
+
+    assert r.resolve("a_b_c_1")[0].handler is long
+    assert r.resolve("a_b_1")[0].handler is short
+    with pytest.raises(ValueError):
+        r.route("a{x}")(short)
+    r.route("a_b_c")(short)
+    with pytest.raises(ValueError):
+        r.route("a_b_c")(short)
+
+
+# --- through main()'s handlers: Update → CallbackQueryHandler → router.dispatch ---
+
+@pytest.fixture
+def app(store, monkeypatch):
+    """bot.main()'s Application with the Bot API replaced by a recorder."""
+    sent = []
+
+    async def do_post(self, endpoint, data, *args, **kwargs):
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bot", "username": "bot"}
+        sent.append((endpoint, data))
+        if endpoint == "sendMessage":
+            return {"message_id": len(sent), "date": 0, "text": data["text"],
+                    "chat": {"id": data["chat_id"], "type": "private"}}
+        return True
+
+    monkeypatch.setattr(Bot, "_do_post", do_post)
+    monkeypatch.setattr(bot.outbound, "CHAT_RATE", 1000.0)  # the limiter stays in the path, unpaced
+    application = bot.main(return_app=True)
+    application.sent = sent
+    yield application
+    application.job_queue.scheduler.remove_all_jobs()
+
+
+def _user(uid):
+    return {"id": uid, "is_bot": False, "first_name": "u"}
+
+
+def _message(uid, text, message_id=1):
+    return {"message_id": message_id, "date": 0, "text": text,
+            "chat": {"id": uid, "type": "private"}, "from": _user(uid)}
+
+
+def run(application, *payloads):
+    async def go():
+        async with application:
+            for i, payload in enumerate(payloads):
+                await application.process_update(Update.de_json({"update_id": i, **payload}, application.bot))
+
+    asyncio.run(go())
+
+
+def press(uid, data):
+    return {"callback_query": {"id": "1", "chat_instance": "c", "data": data,
+                               "from": _user(uid), "message": _message(uid, "экран")}}
+
+
+def say(uid, text):
+    return {"message": _message(uid, text, message_id=2)}
+
+
+def test_callback_query_reaches_router_dispatch(app):
+    uid = next_uid()
+    before = bot.router.metrics().get("inbox_add", {}).get("calls", 0)
+    run(app, press(uid, "inbox_add"))
+    assert bot.router.metrics()["inbox_add"]["calls"] == before + 1
+    assert [e for e, _ in app.sent] == ["answerCallbackQuery", "editMessageText"]
+    assert app.user_data[uid] == {"awaiting_inbox_text": True}
+
+
+def test_button_then_text_finishes_the_flow(app):
+    uid = next_uid()
+    run(app, press(uid, "inbox_add"), say(uid, "купить молоко"))
+    assert [n["text"] for n in database.list_inbox(uid)] == ["купить молоко"]
+    assert not app.user_data[uid]
+
+    run(app, press(uid, "week_add"), say(uid, "отчёт"))
+    week = database.list_tasks(uid, bot.monday_of_week(date.today()), lvl="week")
+    assert [t["text"] for t in week] == ["отчёт"]
+
+    tid = week[0].doc_id
+    run(app, press(uid, f"today_edit_{tid}"), say(uid, "-"))
+    assert database.get_task(tid)["text"] == "отчёт"
+    run(app, press(uid, f"today_edit_{tid}"), say(uid, "квартальный отчёт"))
+    assert database.get_task(tid)["text"] == "квартальный отчёт"
+
+
+def test_kr_is_created_after_its_start_progress(app):
+    uid = next_uid()
+    obj = database.add_objective(uid, "Марафон")
+    run(app, press(uid, f"okr_kr_add_{obj}_Q4"), say(uid, "10 км без остановки"), say(uid, "150"))
+    assert app.user_data[uid]["awaiting_kr_init"]  # out of range: asked again
+    run(app, say(uid, "30"))
+    (kr,) = database.list_key_results(obj)
+    assert (kr["title"], kr["quarter"], kr["progress"]) == ("10 км без остановки", "Q4", 30)
+    assert not app.user_data[uid]
+
+
+def _buttons(data):
+    return [b.callback_data for row in data["reply_markup"].inline_keyboard for b in row]
+
+
+def test_pager_buttons_page_through_today(app):
+    uid, _, ids = fill(15, date.today())
+    run(app, press(uid, "today_refresh"))
+    first = app.sent[-1][1]
+    assert "t0" in first["text"] and "t10" not in first["text"]
+    (forward,) = [d for d in _buttons(first) if d.startswith("pg_")]
+    assert forward == f"pg_today_a{ids[9]}"
+
+    run(app, press(uid, forward))
+    second = app.sent[-1][1]
+    assert "11. t10" in second["text"] and "t9" not in second["text"]
+    assert [d for d in _buttons(second) if d.startswith("pg_")] == [f"pg_today_b{ids[10]}"]
+    # a redraw of the screen stays on the page
+    run(app, press(uid, f"today_toggle_{ids[12]}"))
+    assert "✅ 13. t12" in app.sent[-1][1]["text"]
+    assert app.user_data[uid]["page_today"] == f"a{ids[9]}"
+
+    run(app, press(uid, f"pg_today_b{ids[10]}"))
+    assert "1. t0" in app.sent[-1][1]["text"]
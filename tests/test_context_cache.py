@@ -0,0 +1,48 @@
+import asyncio
+from datetime import date, timedelta
+
+import ai_service
+import database
+from conftest import next_uid
+
+
+def test_context_follows_writes_without_reloading(store, monkeypatch):
+    uid = next_uid()
+    database.add_task(uid, "купить билеты", date.today())
+    ctx = asyncio.run(ai_service.build_context(uid))
+    assert "купить билеты" in ctx
+
+    def no_reload(*args, **kwargs):
+        raise AssertionError("context reloaded from the database")
+
+    monkeypatch.setattr(ai_service.adb, "list_future_tasks", no_reload)
+    database.add_task(uid, "позвонить маме", date.today() + timedelta(days=1))
+    database.add_task(uid, "через год", date.today() + timedelta(days=365))
+    database.add_objective(uid, "Выучить испанский")
+    ctx = asyncio.run(ai_service.build_context(uid))
+    assert "позвонить маме" in ctx
+    assert "через год" not in ctx
+    assert "Выучить испанский" in ctx
+
+
+def test_fill_refuses_a_snapshot_older_than_a_write(store):
+    uid = next_uid()
+    version = database.data_version(uid)
+    tasks = database.list_future_tasks(uid)
+    # a write lands after the loader checked the version, before fill
+    database.add_task(uid, "новая", date.today())
+    assert ai_service._contexts.fill(uid, version, tasks, []) is None
+    assert ai_service._contexts.get(uid) is None
+    assert "новая" in asyncio.run(ai_service.build_context(uid))
+
+
+def test_least_recently_asked_user_is_dropped(store, monkeypatch):
+    monkeypatch.setattr(ai_service, "_contexts", ai_service._ContextCache(max_users=2))
+    a, b, c = next_uid(), next_uid(), next_uid()
+    for uid in (a, b):
+        asyncio.run(ai_service.build_context(uid))
+    assert ai_service._contexts.get(a) is not None  # a is now the most recent
+    asyncio.run(ai_service.build_context(c))
+    assert ai_service._contexts.get(b) is None
+    assert ai_service._contexts.get(a) is not None
+    assert ai_service._contexts.get(c) is not None
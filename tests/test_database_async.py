@@ -0,0 +1,42 @@
+import asyncio
+import threading
+import time
+from datetime import date
+
+import database
+import database_async as adb
+from conftest import next_uid
+
+
+def test_writes_run_in_submission_order_on_the_writer_thread(store, monkeypatch):
+    seen = []
+    monkeypatch.setattr(database, "_listeners", database._listeners + [
+        lambda name, doc, removed: seen.append(threading.current_thread().name)
+    ])
+    uid = next_uid()
+
+    async def run():
+        await asyncio.gather(*(adb.add_task(uid, f"t{i}", date.today()) for i in range(20)))
+        return await adb.list_tasks(uid, date.today())
+
+    tasks = asyncio.run(run())
+    assert [t["text"] for t in tasks] == [f"t{i}" for i in range(20)]
+    assert {name.rsplit("_", 1)[0] for name in seen} == {"db-writer"}
+
+
+def test_loop_keeps_running_during_a_slow_write(store, monkeypatch):
+    monkeypatch.setattr(database, "_listeners", database._listeners + [
+        lambda name, doc, removed: time.sleep(0.3)
+    ])
+    uid = next_uid()
+
+    async def run():
+        ticks = 0
+        write = asyncio.ensure_future(adb.add_inbox(uid, "заметка"))
+        while not write.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    assert asyncio.run(run()) > 5
+    assert [n["text"] for n in database.list_inbox(uid)] == ["заметка"]
@@ -0,0 +1,152 @@
+import asyncio
+import contextlib
+import json
+import threading
+from datetime import date
+
+import pytest
+
+import database
+from conftest import next_uid
+
+
+def recomputed(obj_id):
+    stats = database._empty_kr_stats()
+    obj = database.get_objective(obj_id)
+    for kr in database.list_key_results(obj_id):
+        database._add_to_kr_stats(stats, kr.get("quarter"), 1, kr.get("progress", 0))
+    assert obj["kr_stats"]["count"] == stats["count"]
+    assert obj["kr_stats"]["sum"] == stats["sum"]
+    assert obj["kr_stats"]["quarters"] == stats["quarters"]
+    return obj
+
+
+def test_writers_keep_aggregates(store):
+    obj_id = database.add_objective(1, "Goal")
+    a = database.add_key_result(1, obj_id, "A", "Q1", 20)
+    database.add_key_result(1, obj_id, "B", "Q2", 60)
+    database.update_kr_progress(a, delta=30)
+    database.update_kr_progress(a, progress=150)  # clamped to 100
+    obj = recomputed(obj_id)
+    assert database.kr_progress(obj) == 80
+    assert database.kr_progress(obj, "Q1") == 100
+    assert database.kr_progress(obj, "Q4") is None
+
+
+def test_reconcile_repairs_drift_and_missing(store):
+    drifted = database.add_objective(1, "Drifted")
+    database.add_key_result(1, drifted, "A", "Q1", 40)
+    # a KR write that lost its objective update, and a pre‑kr_stats objective
+    store.update("okr", {"kr_stats": {"count": 5, "sum": 1, "updated": None, "quarters": {}}}, [drifted])
+    missing = store.insert("okr", {"uid": 1, "type": "objective", "title": "Old"})
+    store.insert("okr", {"uid": 1, "type": "kr", "obj_id": missing, "quarter": "Q3", "progress": 10})
+
+    database.reconcile_kr_stats()
+
+    assert database.kr_progress(recomputed(drifted)) == 40
+    assert database.kr_progress(recomputed(missing), "Q3") == 10
+
+
+def test_sqlite_transaction_rolls_back_both_writes(tmp_path, monkeypatch):
+    from storage import SQLiteStore
+
+    store = SQLiteStore(tmp_path / "db.sqlite3")
+    monkeypatch.setattr(database, "_store", store)
+    obj_id = database.add_objective(1, "Goal")
+
+    def boom(*args):
+        raise RuntimeError("crash between the two writes")
+
+    monkeypatch.setattr(database, "_bump_kr_stats", boom)
+    with pytest.raises(RuntimeError):
+        database.add_key_result(1, obj_id, "A", "Q1", 50)
+    assert database.list_key_results(obj_id) == []
+    store.close()
+
+
+def test_tinydb_flush_never_splits_a_transaction(tmp_path, monkeypatch):
+    from storage import TinyDBStore
+
+    path = tmp_path / "db.json"
+    store = TinyDBStore(path, flush_interval=3600, flush_max_writes=10**9)
+    monkeypatch.setattr(database, "_store", store)
+    obj_id = database.add_objective(1, "Goal")
+    with store.transaction():
+        kr_id = store.insert("okr", {"uid": 1, "type": "kr", "obj_id": obj_id, "progress": 50})
+        flusher = threading.Thread(target=store.flush)
+        flusher.start()
+        flusher.join(0.2)
+        assert flusher.is_alive()  # waits for the transaction
+        database._bump_kr_stats(obj_id, None, 1, 50)
+    flusher.join()
+    okr = json.loads(path.read_text())["okr"]
+    assert str(kr_id) in okr
+    assert okr[str(obj_id)]["kr_stats"]["count"] == 1
+    store.close()
+
+
+def test_rolled_back_writes_notify_nobody(tmp_path, monkeypatch):
+    from storage import SQLiteStore
+
+    store = SQLiteStore(tmp_path / "db.sqlite3")
+    monkeypatch.setattr(database, "_store", store)
+    seen = []
+    monkeypatch.setattr(database, "_listeners", [lambda name, doc, removed: seen.append(name)])
+    uid = next_uid()
+    obj_id = database.add_objective(uid, "Goal")
+    version = database.data_version(uid)
+
+    def boom(*args):
+        raise RuntimeError("crash between the two writes")
+
+    monkeypatch.setattr(database, "_bump_kr_stats", boom)
+    with pytest.raises(RuntimeError):
+        database.add_key_result(uid, obj_id, "A", "Q1", 50)
+    assert seen == ["okr"] and database.data_version(uid) == version
+    store.close()
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_transaction_notifies_after_the_block(store, monkeypatch, fail):
+    seen = []
+    monkeypatch.setattr(database, "_listeners", [lambda name, doc, removed: seen.append(doc["title"])])
+    uid = next_uid()
+    with pytest.raises(RuntimeError) if fail else contextlib.nullcontext():
+        with database._transaction():
+            database.add_objective(uid, "A")
+            with database._transaction():
+                database.add_objective(uid, "B")
+            assert seen == []
+            if fail:
+                raise RuntimeError
+    # TinyDB keeps the writes of a failed block, so they are still announced
+    assert seen == ([] if fail and store.rolls_back else ["A", "B"])
+    assert [o["title"] for o in database.list_objectives(uid)] == seen
+
+
+def test_sqlite_reads_inside_a_transaction_see_its_writes(tmp_path, monkeypatch):
+    from storage import SQLiteStore
+
+    store = SQLiteStore(tmp_path / "db.sqlite3")
+    monkeypatch.setattr(database, "_store", store)
+    uid = next_uid()
+    with database._transaction():
+        tid = database.add_task(uid, "t", date(2026, 10, 16))
+        assert database.get_task(tid)["text"] == "t"
+        # first use of the table: created inside the block
+        assert database.list_inbox(uid) == []
+    # a task with no reminder ever stored: the cancel finds none
+    database.toggle_done(tid)
+    assert database.get_task(tid)["done"]
+    store.close()
+
+
+def test_startup_reconciles_aggregates(store):
+    import bot
+
+    uid = next_uid()
+    obj_id = database.add_objective(uid, "Goal")
+    database.add_key_result(uid, obj_id, "A", "Q1", 40)
+    store.update("okr", {"kr_stats": None}, [obj_id])
+    asyncio.run(bot.on_startup(None))
+    assert database.kr_progress(recomputed(obj_id)) == 40
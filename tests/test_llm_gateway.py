@@ -0,0 +1,70 @@
+import asyncio
+
+from llm_gateway import Gateway
+
+
+def test_identical_requests_share_one_call():
+    async def run():
+        gw = Gateway("test", concurrency=4, rate=100, burst=100)
+        calls = []
+        release = asyncio.Event()
+
+        async def call(key):
+            calls.append(key)
+            await release.wait()
+            return f"answer {key}"
+
+        waiters = [asyncio.ensure_future(gw.coalesce(k, lambda k=k: call(k)))
+                   for k in ("q", "q", "q", "other")]
+        await asyncio.sleep(0)
+        # a caller that gives up does not cancel the call the others share
+        waiters[0].cancel()
+        release.set()
+        results = await asyncio.gather(*waiters[1:])
+        return gw, calls, results
+
+    gw, calls, results = asyncio.run(run())
+    assert calls == ["q", "other"]
+    assert results == ["answer q", "answer q", "answer other"]
+    m = gw.metrics()
+    assert (m["coalesced"], m["inflight_keys"]) == (2, 0)
+
+
+def test_slot_caps_concurrency_and_counts_errors():
+    async def run():
+        gw = Gateway("test", concurrency=2, rate=100, burst=100)
+        peak = 0
+
+        async def call(n):
+            nonlocal peak
+            async with gw.slot():
+                peak = max(peak, gw.metrics()["active"])
+                await asyncio.sleep(0.01)
+                if n == 0:
+                    raise RuntimeError("upstream failed")
+
+        results = await asyncio.gather(*(call(n) for n in range(6)), return_exceptions=True)
+        return gw.metrics(), peak, results
+
+    m, peak, results = asyncio.run(run())
+    assert peak == 2
+    assert isinstance(results[0], RuntimeError)
+    assert (m["calls"], m["errors"], m["active"], m["waiting"]) == (6, 1, 0, 0)
+    assert m["max_waiting"] >= 4
+
+
+def test_rate_limit_spaces_calls():
+    async def run():
+        gw = Gateway("test", concurrency=10, rate=50, burst=1)
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+
+        async def call():
+            async with gw.slot():
+                pass
+
+        await asyncio.gather(*(call() for _ in range(4)))
+        return loop.time() - t0
+
+    # one token up front, then 50/s: the other three wait 20, 40 and 60 ms
+    assert asyncio.run(run()) >= 0.055
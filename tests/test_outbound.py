@@ -0,0 +1,79 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+
+import outbound
+
+
+def send(limiter, callback, chat_id=None, lane=None):
+    return limiter.process_request(callback, (), {}, "sendMessage",
+                                   {"chat_id": chat_id} if chat_id else {}, lane)
+
+
+def test_retry_after_holds_the_chat_then_retries():
+    async def run():
+        limiter = outbound.OutboundLimiter(global_rate=100)
+        attempts = []
+        loop = asyncio.get_running_loop()
+
+        async def flood_once():
+            attempts.append(loop.time())
+            if len(attempts) == 1:
+                raise RetryAfter(timedelta(seconds=0.2))
+            return "sent"
+
+        result = await send(limiter, flood_once, chat_id=42)
+        await limiter.shutdown()
+        return result, attempts, limiter.metrics()
+
+    result, attempts, m = asyncio.run(run())
+    assert result == "sent"
+    assert attempts[1] - attempts[0] >= 0.2
+    assert (m["retry_after"], m["failed"]) == (1, 0)
+
+
+def test_gives_up_after_max_retries():
+    async def run():
+        limiter = outbound.OutboundLimiter(global_rate=100, max_retries=2)
+        calls = 0
+
+        async def always_flooded():
+            nonlocal calls
+            calls += 1
+            raise RetryAfter(timedelta(seconds=0.01))
+
+        try:
+            with pytest.raises(RetryAfter):
+                await send(limiter, always_flooded)
+        finally:
+            await limiter.shutdown()
+        return calls, limiter.metrics()
+
+    calls, m = asyncio.run(run())
+    assert calls == 3
+    assert (m["retry_after"], m["failed"]) == (3, 1)
+
+
+def test_interactive_lane_overtakes_queued_broadcasts():
+    async def run():
+        limiter = outbound.OutboundLimiter(global_rate=20)
+        order = []
+
+        def call(name):
+            async def cb():
+                order.append(name)
+            return cb
+
+        # spend the burst, so the next calls queue at the global gate
+        await asyncio.gather(*(send(limiter, call("warm")) for _ in range(20)))
+        queued = [send(limiter, call(f"broadcast{i}"), lane=outbound.BROADCAST) for i in range(3)]
+        queued.append(send(limiter, call("reply")))
+        await asyncio.gather(*queued)
+        await limiter.shutdown()
+        return order[20:], limiter.metrics()
+
+    order, m = asyncio.run(run())
+    assert order == ["reply", "broadcast0", "broadcast1", "broadcast2"]
+    assert m["max_queued"]["broadcast"] == 3
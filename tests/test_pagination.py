@@ -0,0 +1,59 @@
+import asyncio
+from datetime import date
+
+import database
+from conftest import fill
+
+
+def ids(page):
+    return [d.doc_id for d in page.items]
+
+
+def test_forward_and_back(store):
+    uid, day, all_ids = fill(25)
+    first = database.tasks_page(uid, day, "day")
+    assert ids(first) == all_ids[:10]
+    assert (first.prev, first.offset) == (None, 0)
+
+    second = database.tasks_page(uid, day, "day", first.next)
+    assert ids(second) == all_ids[10:20]
+    assert second.offset == 10
+
+    third = database.tasks_page(uid, day, "day", second.next)
+    assert ids(third) == all_ids[20:]
+    assert (third.next, third.offset) == (None, 20)
+
+    back = database.tasks_page(uid, day, "day", third.prev)
+    assert ids(back) == all_ids[10:20]
+    assert back.offset == 10
+    back = database.tasks_page(uid, day, "day", back.prev)
+    assert ids(back) == all_ids[:10]
+    assert (back.prev, back.offset) == (None, 0)
+
+
+def test_single_page_and_filters(store):
+    uid, day, all_ids = fill(3)
+    database.add_task(uid, "other day", date(2026, 10, 17))
+    database.add_task(uid, "week task", day, lvl="week")
+    page = database.tasks_page(uid, day, "day")
+    assert ids(page) == all_ids
+    assert page.prev is None and page.next is None
+
+
+def test_stale_cursor_falls_back_to_first_page(store):
+    uid, day, all_ids = fill(12)
+    nxt = database.tasks_page(uid, day, "day").next
+    database._remove("tasks", all_ids[10:])
+    page = database.tasks_page(uid, day, "day", nxt)
+    assert ids(page) == all_ids[:10]
+    assert page.next is None
+
+
+def test_today_numbers_run_on_across_pages(store):
+    import bot
+
+    uid, day, _ = fill(12, date.today())
+    first = database.tasks_page(uid, day, "day")
+    text, _ = asyncio.run(bot.render_today(uid, first.next))
+    lines = text.splitlines()[1:]
+    assert [line.split()[1] for line in lines] == ["11.", "12."]
@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace as NS
+
+import pytest
+
+import bot
+import database
+from conftest import next_uid, open_store
+
+
+class FakeJobQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def run_once(self, callback, when, data, name):
+        self.jobs.append(NS(callback=callback, when=when, data=data, name=name))
+
+
+@pytest.fixture
+def queue(store, monkeypatch):
+    monkeypatch.setattr(bot, "_armed_reminders", set())
+    monkeypatch.setattr(bot, "REMINDER_CATCHUP", "latest")
+    return FakeJobQueue()
+
+
+def test_restore_arms_the_window_and_applies_catchup(queue):
+    now = datetime.now(timezone.utc)
+    add = database.add_reminder
+    soon = add(1, 10, "start", now + timedelta(seconds=30))
+    later = add(1, 11, "start", now + timedelta(hours=2))
+    old = add(1, 12, "start", now - timedelta(hours=3))
+    newer = add(1, 12, "end", now - timedelta(hours=2))
+    other = add(2, 13, "end", now - timedelta(hours=1))
+    in_grace = add(2, 14, "start", now - timedelta(seconds=60))
+
+    asyncio.run(bot.dispatch_reminders(NS(job_queue=queue)))
+
+    armed = {j.data["rid"] for j in queue.jobs}
+    assert armed == {soon, newer, other, in_grace}
+    assert database.get_reminder(old) is None  # older missed one of task 12
+    assert database.get_reminder(later) is not None  # stays stored for a later pass
+    assert 0 < next(j.when for j in queue.jobs if j.data["rid"] == soon) <= 30
+
+    asyncio.run(bot.dispatch_reminders(NS(job_queue=queue)))
+    assert len(queue.jobs) == 4  # already armed ones are not armed twice
+
+
+def test_schedule_arms_only_what_falls_in_the_window(queue):
+    now = datetime.now(timezone.utc)
+    asyncio.run(bot.schedule_reminder(queue, 1, 20, "start", now + timedelta(seconds=10)))
+    asyncio.run(bot.schedule_reminder(queue, 1, 21, "start", now + timedelta(days=1)))
+    assert [j.data["tid"] for j in queue.jobs] == [20]
+    assert len(database.due_reminders(now + timedelta(days=2))) == 2
+
+
+def test_fired_reminder_is_deleted(queue, monkeypatch):
+    sent = []
+
+    async def notify(context):
+        sent.append(context.job.data["tid"])
+
+    monkeypatch.setitem(bot.REMINDER_HANDLERS, "start", notify)
+    now = datetime.now(timezone.utc)
+    asyncio.run(bot.schedule_reminder(queue, 1, 30, "start", now))
+    job = queue.jobs[0]
+    asyncio.run(bot.fire_reminder(NS(job=job)))
+    assert sent == [30]
+    assert database.get_reminder(job.data["rid"]) is None
+    assert job.data["rid"] not in bot._armed_reminders
+
+
+def test_task_changes_cancel_its_reminders(queue):
+    from datetime import date
+
+    now = datetime.now(timezone.utc)
+    uid = next_uid()
+
+    def task_with_reminders():
+        tid = database.add_task(uid, "созвон", date.today())
+        for kind in ("start", "end"):
+            database.add_reminder(uid, tid, kind, now + timedelta(hours=1))
+        return tid
+
+    def pending(tid):
+        return [r for r in database.due_reminders(now + timedelta(days=1)) if r["task_id"] == tid]
+
+    kept = task_with_reminders()
+    database.update_task(kept, goal_id=3)
+    database.set_task_status(kept, "started")
+    assert len(pending(kept)) == 2
+
+    for change in (
+        lambda tid: database.toggle_done(tid),
+        lambda tid: database.move_task(tid, date.today() + timedelta(days=1)),
+        lambda tid: database.set_task_times(tid, None, None),
+        lambda tid: database.update_task(tid, start_ts=now.isoformat()),
+        lambda tid: database.update_task(tid, done=True),
+    ):
+        tid = task_with_reminders()
+        change(tid)
+        assert pending(tid) == []
+    assert len(pending(kept)) == 2
+
+
+def test_armed_job_of_a_cancelled_reminder_stays_silent(queue, monkeypatch):
+    from datetime import date
+
+    sent = []
+
+    async def notify(context):
+        sent.append(context.job.data["tid"])
+
+    monkeypatch.setitem(bot.REMINDER_HANDLERS, "start", notify)
+    uid = next_uid()
+    tid = database.add_task(uid, "созвон", date.today())
+    asyncio.run(bot.schedule_reminder(queue, uid, tid, "start", datetime.now(timezone.utc)))
+    database.toggle_done(tid)
+    job = queue.jobs[0]
+    asyncio.run(bot.fire_reminder(NS(job=job)))
+    assert sent == []
+    assert job.data["rid"] not in bot._armed_reminders
+
+
+@pytest.mark.parametrize("kind", ["tinydb", "sqlite"])
+def test_reset_user_gets_no_reminders_after_restart(kind, tmp_path, monkeypatch):
+    from datetime import date
+
+    monkeypatch.setattr(bot, "_armed_reminders", set())
+    store = open_store(kind, tmp_path)
+    monkeypatch.setattr(database, "_store", store)
+    now = datetime.now(timezone.utc)
+    gone, stays = next_uid(), next_uid()
+    for uid in (gone, stays):
+        tid = database.add_task(uid, "созвон", date.today())
+        database.add_reminder(uid, tid, "start", now + timedelta(seconds=20))
+    database.delete_user_data(gone)
+    store.close()
+
+    # restart: a fresh store on the same files, nothing armed yet
+    store = open_store(kind, tmp_path)
+    monkeypatch.setattr(database, "_store", store)
+    queue = FakeJobQueue()
+    asyncio.run(bot.dispatch_reminders(NS(job_queue=queue)))
+    assert [j.data["cid"] for j in queue.jobs] == [stays]
+    store.close()
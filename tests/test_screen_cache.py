@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace as NS
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import database
+import screen_cache
+from conftest import next_uid
+
+
+def test_cached_until_the_users_data_changes(store, monkeypatch):
+    monkeypatch.setattr(screen_cache, "_cache", screen_cache.ScreenCache(8))
+    renders = []
+
+    @screen_cache.cached_screen("inbox")
+    async def render(uid, cursor=None):
+        renders.append((uid, cursor))
+        return f"{len(database.list_inbox(uid))} notes", None
+
+    uid, other = next_uid(), next_uid()
+    assert asyncio.run(render(uid)) == ("0 notes", None)
+    assert asyncio.run(render(uid)) == ("0 notes", None)
+    asyncio.run(render(uid, "a5"))  # each page cursor is its own entry
+    database.add_inbox(other, "not this user")
+    asyncio.run(render(uid))
+    assert len(renders) == 2
+    database.add_inbox(uid, "note")
+    assert asyncio.run(render(uid)) == ("1 notes", None)
+    assert len(renders) == 3
+
+
+def test_lru_bound():
+    cache = screen_cache.ScreenCache(2)
+    for k in "abc":
+        cache.put((k,), 0, k)
+    assert cache.get(("a",), 0) is None
+    assert cache.get(("c",), 0) == "c"
+    assert cache.get(("c",), 1) is None  # stale version
+    assert cache.metrics()["entries"] == 2
+
+
+def test_edit_screen_skips_identical_content(monkeypatch):
+    monkeypatch.setattr(screen_cache, "_cache", screen_cache.ScreenCache(8))
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔄", callback_data="today_refresh")]])
+    edits = []
+
+    async def edit_message_text(text, reply_markup=None):
+        edits.append(text)
+
+    query = NS(message=NS(text="same", reply_markup=markup), edit_message_text=edit_message_text)
+    asyncio.run(screen_cache.edit_screen(query, "same", markup))
+    asyncio.run(screen_cache.edit_screen(query, "changed", markup))
+    assert edits == ["changed"]
+    assert screen_cache.metrics()["edits_skipped"] == 1
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import date
+
+import database
+import search_index
+from conftest import next_uid
+from search_index import SearchIndex, stem, terms
+
+
+def texts(hits):
+    return [doc["text"] for _score, _table, doc in hits]
+
+
+def test_terms_are_stemmed_and_normalised():
+    assert stem("стоматологу") == stem("стоматолога") == "стоматолог"
+    assert terms("Ёлка у Стоматолога!") == ["елк", "стоматолог"]
+
+
+def test_fill_is_refused_after_a_write(store):
+    uid = next_uid()
+    idx = SearchIndex(10)
+    database.add_task(uid, "запись к стоматологу", date.today())
+    version = database.data_version(uid)
+    docs = [("tasks", t) for t in database.list_tasks(uid)]
+    database.add_inbox(uid, "стоматолог перезвонит")
+    assert idx.fill(uid, version, docs) is False
+    assert idx.search(uid, "стоматолог") is None  # not loaded: caller reloads
+    assert idx.fill(uid, database.data_version(uid), docs) is True
+
+
+def test_index_follows_writes_after_load(store, monkeypatch):
+    idx = SearchIndex(10)
+    monkeypatch.setattr(search_index, "_index", idx)
+    monkeypatch.setattr(database, "_listeners", database._listeners + [idx.on_change])
+    uid = next_uid()
+    tid = database.add_task(uid, "запись к стоматологу", date.today())
+    assert texts(asyncio.run(search_index.search(uid, "когда стоматолог?"))) == ["запись к стоматологу"]
+
+    database.update_task(tid, text="забрать машину из сервиса")
+    database.add_inbox(uid, "Стоматолога перенесли")
+    hits = asyncio.run(search_index.search(uid, "стоматолог"))
+    assert [(table, doc["text"]) for _s, table, doc in hits] == [("inbox", "Стоматолога перенесли")]
+    assert texts(asyncio.run(search_index.search(uid, "машину", tables=("tasks",)))) == [
+        "забрать машину из сервиса"
+    ]
+    database._remove("tasks", [tid])
+    assert asyncio.run(search_index.search(uid, "машину")) == []
+
+
+def test_rarer_terms_rank_higher_and_users_are_evicted(store):
+    idx = SearchIndex(max_users=1)
+    a, b = next_uid(), next_uid()
+    docs = [database.add_task(a, t, date.today()) for t in
+            ("отчёт по проекту", "созвон по проекту", "проект бюджет")]
+    rows = [("tasks", database.get_task(d)) for d in docs]
+    assert idx.fill(a, database.data_version(a), rows)
+    assert texts(idx.search(a, "бюджет проекта"))[0] == "проект бюджет"
+    assert texts(idx.search(a, "проекта", limit=2)) == ["отчёт по проекту", "созвон по проекту"]
+    assert idx.fill(b, database.data_version(b), [])
+    assert idx.search(a, "проект") is None
+
+
+def test_query_terms_match_as_prefixes(store):
+    idx = SearchIndex(10)
+    uid = next_uid()
+    rows = [("tasks", database.get_task(database.add_task(uid, t, date.today())))
+            for t in ("созвониться с Петей", "созвоны по пятницам", "прогулка")]
+    assert idx.fill(uid, database.data_version(uid), rows)
+    assert texts(idx.search(uid, "когда созвон?")) == ["созвониться с Петей", "созвоны по пятницам"]
+    assert texts(idx.search(uid, "про")) == []  # too short to be a prefix
+    idx.on_change("tasks", rows[0][1], removed=True)
+    assert texts(idx.search(uid, "созвон")) == ["созвоны по пятницам"]
+    assert "созвони" not in idx._users[uid].terms
+
+
+def test_matching_tasks_come_in_date_order(store, monkeypatch):
+    import bot
+
+    idx = SearchIndex(10)
+    monkeypatch.setattr(search_index, "_index", idx)
+    uid = next_uid()
+    today = date.today()
+    later = today.replace(year=today.year + 1)
+    database.add_task(uid, "созвон с банком", later)
+    database.add_task(uid, "созвон созвон с командой", today, start_ts=f"{today}T15:00")
+    database.add_task(uid, "созвониться с врачом", today, start_ts=f"{today}T09:30")
+    database.add_task(uid, "созвон с мамой", today)
+    got = asyncio.run(bot.find_matching_tasks(uid, "созвон"))
+    assert [t["text"] for t in got] == [
+        "созвон с мамой", "созвониться с врачом", "созвон созвон с командой", "созвон с банком",
+    ]
+    assert len(asyncio.run(bot.find_matching_tasks(uid, "созвон", limit=2))) == 2
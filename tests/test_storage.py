@@ -0,0 +1,151 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from storage import SQLiteStore, migrate_json
+from conftest import open_store
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_round_trip(store):
+    a = store.insert("tasks", {"uid": 1, "text": "a", "due": "2026-10-16", "lvl": "day"})
+    b = store.insert("tasks", {"uid": 1, "text": "b", "due": "2026-10-17", "lvl": "day"})
+    c = store.insert("tasks", {"uid": 2, "text": "c", "due": "2026-10-16", "lvl": "day"})
+    assert store.get("tasks", a) == {"uid": 1, "text": "a", "due": "2026-10-16", "lvl": "day"}
+    assert store.get("tasks", 999) is None
+
+    assert [d.doc_id for d in store.find("tasks", 1)] == [a, b]
+    assert [d.doc_id for d in store.find("tasks", 1, due="2026-10-16")] == [a]
+    assert [d.doc_id for d in store.find("tasks", 2, lvl="day")] == [c]
+
+    updated = store.update("tasks", {"due": "2026-10-18", "done": True}, [a, 999])
+    assert [(d.doc_id, d["due"], d["done"]) for d in updated] == [(a, "2026-10-18", True)]
+    # the index follows the moved field
+    assert store.find("tasks", 1, due="2026-10-16") == []
+    assert [d.doc_id for d in store.find("tasks", 1, due="2026-10-18")] == [a]
+    assert [d.doc_id for d in store.find_range("tasks", 1, "due", "2026-10-17", "2026-10-31")] == [a, b]
+
+    removed = store.remove("tasks", [b])
+    assert [d["text"] for d in removed] == ["b"]
+    assert store.get("tasks", b) is None
+    assert store.count("tasks", 1) == 1
+    assert sorted(d.doc_id for d in store.all("tasks")) == [a, c]
+
+
+@pytest.mark.parametrize("kind", ["tinydb", "sqlite"])
+def test_survives_reopen(kind, tmp_path):
+    s = open_store(kind, tmp_path)
+    doc_id = s.insert("inbox", {"uid": 7, "text": "заметка", "ts": "2026-10-16T08:00"})
+    s.update("inbox", {"archived": True}, [doc_id])
+    s.close()
+    s = open_store(kind, tmp_path)
+    assert s.get("inbox", doc_id) == {"uid": 7, "text": "заметка", "ts": "2026-10-16T08:00",
+                                      "archived": True}
+    # new ids continue after the stored ones
+    assert s.insert("inbox", {"uid": 7, "text": "x", "ts": "2026-10-16T09:00"}) > doc_id
+    s.close()
+
+
+def test_migrate_json_keeps_ids_and_documents(tmp_path):
+    src = ROOT / "data" / "db_old.json"
+    raw = json.loads(src.read_text(encoding="utf-8"))
+    dst = SQLiteStore(tmp_path / "db.sqlite3")
+    assert migrate_json(src, dst) == sum(len(t) for t in raw.values())
+    for name, docs in raw.items():
+        assert {d.doc_id: dict(d) for d in dst.all(name)} == {int(k): v for k, v in docs.items()}
+    uid, task_id = next((d["uid"], int(k)) for k, d in raw["tasks"].items())
+    assert task_id in [d.doc_id for d in dst.find("tasks", uid)]
+    dst.close()
+
+
+def test_tinydb_background_flush(tmp_path):
+    import time
+
+    from storage import TinyDBStore
+
+    path = tmp_path / "db.json"
+    s = TinyDBStore(path, flush_interval=3600, flush_max_writes=3)
+    for i in range(3):
+        s.insert("inbox", {"uid": 1, "text": str(i), "ts": f"2026-10-16T0{i}:00"})
+    deadline = time.monotonic() + 5
+    while s.metrics()["flushes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # the write budget woke the flusher long before the interval
+    assert s.metrics()["flushes"] == 1
+    assert len(json.loads(path.read_text())["inbox"]) == 3
+    assert not path.with_name("db.json.tmp").exists()
+
+    s.insert("tasks", {"uid": 1, "text": "late", "due": "2026-10-16"})
+    assert s.metrics()["pending_writes"] == 1
+    assert "tasks" not in json.loads(path.read_text())
+    s.close()  # flushes what is left
+    assert json.loads(path.read_text())["tasks"]["1"]["text"] == "late"
+
+
+def test_tinydb_flush_reencodes_only_dirty_tables(tmp_path):
+    from storage import TinyDBStore
+
+    path = tmp_path / "db.json"
+    s = TinyDBStore(path, flush_interval=3600, flush_max_writes=10**9)
+    s.insert("inbox", {"uid": 1, "text": "a", "ts": "2026-10-16T08:00"})
+    s.insert("tasks", {"uid": 1, "text": "b", "due": "2026-10-16"})
+    s.flush()
+    # inbox stays clean: the second flush reuses its fragment instead of
+    # re-encoding the table, so this in-memory edit is not written
+    s._cache.cache["inbox"]["1"]["text"] = "not marked dirty"
+    s.update("tasks", {"done": True}, [1])
+    s.flush()
+    data = json.loads(path.read_text())
+    assert data["tasks"]["1"]["done"] is True
+    assert data["inbox"]["1"]["text"] == "a"
+    s.close()
+
+
+def test_scan_range_orders_across_users(store):
+    for uid, at in [(1, "2026-10-16T10:00"), (2, "2026-10-16T09:00"), (1, "2026-10-16T11:00")]:
+        store.insert("reminders", {"uid": uid, "task_id": 1, "fire_at": at})
+    got = store.scan_range("reminders", "fire_at", hi="2026-10-16T10:30")
+    assert [d["fire_at"] for d in got] == ["2026-10-16T09:00", "2026-10-16T10:00"]
+    assert len(store.scan_range("reminders", "fire_at", limit=1)) == 1
+
+
+def test_sqlite_adds_missing_index_column(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "db.sqlite3"
+    conn = sqlite3.connect(path)
+    # a tasks table from before "due" became an indexed column
+    conn.execute('CREATE TABLE "tasks" (id INTEGER PRIMARY KEY, "uid", doc TEXT NOT NULL)')
+    conn.execute("INSERT INTO tasks VALUES (1, 5, ?)",
+                 (json.dumps({"uid": 5, "due": "2026-10-16", "text": "old"}),))
+    conn.commit()
+    conn.close()
+    s = SQLiteStore(path)
+    assert [d["text"] for d in s.find_range("tasks", 5, "due", "2026-10-01", "2026-10-31")] == ["old"]
+    s.close()
+
+
+def test_tinydb_reads_use_the_index_not_a_scan(tmp_path, monkeypatch):
+    from tinydb.table import Table
+
+    s = open_store("tinydb", tmp_path)
+    goal = s.insert("okr", {"uid": 1, "type": "objective", "title": "A"})
+    kr = s.insert("okr", {"uid": 1, "type": "kr", "obj_id": goal})
+    s.insert("okr", {"uid": 2, "type": "objective", "title": "B"})
+    s.find("okr", 1)  # builds the index once
+
+    def scan(*args, **kwargs):
+        raise AssertionError("table scanned")
+
+    monkeypatch.setattr(Table, "all", scan)
+    monkeypatch.setattr(Table, "__iter__", scan)
+    other = s.insert("okr", {"uid": 1, "type": "objective", "title": "C"})
+    s.update("okr", {"obj_id": other}, [kr])
+    assert [d.doc_id for d in s.find("okr", 1, type="kr", obj_id=other)] == [kr]
+    assert s.find("okr", 1, type="kr", obj_id=goal) == []
+    assert [d.doc_id for d in s.find("okr", 1, type="objective")] == [goal, other]
+    assert s.count("okr", 2) == 1
+    monkeypatch.undo()
+    s.close()
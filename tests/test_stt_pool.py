@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+import stt_pool
+
+
+def test_pool_gives_up_on_workers_that_never_start(tmp_path, monkeypatch):
+    script = tmp_path / "dead_worker.py"
+    script.write_text("import sys; sys.exit(3)\n")
+    monkeypatch.setattr(stt_pool, "WORKER_SCRIPT", str(script))
+    monkeypatch.setattr(stt_pool, "RESTART_BACKOFF", 0.01)
+    monkeypatch.setattr(stt_pool, "MAX_RESTARTS", 3)
+
+    async def run():
+        pool = stt_pool.SttPool(workers=2, queue_size=2)
+        await pool.start()
+        for _ in range(200):
+            if pool.failed:
+                break
+            await asyncio.sleep(0.02)
+        try:
+            with pytest.raises(stt_pool.SttError, match="keep exiting"):
+                await pool.transcribe_pcm(bytes(3200))
+            return pool.metrics()
+        finally:
+            await pool.close()
+
+    m = asyncio.run(run())
+    assert m["failed"] == "STT workers keep exiting (last code 3)"
+    assert m["restarts"] == 2 * 3  # MAX_RESTARTS per worker slot, then no more
+    assert m["alive"] == 0
+
+
+def test_close_interrupts_a_restart_backoff(tmp_path, monkeypatch):
+    script = tmp_path / "dead_worker.py"
+    script.write_text("import sys; sys.exit(1)\n")
+    monkeypatch.setattr(stt_pool, "WORKER_SCRIPT", str(script))
+    monkeypatch.setattr(stt_pool, "RESTART_BACKOFF", 60)
+
+    async def run():
+        pool = stt_pool.SttPool(workers=1, queue_size=1)
+        await pool.start()
+        await pool._workers[0].proc.wait()
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(pool.close(), 5)
+        return pool.metrics()
+
+    assert asyncio.run(run())["restarts"] == 0
+
+
+def run_voice_router(monkeypatch, stream):
+    """voice_router on a fake voice note with stt_pool.stream replaced; the texts shown."""
+    from types import SimpleNamespace as NS
+
+    import bot
+
+    shown = []
+
+    async def edit_text(text, **kwargs):
+        shown.append(text)
+
+    async def reply_text(text, **kwargs):
+        shown.append(text)
+        return NS(edit_text=edit_text)
+
+    async def download():
+        return bytearray(b"OggS")
+
+    async def get_file():
+        return NS(download_as_bytearray=download)
+
+    async def phrases(uid):
+        return []
+
+    monkeypatch.setattr(bot, "voice_phrases", phrases)
+    monkeypatch.setattr(bot.stt_pool, "stream", stream)
+    user = NS(id=1)
+    update = NS(effective_user=user, effective_chat=user,
+                message=NS(voice=NS(duration=2, get_file=get_file), reply_text=reply_text))
+    asyncio.run(bot.voice_router(update, NS(user_data={})))
+    assert shown[0] == "🎙 Распознаю…"
+    return shown
+
+
+@pytest.mark.parametrize("error", [stt_pool.SttError("worker died"), asyncio.TimeoutError()])
+def test_voice_router_reports_stt_failures(error, monkeypatch):
+    async def failing_stream(pcm, phrases=None):
+        raise error
+        yield
+
+    shown = run_voice_router(monkeypatch, failing_stream)
+    assert shown[-1].startswith("Распознавание речи сейчас недоступно")
+
+
+def test_voice_router_reports_missing_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))  # no ffmpeg on it
+
+    async def consuming_stream(pcm, phrases=None):
+        async for _chunk in pcm:
+            pass
+        yield "final", "never reached"
+
+    shown = run_voice_router(monkeypatch, consuming_stream)
+    assert shown[-1] == "Не удалось распознать речь 🤷"
+
+
+def fake_ffmpeg(tmp_path, monkeypatch, body):
+    """Put an executable "ffmpeg" running the shell body first on PATH."""
+    exe = tmp_path / "ffmpeg"
+    exe.write_text("#!/bin/sh\n" + body + "\n")
+    exe.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+
+
+def test_decode_pipes_the_note_through_ffmpeg_in_memory(tmp_path, monkeypatch):
+    fake_ffmpeg(tmp_path, monkeypatch, "cat")  # "decodes" by echoing stdin
+    monkeypatch.setattr(stt_pool, "CHUNK_BYTES", 1000)
+    note = bytes(range(256)) * 10
+
+    async def run():
+        return [chunk async for chunk in stt_pool.decode_ogg_stream(bytearray(note))]
+
+    chunks = asyncio.run(run())
+    assert b"".join(chunks) == note
+    assert all(len(c) <= 1000 for c in chunks)
+    assert list(tmp_path.iterdir()) == [tmp_path / "ffmpeg"]  # no temp files
+
+
+def test_decode_error_carries_ffmpeg_stderr(tmp_path, monkeypatch):
+    fake_ffmpeg(tmp_path, monkeypatch, "cat >/dev/null; echo 'Invalid data found' >&2; exit 1")
+
+    async def run():
+        return [chunk async for chunk in stt_pool.decode_ogg_stream(b"not ogg")]
+
+    with pytest.raises(stt_pool.DecodeError, match="Invalid data found"):
+        asyncio.run(run())
+
+
+ECHO_WORKER = """
+import pickle, struct, sys
+
+inp, out = sys.stdin.buffer, sys.stdout.buffer
+log = open(sys.argv[0] + ".log", "a")
+
+
+def reply(kind, job_id, payload):
+    data = pickle.dumps((kind, job_id, payload))
+    out.write(struct.pack("!I", len(data)) + data)
+    out.flush()
+
+
+reply("ready", 0, {"model_load_ms": 1.0, "warmup_ms": 1.0})
+fed = {}
+while len(head := inp.read(4)) == 4:
+    op, job_id, arg = pickle.loads(inp.read(struct.unpack("!I", head)[0]))
+    print(op, arg if op == "open" else "", file=log, flush=True)
+    if op == "open":
+        fed[job_id] = 0
+    elif op == "feed":
+        fed[job_id] += len(arg)
+        reply("partial", job_id, f"{fed[job_id]} bytes")
+    elif op == "close":
+        reply("final", job_id, f"{fed.pop(job_id)} bytes done")
+    elif op == "drop":
+        fed.pop(job_id, None)
+"""
+
+
+def test_stream_yields_partials_then_final_and_drops_abandoned_sessions(tmp_path, monkeypatch):
+    script = tmp_path / "echo_worker.py"
+    script.write_text(ECHO_WORKER)
+    monkeypatch.setattr(stt_pool, "WORKER_SCRIPT", str(script))
+
+    async def chunks(n):
+        for _ in range(n):
+            yield bytes(100)
+
+    async def run():
+        pool = stt_pool.SttPool(workers=1, queue_size=2)
+        await pool.start()
+        try:
+            full = [item async for item in pool.stream(chunks(3), phrases=["сегодня"])]
+            abandoned = pool.stream(chunks(10))
+            await abandoned.__anext__()
+            await abandoned.aclose()  # the caller walks away after the first partial
+            text = await pool.transcribe_pcm(bytes(250))
+            return full, text, pool.metrics()
+        finally:
+            await pool.close()
+
+    full, text, m = asyncio.run(run())
+    assert full == [("partial", "100 bytes"), ("partial", "200 bytes"),
+                    ("partial", "300 bytes"), ("final", "300 bytes done")]
+    assert text == "250 bytes done"
+    assert (m["jobs"], m["errors"], m["in_flight"]) == (3, 0, 0)
+    ops = [line.split()[0] for line in (tmp_path / "echo_worker.py.log").read_text().splitlines()]
+    assert ops[:5] == ["open", "feed", "feed", "feed", "close"]
+    assert "drop" in ops
+    assert "['сегодня']" in (tmp_path / "echo_worker.py.log").read_text().splitlines()[0]
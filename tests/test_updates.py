@@ -0,0 +1,80 @@
+import asyncio
+
+from telegram import Chat, Message, Update, User
+
+from updates import PerUserUpdateProcessor
+
+
+def make_update(update_id: int, uid: int) -> Update:
+    user = User(uid, "u", False)
+    msg = Message(update_id, None, Chat(uid, "private"), from_user=user, text="x")
+    return Update(update_id, message=msg)
+
+
+def test_one_users_burst_does_not_block_others():
+    async def run():
+        proc = PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+        order = []
+
+        async def slow(n):
+            await release.wait()
+            order.append(("a", n))
+
+        async def fast():
+            order.append(("b", 0))
+
+        burst = [asyncio.create_task(proc.process_update(make_update(i, 1), slow(i)))
+                 for i in range(5)]
+        await asyncio.sleep(0)
+        await asyncio.wait_for(proc.process_update(make_update(99, 2), fast()), 1)
+        # one slot held by user 1's runner, its backlog waits in the user's queue
+        assert proc.current_concurrent_updates == 1
+        release.set()
+        await asyncio.gather(*burst)
+        return order
+
+    order = asyncio.run(run())
+    assert order[0] == ("b", 0)
+    assert order[1:] == [("a", i) for i in range(5)]
+
+
+def test_same_user_runs_in_order():
+    async def run():
+        proc = PerUserUpdateProcessor(8)
+        order = []
+
+        async def job(n):
+            await asyncio.sleep(0.01 * (5 - n))
+            order.append(n)
+
+        await asyncio.gather(*(proc.process_update(make_update(i, 1), job(i)) for i in range(5)))
+        return order, proc.metrics()
+
+    order, metrics = asyncio.run(run())
+    assert order == list(range(5))
+    assert metrics["max_user_backlog"] == 4
+    assert metrics["users_in_flight"] == 0
+
+
+def test_final_process_update_is_not_overridden():
+    assert "process_update" not in PerUserUpdateProcessor.__dict__
+
+
+def test_a_failing_update_does_not_stall_the_users_backlog():
+    async def run():
+        proc = PerUserUpdateProcessor(4)
+        done = []
+
+        async def job(n):
+            await asyncio.sleep(0.01)
+            if n == 1:
+                raise RuntimeError("handler crashed")
+            done.append(n)
+
+        await asyncio.gather(*(proc.process_update(make_update(i, 1), job(i)) for i in range(4)))
+        return done, proc.metrics()
+
+    done, metrics = asyncio.run(run())
+    assert done == [0, 2, 3]
+    assert (metrics["processed"], metrics["users_in_flight"]) == (4, 0)
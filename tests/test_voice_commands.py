@@ -0,0 +1,66 @@
+import asyncio
+import json
+from types import SimpleNamespace as NS
+
+import pytest
+
+import bot
+import database
+from conftest import next_uid
+
+
+def test_phrases_are_rebuilt_only_after_a_write(store, monkeypatch):
+    loads = []
+    list_categories = bot.adb.list_categories
+
+    async def counting(uid):
+        loads.append(uid)
+        return await list_categories(uid)
+
+    monkeypatch.setattr(bot.adb, "list_categories", counting)
+    uid = next_uid()
+    database.add_objective(uid, "Выучить испанский")
+    first = asyncio.run(bot.voice_phrases(uid))
+    assert asyncio.run(bot.voice_phrases(uid)) is first
+    assert "Выучить испанский" in first and "добавь задачу" in first
+    database.add_category(uid, "Здоровье")
+    assert "Здоровье" in asyncio.run(bot.voice_phrases(uid))
+    assert loads == [uid, uid]
+
+
+@pytest.mark.parametrize("duration,grammar", [(3, True), (30, False)])
+def test_only_short_notes_get_the_grammar(duration, grammar, monkeypatch):
+    seen = []
+
+    async def phrases(uid):
+        return ["покажи цели"]
+
+    async def stream(pcm, phrases=None):
+        seen.append(phrases)
+        yield "final", ""
+
+    async def edit_text(text, **kwargs):
+        pass
+
+    async def reply_text(text, **kwargs):
+        return NS(edit_text=edit_text)
+
+    async def download():
+        return bytearray(b"OggS")
+
+    async def get_file():
+        return NS(download_as_bytearray=download)
+
+    monkeypatch.setattr(bot, "voice_phrases", phrases)
+    monkeypatch.setattr(bot.stt_pool, "stream", stream)
+    user = NS(id=1)
+    update = NS(effective_user=user, effective_chat=user,
+                message=NS(voice=NS(duration=duration, get_file=get_file), reply_text=reply_text))
+    asyncio.run(bot.voice_router(update, NS(user_data={})))
+    assert seen == [["покажи цели"] if grammar else None]
+
+
+def test_grammar_normalises_and_dedupes_phrases():
+    stt_vosk = pytest.importorskip("stt_vosk")  # needs vosk installed
+    grammar = json.loads(stt_vosk.grammar_for(["Покажи цели!", "покажи  цели", "🎯 Цели", ""]))
+    assert grammar == ["покажи цели", "цели", "[unk]"]
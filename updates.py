@@ -0,0 +1,89 @@
+"""
+updates.py  •  Concurrent update processing with per‑user ordering
+
+Installed with ApplicationBuilder().concurrent_updates(PerUserUpdateProcessor(n)):
+up to n updates run at once, but updates from the same user (or chat,
+for chat‑less updates) run one after another in arrival order, so
+conversation state and "awaiting_*" flags in user_data never race.
+
+BaseUpdateProcessor.process_update (final) takes one of the n slots and
+calls do_process_update. There the first update of a user becomes that
+user's runner: it keeps its slot and also runs every update of the user
+that arrives meanwhile, in order. Those later updates join the runner's
+queue and give their own slot back at once, so a burst from one user
+holds a single slot and never starves other users.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import deque
+from typing import Any, Awaitable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def _key(update: object) -> Optional[int]:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._queues: dict[int, deque] = {}  # key → updates waiting for the user's runner
+        self._stats = {"processed": 0, "queued_behind_user": 0, "max_user_backlog": 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        st = self._stats
+        key = _key(update)
+        if key is None:
+            try:
+                await coroutine
+            finally:
+                st["processed"] += 1
+            return
+        backlog = self._queues.get(key)
+        if backlog is not None:
+            # the user's runner is busy: it will run this one after the others
+            backlog.append(coroutine)
+            st["queued_behind_user"] += 1
+            st["max_user_backlog"] = max(st["max_user_backlog"], len(backlog))
+            return
+        backlog = self._queues[key] = deque()
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception:
+                    # the rest of the user's backlog still has to run
+                    logger.exception("update for %s failed", key)
+                st["processed"] += 1
+                if not backlog:
+                    break
+                coroutine = backlog.popleft()
+        finally:
+            del self._queues[key]
+            for pending in backlog:  # only on cancellation (shutdown)
+                getattr(pending, "close", lambda: None)()
+
+    def metrics(self) -> dict:
+        return dict(
+            self._stats,
+            active=self.current_concurrent_updates,
+            users_in_flight=len(self._queues),
+        )